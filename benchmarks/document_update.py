@@ -0,0 +1,82 @@
+"""Compare replacing the whole buffer with applying a minimal diff.
+
+Runs offscreen and prints, per change size, the time to update the editor
+(including layout and heading indexing) and to re-render the preview, for
+setPlainText and for apply_text_diff.
+
+    python benchmarks/document_update.py --lines 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication, QTextEdit
+
+from markdown_editor import BlockRenderer, DocumentIndexer, apply_text_diff
+
+def make_document(lines: int) -> str:
+    parts = []
+    for i in range(lines // 4):
+        if i % 25 == 0:
+            parts.append(f'## Section {i}\n\n')
+        parts.append(f'Paragraph {i} with *some* text and a [link](page{i}.md).\n\n')
+    return ''.join(parts)
+
+def change_lines(text: str, count: int) -> str:
+    """Edit count paragraphs spread evenly through the text"""
+    lines = text.split('\n')
+    candidates = [i for i, line in enumerate(lines) if line.startswith('Paragraph')]
+    step = max(1, len(candidates) // max(count, 1))
+    for i in candidates[::step][:count]:
+        lines[i] = lines[i].replace('some', 'changed')
+    return '\n'.join(lines)
+
+def measure(editor: QTextEdit, renderer: BlockRenderer, update) -> tuple:
+    app = QApplication.instance()
+    started = time.perf_counter()
+    update()
+    # Force the layout the editor would do before the next paint
+    editor.document().documentLayout().documentSize()
+    app.processEvents()
+    updated = time.perf_counter()
+    renderer.render(editor.toPlainText())
+    return updated - started, time.perf_counter() - updated
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=20000, help='size of the test document in lines')
+    parser.add_argument('--changes', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='numbers of changed lines to measure')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    base_text = make_document(args.lines)
+    print(f'{args.lines} lines, {len(base_text)} characters')
+    print(f'{"changed":>8} {"method":>14} {"update ms":>10} {"preview ms":>11}')
+    for count in args.changes:
+        new_text = change_lines(base_text, count)
+        for name in ('setPlainText', 'apply_text_diff'):
+            editor = QTextEdit()
+            editor.resize(800, 600)
+            editor.show()
+            editor.setPlainText(base_text)
+            DocumentIndexer(editor.document())
+            renderer = BlockRenderer()
+            renderer.render(base_text)
+            app.processEvents()
+            if name == 'setPlainText':
+                update = lambda: editor.setPlainText(new_text)
+            else:
+                update = lambda: apply_text_diff(editor.document(), new_text)
+            update_time, preview_time = measure(editor, renderer, update)
+            assert editor.toPlainText() == new_text
+            print(f'{count:>8} {name:>14} {update_time * 1000:>10.1f} {preview_time * 1000:>11.1f}')
+            editor.close()
+            editor.deleteLater()
+
+if __name__ == '__main__':
+    main()
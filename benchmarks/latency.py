@@ -0,0 +1,213 @@
+"""Measure keystroke-to-paint and keystroke-to-preview latency of the editor.
+
+Runs the full editor offscreen and drives it with scripted typing, pasting,
+tab switching and find/replace on sample documents of increasing size. For
+every action it records the time until the editor repaints and until the
+preview shows the new content, then prints percentiles per document
+size and action. The run exits with status 1 when a p95 exceeds its limit.
+
+    python benchmarks/latency.py --lines 100 2000 20000 --paint-p95 50 --preview-p95 500 --switch-p95 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# Keep the editor's settings, session and caches out of the user's home
+os.environ['HOME'] = tempfile.mkdtemp(prefix='latency-home-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QEvent, QObject, Qt
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QApplication, QInputDialog
+
+from markdown_editor import MarkdownEditor
+
+WAIT_LIMIT = 10.0
+TYPED_TEXT = 'The quick brown fox jumps over the lazy dog. '
+
+def make_document(lines: int) -> str:
+    """Headings, paragraphs, lists, code and a table in roughly the given number of lines"""
+    parts = []
+    section = 0
+    while sum(part.count('\n') for part in parts) < lines:
+        parts.append(f'## Section {section}\n\n')
+        parts.append(f'Paragraph {section} with *emphasis*, `code` and a [link](page{section}.md).\n\n')
+        parts.append(f'- item one\n- item two with **bold**\n- item three\n\n')
+        if section % 4 == 0:
+            parts.append(f'```python\ndef section_{section}():\n    return {section}\n```\n\n')
+        if section % 8 == 0:
+            parts.append('| Name | Value |\n|------|-------|\n| a | 1 |\n| b | 2 |\n\n')
+        section += 1
+    return ''.join(parts)
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class LatencyProbe(QObject):
+    """Timestamps editor paints and preview loads"""
+
+    def __init__(self, editor: MarkdownEditor) -> None:
+        super().__init__()
+        self.app = QApplication.instance()
+        self.last_paint = 0.0
+        self.last_preview = 0.0
+        editor.input_text.viewport().installEventFilter(self)
+        editor.previewUpdated.connect(self.on_preview_updated)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            self.last_paint = time.perf_counter()
+        return False
+
+    def on_preview_updated(self) -> None:
+        self.last_preview = time.perf_counter()
+
+    def wait(self, started: float, attribute: str) -> float:
+        """Seconds from started until the next paint or preview load, or None on timeout"""
+        deadline = started + WAIT_LIMIT
+        while getattr(self, attribute) < started:
+            if time.perf_counter() > deadline:
+                return None
+            self.app.processEvents()
+            time.sleep(0.0005)
+        return getattr(self, attribute) - started
+
+    def measure(self, action, changes_text: bool = True) -> tuple:
+        started = time.perf_counter()
+        action()
+        paint = self.wait(started, 'last_paint')
+        if not changes_text:
+            # Nothing to re-render, only the selection moves
+            return paint, 0.0
+        return paint, self.wait(started, 'last_preview')
+
+    def wait_idle(self, editor: MarkdownEditor) -> None:
+        """Let the render worker finish so a document's first render is not measured as an edit"""
+        deadline = time.perf_counter() + 60
+        worker = editor.render_worker
+        while (worker.current is not None or worker.pending is not None) and time.perf_counter() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.settle(0.5)
+
+    def settle(self, seconds: float = 0.2) -> None:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+def scripted_dialog(answers: list):
+    """Replace QInputDialog.getText with one that returns the queued answers"""
+    def get_text(*args, **kwargs):
+        return answers.pop(0), True
+    QInputDialog.getText = get_text
+
+def run_size(editor: MarkdownEditor, probe: LatencyProbe, directory: str, lines: int, keystrokes: int) -> dict:
+    text = make_document(lines)
+    paths = []
+    for name in ('a', 'b'):
+        path = os.path.join(directory, f'{lines}-{name}.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text if name == 'a' else text.replace('Section', 'Part'))
+        paths.append(path)
+    for path in paths:
+        editor.open_document(path)
+        probe.wait_idle(editor)
+
+    results = {}
+    def record(action_name: str, action, changes_text: bool = True) -> None:
+        paint, preview = probe.measure(action, changes_text)
+        samples = results.setdefault(action_name, {'paint': [], 'preview': [], 'timeouts': 0})
+        for kind, value in (('paint', paint), ('preview', preview)):
+            if kind == 'preview' and not changes_text:
+                continue
+            if value is None:
+                samples['timeouts'] += 1
+            else:
+                samples[kind].append(value * 1000)
+
+    cursor = editor.input_text.textCursor()
+    cursor.setPosition(len(text) // 2)
+    editor.input_text.setTextCursor(cursor)
+    for i in range(keystrokes):
+        record('type', lambda c=TYPED_TEXT[i % len(TYPED_TEXT)]: QTest.keyClick(editor.input_text, c))
+    QApplication.clipboard().setText(make_document(50))
+    for _ in range(max(1, keystrokes // 20)):
+        record('paste', lambda: QTest.keyClick(editor.input_text, Qt.Key_V, Qt.ControlModifier))
+    for i in range(max(2, keystrokes // 20)):
+        record('switch', lambda: editor.open_document(paths[i % 2]))
+    for i in range(max(1, keystrokes // 40)):
+        scripted_dialog([f'Section {i}'])
+        record('find', editor.show_find_dialog, changes_text=False)
+        scripted_dialog([f'Section {i}', f'Chapter {i}'])
+        record('replace', editor.show_replace_dialog)
+
+    # Close the tabs without prompting to save the edits
+    for path in paths:
+        index = editor.find_tab(path)
+        tab = editor.tab_bar.tabData(index)
+        if tab.document is not None:
+            tab.document.setModified(False)
+        editor.close_tab(index)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[100, 2000, 20000],
+                        help='sizes of the sample documents in lines')
+    parser.add_argument('--keystrokes', type=int, default=200, help='characters typed per document')
+    parser.add_argument('--paint-p95', type=float, default=50.0,
+                        help='fail when the p95 keystroke-to-paint latency exceeds this many ms')
+    parser.add_argument('--preview-p95', type=float, default=500.0,
+                        help='fail when the p95 keystroke-to-preview latency exceeds this many ms')
+    parser.add_argument('--switch-p95', type=float, default=200.0,
+                        help='fail when the p95 time to show another open document exceeds this many ms')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    editor = MarkdownEditor()
+    editor.resize(1400, 900)
+    editor.show()
+    if not editor.is_split_view:
+        editor.toggle_view()
+    probe = LatencyProbe(editor)
+    # Give the render worker time to start so it does not count against the first keystrokes
+    probe.settle(3.0)
+
+    limits = {'paint': args.paint_p95, 'preview': args.preview_p95}
+    failures = []
+    directory = tempfile.mkdtemp(prefix='latency-docs-')
+    print(f'{"lines":>7} {"action":>8} {"metric":>8} {"n":>5} {"p50":>8} {"p90":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+    for lines in args.lines:
+        results = run_size(editor, probe, directory, lines, args.keystrokes)
+        for action_name, samples in results.items():
+            for metric in ('paint', 'preview'):
+                values = samples[metric]
+                if not values:
+                    continue
+                p95 = percentile(values, 0.95)
+                print(f'{lines:>7} {action_name:>8} {metric:>8} {len(values):>5} '
+                      f'{percentile(values, 0.5):>8.1f} {percentile(values, 0.9):>8.1f} {p95:>8.1f} '
+                      f'{percentile(values, 0.99):>8.1f} {max(values):>8.1f}')
+                # Switching documents lays out the whole document, it is not held to the keystroke budget
+                limit = args.switch_p95 if action_name == 'switch' else limits[metric]
+                if p95 > limit:
+                    failures.append(f'{lines} lines {action_name} {metric} p95 {p95:.1f} ms > {limit:.0f} ms')
+            if samples['timeouts']:
+                failures.append(f'{lines} lines {action_name}: {samples["timeouts"]} updates did not arrive '
+                                f'within {WAIT_LIMIT:.0f} s')
+
+    editor.render_worker.stop()
+    if failures:
+        print('\nFAILED')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nOK')
+
+if __name__ == '__main__':
+    main()
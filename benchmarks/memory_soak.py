@@ -0,0 +1,148 @@
+"""Check that memory stays flat over a long editing session.
+
+Runs the full editor offscreen, opens a sample document and applies a
+repeating cycle of edits, waiting for the preview to catch up after each.
+After a warm-up that fills the render caches it samples Python allocations
+(tracemalloc), live Qt objects and the resident memory of the editor and of
+the preview's render process, and exits with status 1 when any of them grew
+by more than its limit by the end of the run.
+
+    python benchmarks/memory_soak.py --renders 10000 --sample-every 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# Keep the editor's settings, session and caches out of the user's home
+os.environ['HOME'] = tempfile.mkdtemp(prefix='memory-soak-home-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import QApplication
+
+from markdown_editor import MarkdownEditor, MemoryDiagnostics
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', '**bold**', '`code`', '[link](other.md)', '# Heading']
+MEGABYTE = 1024 * 1024
+
+def make_document(lines: int) -> str:
+    parts = []
+    section = 0
+    while sum(part.count('\n') for part in parts) < lines:
+        parts.append(f'## Section {section}\n\nParagraph {section} with *emphasis* and a [link](page{section}.md).\n\n')
+        if section % 5 == 0:
+            parts.append(f'```python\nprint({section})\n```\n\n- one\n- two\n\n')
+        section += 1
+    return ''.join(parts)
+
+def wait_for_preview(app: QApplication, editor: MarkdownEditor, timeout: float = 10.0) -> bool:
+    """Process events until the preview shows the current text"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        renderer = editor.current_tab.renderer
+        if renderer.source_text == editor.input_text.toPlainText() and not editor.preview_timer.isActive() \
+                and editor.render_worker.current is None and not editor.preview_loading:
+            return True
+        time.sleep(0.0005)
+    return False
+
+def edit(editor: MarkdownEditor, step: int, positions: list) -> None:
+    """Odd steps undo the insertion of the step before, so the cycle revisits the same texts"""
+    cursor = editor.input_text.textCursor()
+    position = positions[(step // 2) % len(positions)]
+    word = WORDS[(step // 2) % len(WORDS)] + ' '
+    cursor.setPosition(position)
+    if step % 2 == 0:
+        cursor.insertText(word)
+    else:
+        cursor.setPosition(position + len(word), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+
+def describe(sample: dict) -> str:
+    def megabytes(value):
+        return f'{value / MEGABYTE:8.1f}' if value is not None else '     n/a'
+    return (f'{sample["renders"]:>8} {megabytes(sample["python_bytes"])} {megabytes(sample["rss_bytes"])} '
+            f'{megabytes(sample["render_process_rss_bytes"])} {sample["qt_objects"]:>10}')
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=2000, help='size of the edited document in lines')
+    parser.add_argument('--renders', type=int, default=10000, help='preview updates after the warm-up')
+    parser.add_argument('--warmup', type=int, default=1000, help='preview updates before the baseline sample')
+    parser.add_argument('--sample-every', type=int, default=1000, help='preview updates between samples')
+    parser.add_argument('--max-python-growth-mb', type=float, default=5.0)
+    parser.add_argument('--max-rss-growth-mb', type=float, default=50.0)
+    parser.add_argument('--max-render-process-growth-mb', type=float, default=100.0)
+    parser.add_argument('--max-qt-object-growth', type=int, default=20)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    editor = MarkdownEditor()
+    editor.resize(1400, 900)
+    editor.show()
+    if not editor.is_split_view:
+        editor.toggle_view()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='memory-soak-docs-'), 'soak.md')
+    text = make_document(args.lines)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    editor.open_document(path)
+    # The worker process starts with the editor; give it time before the first render counts
+    wait_for_preview(app, editor, timeout=60.0)
+    positions = [text.index(f'Paragraph {i} ') for i in range(0, 200, 7)]
+    # Autosave would write the edits back to the file on its own schedule
+    editor.autosave_timer.stop()
+
+    diagnostics = MemoryDiagnostics(top=10)
+    stalls = 0
+    print(f'{"renders":>8} {"python":>8} {"rss":>8} {"render":>8} {"qt objects":>10}  (MB)')
+    baseline = None
+    sample = None
+    for step in range(args.warmup + args.renders):
+        edit(editor, step, positions)
+        if not wait_for_preview(app, editor):
+            stalls += 1
+        diagnostics.renders = step + 1
+        if step + 1 == args.warmup or (step + 1 > args.warmup and (step + 1 - args.warmup) % args.sample_every == 0):
+            sample = diagnostics.sample(editor, editor.preview_area.page().renderProcessPid())
+            print(describe(sample), flush=True)
+            if baseline is None:
+                baseline = sample
+
+    failures = []
+    if stalls:
+        failures.append(f'the preview did not catch up after {stalls} edits')
+    for key, limit, label in (
+        ('python_bytes', args.max_python_growth_mb, 'Python allocations'),
+        ('rss_bytes', args.max_rss_growth_mb, 'editor RSS'),
+        ('render_process_rss_bytes', args.max_render_process_growth_mb, 'render process RSS'),
+    ):
+        if baseline[key] is None or sample[key] is None:
+            print(f'{label}: not available on this platform')
+            continue
+        growth = (sample[key] - baseline[key]) / MEGABYTE
+        if growth > limit:
+            failures.append(f'{label} grew by {growth:.1f} MB (limit {limit:.0f} MB)')
+    object_growth = sample['qt_objects'] - baseline['qt_objects']
+    if object_growth > args.max_qt_object_growth:
+        failures.append(f'{object_growth} more Qt objects (limit {args.max_qt_object_growth})')
+
+    editor.current_tab.document.setModified(False)
+    editor.render_worker.stop()
+    if failures:
+        print('\nFAILED')
+        for failure in failures:
+            print(f'  {failure}')
+        print('Largest Python growth since the previous sample:')
+        for stat in sample['python_growth']:
+            print(f'  {stat}')
+        sys.exit(1)
+    print('\nOK')
+
+if __name__ == '__main__':
+    main()
@@ -1,190 +1,4362 @@
 import sys
 import os
 import json
-import pyperclip
+import html
+from collections import OrderedDict, Counter
 from enum import Enum
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Tuple, Callable, NamedTuple
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTextEdit, QFileSystemModel,
     QSplitter, QWidget, QVBoxLayout, QHBoxLayout, 
     QPushButton, QTreeView, QStyle, QFileDialog, QMessageBox,
     QInputDialog, QMenu, QAction, QToolButton, QLineEdit, 
-    QShortcut, QStatusBar
+    QShortcut, QStatusBar, QProgressDialog, QTabBar, QDockWidget,
+    QTreeWidget, QTreeWidgetItem, QCompleter, QFormLayout, QLabel, QScrollArea, QDialog, QTextBrowser
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings, QWebEnginePage, QWebEngineProfile
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
 from PyQt5.QtCore import (
-    Qt, QDir, pyqtSlot, QTimer, QModelIndex,
-    QAbstractItemModel, QVariant, QObject
+    Qt, QDir, pyqtSlot, pyqtSignal, QTimer, QModelIndex,
+    QAbstractItemModel, QVariant, QObject, QUrl, QMarginsF, QRunnable, QThreadPool,
+    QFileSystemWatcher, QStringListModel, QSize, QByteArray, QBuffer, QIODevice, QSortFilterProxyModel
 )
-from PyQt5.QtGui import QFont, QPalette, QColor, QKeySequence
+from PyQt5.QtGui import (
+    QFont, QPalette, QColor, QKeySequence, QPageLayout, QPageSize, QTextDocument,
+    QTextCursor, QTextBlockUserData, QSyntaxHighlighter, QImageReader, QDesktopServices
+)
+from PyQt5 import sip
 from PyQt5.QtWebChannel import QWebChannel
 import markdown2
 import re
+import time
+import hashlib
+import threading
+import uuid
+import difflib
+import bisect
+import multiprocessing
+import shutil
+import queue
+import tracemalloc
+import zlib
+import fnmatch
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+class ColorTheme(Enum):
+    # Backgrounds
+    WINDOW_BG = '#2B2B2B'          # Main window background
+    EDITOR_BG = '#1E1E1E'          # Editor and panels background
+    
+    # Text Colors
+    TEXT_PRIMARY = '#FFFFFF'        # Primary text color
+    TEXT_SECONDARY = '##000000'      # Secondary text color
+    
+    # Button Colors
+    BUTTON_BG = '#FFFFFF'          # Button background
+    BUTTON_TEXT = '#663399'        # Button text color
+    BUTTON_BORDER = '#FFD700'      # Button border
+    BUTTON_HOVER_BG = '#faebd7'    # Button hover background
+    BUTTON_HOVER_TEXT = '#B8860B'  # Button hover text
+    
+    # Accent Colors
+    ACCENT_PRIMARY = '#663399'     # Primary accent (purple)
+    ACCENT_SECONDARY = '#FFD700'   # Secondary accent (gold)
+    ACCENT_TERTIARY = '#B8860B'    # Tertiary accent (dark gold)
+    ACCENT_HIGHLIGHT = '#eb93eb'   # Highlight accent (light purple)
+    
+    # Interactive Elements
+    HOVER_BG = '#3D3D3D'          # Generic hover background
+    FOCUS_BORDER = '#eb93eb'      # Focus state border
+    SELECTION_BG = '#663399'      # Selected item background
+    
+    # Scrollbar
+    SCROLLBAR_BG = '#1E1E1E'      # Scrollbar background
+    SCROLLBAR_HANDLE = '#FFFFFF'   # Scrollbar handle
+    SCROLLBAR_BORDER = '#B8860B'   # Scrollbar border
+    
+    # Menu and Toolbar
+    MENU_BG = '#1E1E1E'           # Menu background
+    MENU_TEXT = '#FFFFFF'         # Menu text
+    MENU_BORDER = '#B8860B'       # Menu border
+    MENU_ITEM_SELECTED = '#663399' # Selected menu item
+
+    def __str__(self):
+        return self.value
+
+    def __format__(self, format_spec):
+        return self.value
+
+class CopyHandler(QObject):
+    copied = pyqtSignal(str)
+
+    def __init__(self, block_source: Optional[Callable[[int], Optional[str]]] = None,
+                 parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.block_source = block_source
+    
+    @pyqtSlot(str)
+    def copy_to_clipboard(self, text: str) -> None:
+        QApplication.clipboard().setText(text)
+        self.copied.emit(text)
+
+    @pyqtSlot(int)
+    def copy_block(self, block_index: int) -> None:
+        """Copy the markdown source of a rendered block, sliced from the cached block map"""
+        text = self.block_source(block_index) if self.block_source else None
+        if text is not None:
+            self.copy_to_clipboard(text)
+
+class KeyBindings(Enum):
+    # Editor Mode Controls
+    TOGGLE_EDIT_MODE = 'E'
+    EXIT_EDIT_MODE = 'Esc'
+    
+    # File Operations
+    SAVE_FILE = 'Ctrl+S'
+    NEW_FILE = 'Ctrl+N'
+    OPEN_FILE = 'Ctrl+O'
+    
+    # Edit Operations
+    UNDO = 'Ctrl+Z'
+    REDO = 'Ctrl+Y'
+    CUT = 'Ctrl+X'
+    COPY = 'Ctrl+C'
+    PASTE = 'Ctrl+V'
+    
+    # Navigation
+    FIND = 'Ctrl+F'
+    REPLACE = 'Ctrl+H'
+    
+    # View Controls
+    TOGGLE_PREVIEW = 'Q'
+    TOGGLE_FILE_BROWSER = 'Ctrl+B'
+    TOGGLE_OUTLINE = 'Ctrl+Shift+O'
+    
+    # Export
+    EXPORT = 'Ctrl+Shift+E'
+
+    # Review
+    SHOW_CHANGES = 'Ctrl+D'
+    SHOW_HISTORY = 'Ctrl+Shift+H'
+
+    # Diagnostics
+    RECORD_PROFILE = 'Ctrl+Alt+P'
+
+class FontStyle(Enum):
+    # Editor fonts
+    EDITOR_MAIN = {
+        'family': 'Consolas',
+        'size': 12,
+        'weight': 75,  # Bold
+        'italic': False
+    }
+    
+    EDITOR_HEADING1 = {
+        'family': 'Consolas',
+        'size': 20,
+        'weight': 75,  # Bold
+        'italic': False
+    }
+    
+    EDITOR_HEADING2 = {
+        'family': 'Consolas',
+        'size': 16,
+        'weight': 75,  # Bold
+        'italic': False
+    }
+    
+    # UI Element fonts
+    BUTTON_TEXT = {
+        'family': 'Segoe UI',
+        'size': 10,
+        'weight': 63,  # DemiBold
+        'italic': False
+    }
+    
+    MENU_TEXT = {
+        'family': 'Segoe UI',
+        'size': 10,
+        'weight': 50,  # Normal
+        'italic': False
+    }
+    
+    STATUS_BAR = {
+        'family': 'Segoe UI',
+        'size': 9,
+        'weight': 50,  # Normal
+        'italic': False
+    }
+    
+    FILE_BROWSER = {
+        'family': 'Segoe UI',
+        'size': 10,
+        'weight': 50,  # Normal
+        'italic': False
+    }
+    
+    TITLE_BAR = {
+        'family': 'Segoe UI',
+        'size': 11,
+        'weight': 63,  # DemiBold
+        'italic': False
+    }
+    
+    # Preview fonts
+    PREVIEW_BODY = {
+        'family': 'Segoe UI',
+        'size': 12,
+        'weight': 50,  # Normal
+        'italic': False
+    }
+    
+    PREVIEW_CODE = {
+        'family': 'Consolas',
+        'size': 12,
+        'weight': 50,  # Normal
+        'italic': False
+    }
+    
+    PREVIEW_QUOTE = {
+        'family': 'Segoe UI',
+        'size': 12,
+        'weight': 50,  # Normal
+        'italic': True
+    }
+
+    def create_font(self):
+        """Create a QFont object from the style configuration"""
+        font = QFont(self.value['family'], self.value['size'])
+        font.setWeight(self.value['weight'])
+        font.setItalic(self.value['italic'])
+        return font
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown', '.prompt')
+MARKDOWN_NAME_FILTERS = ['*' + ext for ext in MARKDOWN_EXTENSIONS]
+TEXT_ENCODINGS = ['utf-8', 'utf-8-sig', 'latin1', 'cp1252']
+
+MARKDOWN_EXTRAS = [
+    'fenced-code-blocks',
+    'tables',
+    'code-friendly',
+    'break-on-newline',
+    'cuddled-lists',
+    'markdown-in-html'
+]
+MARKDOWN_FALLBACK_EXTRAS = ['code-friendly']
+
+# Local files referenced by the preview are served through this scheme
+ASSET_SCHEME = b'mdasset'
+PREVIEW_PAGE_NAME = '.markdown-editor-preview.html'
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+}
+# Formats served as-is: vector images and possibly animated ones
+UNSCALED_IMAGE_TYPES = {'.svg', '.gif', '.ico'}
+
+# QWebEnginePage.setHtml silently fails for content above 2MB
+SET_HTML_SIZE_LIMIT = 2 * 1024 * 1024 - 1024
+
+# Typing in a long document re-renders the preview after a pause of up to this long
+PREVIEW_DELAY_LIMIT_MS = 250
+PREVIEW_DELAY_LINES_PER_MS = 100
+
+WEB_CHANNEL_SCRIPT = '''
+<script type="text/javascript" src="qrc:///qtwebchannel/qwebchannel.js"></script>
+<script type="text/javascript">
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        window.copyHandler = channel.objects.copyHandler;
+    });
+    // Click a rendered block to copy its markdown source; only the block id crosses the channel
+    document.addEventListener('click', function(event) {
+        if (event.target.closest('a, input, .md-vtable th') || window.getSelection().toString()) {
+            return;
+        }
+        var block = event.target.closest('.md-block');
+        if (!block || !window.copyHandler) {
+            return;
+        }
+        window.copyHandler.copy_block(parseInt(block.dataset.block, 10));
+        block.classList.add('md-copied');
+        setTimeout(function() { block.classList.remove('md-copied'); }, 600);
+    });
+</script>
+'''
+
+# Virtualized grid for large tables: only the rows in view exist in the DOM
+VIRTUAL_TABLE_SCRIPT = '''
+<script type="text/javascript">
+    function mdEscape(text) {
+        // Also used inside title="..." attributes, so quotes are escaped too
+        return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    }
+    function mdCompare(a, b) {
+        var x = parseFloat(a), y = parseFloat(b);
+        if (!isNaN(x) && !isNaN(y) && isFinite(a) && isFinite(b)) {
+            return x - y;
+        }
+        return String(a).localeCompare(String(b), undefined, {numeric: true, sensitivity: 'base'});
+    }
+    function mdInitVirtualTables(root) {
+        (root || document).querySelectorAll('.md-vtable:not([data-ready])').forEach(function(container) {
+            container.setAttribute('data-ready', '1');
+            var data = JSON.parse(container.querySelector('.md-vtable-data').textContent);
+            var rowHeight = 30;
+            var order = data.rows.map(function(_, i) { return i; });
+            var view = order;
+            var sortColumn = -1, ascending = true;
+            var searchText = null;
+
+            var toolbar = document.createElement('div');
+            toolbar.className = 'md-vtable-toolbar';
+            var filter = document.createElement('input');
+            filter.type = 'search';
+            filter.className = 'md-vtable-filter';
+            filter.placeholder = 'Filter ' + data.rows.length + ' rows...';
+            var status = document.createElement('span');
+            toolbar.appendChild(filter);
+            toolbar.appendChild(status);
+
+            var header = document.createElement('table');
+            var headRow = header.createTHead().insertRow();
+            data.headers.forEach(function(title, column) {
+                var cell = document.createElement('th');
+                cell.textContent = title;
+                cell.style.textAlign = data.align[column] || '';
+                cell.addEventListener('click', function() { sortBy(column); });
+                headRow.appendChild(cell);
+            });
+
+            var viewport = document.createElement('div');
+            viewport.className = 'md-vtable-viewport';
+            var spacer = document.createElement('div');
+            var body = document.createElement('table');
+            var tbody = body.createTBody();
+            spacer.appendChild(body);
+            viewport.appendChild(spacer);
+            container.appendChild(toolbar);
+            container.appendChild(header);
+            container.appendChild(viewport);
+
+            function draw() {
+                spacer.style.height = (view.length * rowHeight) + 'px';
+                var first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - 5);
+                var last = Math.min(view.length, first + Math.ceil(viewport.clientHeight / rowHeight) + 10);
+                var html = [];
+                for (var i = first; i < last; i++) {
+                    var row = data.rows[view[i]];
+                    html.push('<tr>');
+                    for (var c = 0; c < data.headers.length; c++) {
+                        var value = mdEscape(row[c] === undefined ? '' : row[c]);
+                        html.push('<td style="text-align:' + (data.align[c] || 'left') + '" title="' + value + '">' + value + '</td>');
+                    }
+                    html.push('</tr>');
+                }
+                tbody.innerHTML = html.join('');
+                body.style.transform = 'translateY(' + (first * rowHeight) + 'px)';
+                status.textContent = view.length + ' of ' + data.rows.length + ' rows';
+            }
+            function applyFilter() {
+                var query = filter.value.toLowerCase();
+                if (query && searchText === null) {
+                    searchText = data.rows.map(function(row) { return row.join('\\u0000').toLowerCase(); });
+                }
+                view = query ? order.filter(function(i) { return searchText[i].indexOf(query) !== -1; }) : order;
+                viewport.scrollTop = 0;
+                draw();
+            }
+            function sortBy(column) {
+                ascending = sortColumn === column ? !ascending : true;
+                sortColumn = column;
+                order = order.slice().sort(function(a, b) {
+                    var result = mdCompare(data.rows[a][column] || '', data.rows[b][column] || '');
+                    return ascending ? result : -result;
+                });
+                Array.prototype.forEach.call(headRow.cells, function(cell, i) {
+                    cell.setAttribute('data-sort', i === column ? (ascending ? 'asc' : 'desc') : '');
+                });
+                applyFilter();
+            }
+            viewport.addEventListener('scroll', function() { window.requestAnimationFrame(draw); });
+            filter.addEventListener('input', applyFilter);
+            draw();
+        });
+    }
+    document.addEventListener('DOMContentLoaded', function() { mdInitVirtualTables(); });
+</script>
+'''
+
+# Edits replace the changed blocks in place instead of loading a new page for every render
+PREVIEW_PATCH_SCRIPT = '''
+<script type="text/javascript">
+    function mdPatch(start, removeCount, html, lines) {
+        var blocks = document.querySelectorAll('body > .md-block');
+        var next = blocks[start + removeCount] || null;
+        for (var i = start; i < start + removeCount && i < blocks.length; i++) {
+            blocks[i].remove();
+        }
+        var template = document.createElement('template');
+        template.innerHTML = html;
+        document.body.insertBefore(template.content, next);
+        if (lines.length) {
+            // Blocks after the edit moved; renumber them for click-to-copy and scroll sync
+            blocks = document.querySelectorAll('body > .md-block');
+            for (var j = 0; j < lines.length && start + j < blocks.length; j++) {
+                blocks[start + j].setAttribute('data-block', start + j);
+                blocks[start + j].setAttribute('data-lines', lines[j]);
+            }
+        }
+        mdInitVirtualTables();
+    }
+</script>
+'''
+
+# Book pages hold one placeholder per chapter; only chapters near the viewport have content
+BOOK_SCRIPT = '''
+<script type="text/javascript" src="qrc:///qtwebchannel/qwebchannel.js"></script>
+<script type="text/javascript">
+    // Chapters within this many screens of the viewport are loaded, beyond the second margin emptied again
+    var MD_BOOK_LOAD_SCREENS = 1;
+    var MD_BOOK_KEEP_SCREENS = 3;
+    var mdBookScheduled = false;
+    var mdBookFirst = -1, mdBookLast = -1;
+    function mdBookRange(screens) {
+        var margin = window.innerHeight * screens;
+        var top = window.scrollY - margin, bottom = window.scrollY + window.innerHeight + margin;
+        var chapters = document.querySelectorAll('.md-chapter'), first = -1, last = -1;
+        for (var i = 0; i < chapters.length; i++) {
+            var chapterTop = chapters[i].offsetTop;
+            if (chapterTop > bottom) {
+                break;
+            }
+            if (chapterTop + chapters[i].offsetHeight >= top) {
+                if (first < 0) {
+                    first = i;
+                }
+                last = i;
+            }
+        }
+        return [first, last];
+    }
+    function mdBookUpdate() {
+        mdBookScheduled = false;
+        var keep = mdBookRange(MD_BOOK_KEEP_SCREENS), load = mdBookRange(MD_BOOK_LOAD_SCREENS);
+        var missing = [];
+        document.querySelectorAll('.md-chapter').forEach(function(chapter, index) {
+            if (index < keep[0] || index > keep[1]) {
+                if (chapter.dataset.state) {
+                    mdBookEmpty(chapter);
+                }
+            } else if (index >= load[0] && index <= load[1] && !chapter.dataset.state) {
+                chapter.dataset.state = 'requested';
+                missing.push(index);
+            }
+        });
+        mdBookFirst = keep[0];
+        mdBookLast = keep[1];
+        if (window.bookBridge && missing.length) {
+            window.bookBridge.request_chapters(keep[0], keep[1], missing);
+        }
+    }
+    function mdBookSchedule() {
+        if (!mdBookScheduled) {
+            mdBookScheduled = true;
+            window.requestAnimationFrame(mdBookUpdate);
+        }
+    }
+    function mdBookEmpty(chapter) {
+        // Keep the measured height so the scrollbar does not jump
+        var body = chapter.querySelector('.md-chapter-body');
+        body.style.height = body.offsetHeight + 'px';
+        body.innerHTML = '';
+        delete chapter.dataset.state;
+    }
+    function mdBookFill(index, html) {
+        var chapter = document.getElementById('md-chapter-' + index);
+        if (!chapter || chapter.dataset.state !== 'requested' || index < mdBookFirst || index > mdBookLast) {
+            return;
+        }
+        var body = chapter.querySelector('.md-chapter-body');
+        var before = body.offsetHeight;
+        var above = chapter.offsetTop + chapter.offsetHeight <= window.scrollY;
+        body.innerHTML = html;
+        body.style.height = '';
+        chapter.dataset.state = 'loaded';
+        mdInitVirtualTables(body);
+        if (above) {
+            // A chapter above the viewport changed size; keep the text being read in place
+            window.scrollBy(0, body.offsetHeight - before);
+        }
+        mdBookSchedule();
+    }
+    window.addEventListener('scroll', mdBookSchedule);
+    window.addEventListener('resize', mdBookSchedule);
+    document.addEventListener('click', function(event) {
+        var title = event.target.closest('.md-chapter-title');
+        if (title && window.bookBridge) {
+            window.bookBridge.open_chapter(parseInt(title.dataset.index, 10));
+        }
+    });
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        window.bookBridge = channel.objects.bookBridge;
+        mdBookUpdate();
+    });
+</script>
+'''
+
+LIST_ITEM_PATTERN = re.compile(r'^\s{0,3}(?:[*+-]|\d+[.)])\s')
+FENCE_PATTERN = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+ATX_HEADING_PATTERN = re.compile(r'^\s{0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+HTML_BLOCK_PATTERN = re.compile(r'^\s{0,3}<([a-zA-Z][a-zA-Z0-9]*)[\s>/]')
+HTML_BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl', 'fieldset',
+    'figure', 'footer', 'form', 'header', 'nav', 'ol', 'p', 'pre', 'section',
+    'table', 'ul'
+}
+TABLE_DELIMITER_PATTERN = re.compile(r'^\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$')
+TABLE_CELL_SPLIT_PATTERN = re.compile(r'(?<!\\)\|')
+# Tables with more rows than this are rendered as a virtualized grid
+LARGE_TABLE_ROWS = 500
+LINK_REFERENCE_PATTERN = re.compile(r'^[ ]{0,3}\[[^\]]+\]:[ \t]*\S+.*$', re.MULTILINE)
+
+def read_text_file(file_path: str) -> str:
+    """Read a text file, trying each supported encoding in turn"""
+    for encoding in TEXT_ENCODINGS:
+        try:
+            with open(file_path, 'r', encoding=encoding) as file:
+                return file.read()
+        except UnicodeDecodeError:
+            continue
+        except Exception as e:
+            raise Exception(f"Error opening file: {str(e)}")
+    raise Exception("Could not decode file with any supported encoding")
+
+CONFIG_DIR = os.path.join(os.path.expanduser('~'), '.markdown_editor')
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.markdown_editor_cache')
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    # Rendered state kept for inactive tabs before the least recently used get evicted
+    'tab_memory_budget_mb': 256,
+    # Also close the text of evicted unmodified tabs, losing their undo history, cursor and scroll position
+    'tab_evict_documents': False,
+    # Size of the on-disk cache of rendered documents
+    'render_cache_max_mb': 200,
+    # Size of the on-disk cache of downscaled preview images
+    'thumbnail_cache_max_mb': 100,
+    # How often open files are checked for changes the file watcher missed
+    'file_poll_interval_ms': 2000,
+    # Time a single block may take to convert before the render worker is restarted
+    'render_timeout_ms': 2000,
+    # Log a memory sample every this many preview updates; 0 turns memory diagnostics off
+    'memory_diagnostics_renders': 0,
+    # 'web' for the full browser preview, 'native' for the lightweight one, 'auto' to pick by memory
+    'preview_backend': 'auto',
+    # Length of a profile recorded with the profiler shortcut
+    'profile_seconds': 10,
+    # Saved versions older than this are dropped from the version history
+    'history_keep_days': 90,
+    # Show only the file browser folders that contain markdown or prompt files somewhere below them
+    'markdown_only_tree': True,
+    # Folders the markdown-only file browser never scans or lists
+    'tree_ignore_globs': ['.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv'],
+}
+
+# Bump whenever rendered HTML changes shape so stale disk cache entries are ignored
+RENDERER_VERSION = 3
+
+def atomic_write_bytes(file_path: str, data: bytes) -> None:
+    """Write a file via a temporary sibling so readers never see a partial file"""
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    temp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def atomic_write_text(file_path: str, text: str) -> None:
+    atomic_write_bytes(file_path, text.encode('utf-8'))
+
+def spawn_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """A process pool with freshly started workers; forking a process running Qt and web engine threads can deadlock"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def stop_process_pool(executor: ProcessPoolExecutor, futures: List[Future]) -> None:
+    """Shut a pool down without waiting, cancelling the submitted work that has not started.
+
+    Cancels the futures by hand, shutdown's cancel_futures needs Python 3.9.
+    """
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+class EditorSettings:
+    """User settings stored as JSON in the config directory, falling back to defaults"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.path.join(CONFIG_DIR, 'settings.json')
+        self.values: Dict[str, Any] = dict(DEFAULT_SETTINGS)
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.values.update(data)
+        except FileNotFoundError:
+            # Write the defaults so users have a file to edit
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Could not write settings: {str(e)}")
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Could not read settings: {str(e)}")
+
+    def get(self, key: str) -> Any:
+        return self.values.get(key, DEFAULT_SETTINGS.get(key))
+
+    def set(self, key: str, value: Any) -> None:
+        self.values[key] = value
+        self.save()
+
+    def save(self) -> None:
+        atomic_write_text(self.path, json.dumps(self.values, indent=4))
+
+# Number of files listed in the Recent menu
+RECENT_FILES_LIMIT = 15
+
+class EditorSession:
+    """Open tabs, view state and recent files of the last run, stored as JSON in the config directory"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.path.join(CONFIG_DIR, 'session.json')
+        self.state: Dict[str, Any] = {}
+        self.recent_files: List[str] = []
+        self.saved_json = ''
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.saved_json = f.read()
+            data = json.loads(self.saved_json)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Could not read session: {str(e)}")
+            return
+        if isinstance(data, dict):
+            self.state = data
+            self.recent_files = [path for path in data.get('recent_files') or [] if isinstance(path, str)]
+
+    def add_recent(self, file_path: str) -> None:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        self.recent_files = [file_path] + [path for path in self.recent_files if path != file_path]
+        del self.recent_files[RECENT_FILES_LIMIT:]
+
+    def save(self, state: Dict[str, Any]) -> None:
+        self.state = dict(state, recent_files=self.recent_files)
+        data = json.dumps(self.state, indent=4)
+        # Called periodically, only touch the disk when something changed
+        if data != self.saved_json:
+            atomic_write_text(self.path, data)
+            self.saved_json = data
+
+PROJECTS_SCHEMA_VERSION = 2
+# Number of recently opened files remembered per project
+PROJECT_RECENT_FILES = 10
+
+class ProjectStore(QObject):
+    """Projects and their cached metadata, kept in memory and persisted to the config directory.
+
+    Startup reads a single JSON file. Each project carries a snapshot of its
+    file count, recently opened files and link index state, so menus and lists
+    render without touching the project folders. Snapshot updates are
+    coalesced into one atomic write.
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, path: Optional[str] = None, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.path = path or os.path.join(CONFIG_DIR, 'projects.json')
+        self.items: List[Dict[str, Any]] = []
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.timeout.connect(self.save)
+        self.load()
+        if QApplication.instance() is not None:
+            QApplication.instance().aboutToQuit.connect(self.flush)
+
+    def load(self) -> None:
+        data = None
+        # Older versions kept projects.json in the working directory
+        for path in (self.path, 'projects.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                break
+            except FileNotFoundError:
+                continue
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Could not read projects: {str(e)}")
+                break
+        if data is None:
+            data = {"projects": [{"name": "Documents", "path": os.path.expanduser("~/Documents")}]}
+        projects = data.get("projects") if isinstance(data, dict) else None
+        self.items = [
+            self.normalize_project(project) for project in projects or []
+            if isinstance(project, dict) and project.get("name") and project.get("path")
+        ]
+        if not isinstance(data, dict) or data.get("version") != PROJECTS_SCHEMA_VERSION \
+                or not os.path.exists(self.path):
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Could not write projects: {str(e)}")
+
+    @staticmethod
+    def normalize_project(project: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = project.get("snapshot")
+        if not isinstance(snapshot, dict):
+            snapshot = {}
+        return {
+            "name": str(project["name"]),
+            "path": str(project["path"]),
+            "snapshot": {
+                "file_count": snapshot.get("file_count"),
+                "recent_files": list(snapshot.get("recent_files") or [])[:PROJECT_RECENT_FILES],
+                "index": snapshot.get("index") if isinstance(snapshot.get("index"), dict) else None,
+            },
+        }
+
+    def save(self) -> None:
+        self.save_timer.stop()
+        data = {"version": PROJECTS_SCHEMA_VERSION, "projects": self.items}
+        atomic_write_text(self.path, json.dumps(data, indent=4))
+
+    def schedule_save(self) -> None:
+        self.save_timer.start(2000)
+
+    def flush(self) -> None:
+        if self.save_timer.isActive():
+            self.save()
+
+    def projects(self) -> List[Dict[str, Any]]:
+        return self.items
+
+    def roots(self) -> List[str]:
+        return [project["path"] for project in self.items]
+
+    def add(self, name: str, path: str) -> None:
+        self.items.append(self.normalize_project({"name": name, "path": path}))
+        self.save()
+        self.changed.emit()
+
+    def remove(self, name: str) -> None:
+        self.items = [project for project in self.items if project["name"] != name]
+        self.save()
+        self.changed.emit()
+
+    def project_for(self, file_path: str) -> Optional[Dict[str, Any]]:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        matches = []
+        for project in self.items:
+            root = os.path.normpath(os.path.abspath(project["path"]))
+            if file_path == root or file_path.startswith(root + os.sep):
+                matches.append((len(root), project))
+        return max(matches, key=lambda match: match[0])[1] if matches else None
+
+    def record_opened(self, file_path: str) -> None:
+        project = self.project_for(file_path)
+        if project is None:
+            return
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        recent = [path for path in project["snapshot"]["recent_files"] if path != file_path]
+        project["snapshot"]["recent_files"] = [file_path] + recent[:PROJECT_RECENT_FILES - 1]
+        self.schedule_save()
+        self.changed.emit()
+
+    def update_index_state(self, root: str, file_count: int, link_count: int, elapsed: float) -> None:
+        root = os.path.normpath(os.path.abspath(root))
+        for project in self.items:
+            if os.path.normpath(os.path.abspath(project["path"])) == root:
+                project["snapshot"]["file_count"] = file_count
+                project["snapshot"]["index"] = {
+                    "indexed_at": time.time(),
+                    "links": link_count,
+                    "seconds": round(elapsed, 3),
+                }
+        self.schedule_save()
+
+def preprocess_code_blocks(markdown_text: str) -> str:
+    """Normalize fenced code blocks to prevent markdown2 from failing"""
+    code_block_pattern = r'```(.*?)\n(.*?)```'
+
+    def code_block_replacer(match):
+        header = match.group(1) or ''
+        code = match.group(2) or ''
+
+        # Handle empty code blocks
+        if not code.strip():
+            return '```\n \n```'  # Add a space to prevent parser errors
+
+        # Process code block content
+        lines = code.split('\n')
+        # Remove empty lines at start and end
+        while lines and not lines[0].strip():
+            lines.pop(0)
+        while lines and not lines[-1].strip():
+            lines.pop()
+
+        if not lines:  # If all lines were empty
+            return '```\n \n```'
+
+        # Ensure consistent indentation
+        min_indent = float('inf')
+        for line in lines:
+            if line.strip():  # Only check non-empty lines
+                indent = len(line) - len(line.lstrip())
+                min_indent = min(min_indent, indent)
+
+        if min_indent == float('inf'):
+            min_indent = 0
+
+        # Remove common indentation and ensure at least 4 spaces
+        processed_lines = []
+        for line in lines:
+            if line.strip():  # Keep empty lines as-is
+                line = line[min_indent:]
+            processed_lines.append('    ' + line)
+
+        # Reconstruct the code block
+        processed_code = '\n'.join(processed_lines)
+        return f'```{header}\n{processed_code}\n```'
+
+    return re.sub(code_block_pattern, code_block_replacer, markdown_text, flags=re.DOTALL)
+
+def convert_markdown(markdown_text: str) -> str:
+    """Convert markdown to an HTML fragment, falling back to a simpler conversion"""
+    processed_text = preprocess_code_blocks(markdown_text)
+    try:
+        return markdown2.markdown(processed_text, extras=MARKDOWN_EXTRAS)
+    except Exception as md_error:
+        # Fallback to simpler conversion if full conversion fails
+        try:
+            return markdown2.markdown(processed_text, extras=MARKDOWN_FALLBACK_EXTRAS)
+        except:
+            raise Exception(f"Markdown conversion failed: {str(md_error)}")
+
+def build_html_document(html_content: str, title: str = '', include_web_channel: bool = True,
+                        scripts: Optional[str] = None) -> str:
+    """Wrap rendered markdown in the preview template using the FontStyle settings.
+
+    scripts replaces the editor preview's scripts, for pages talking to other objects.
+    """
+    preview_style = FontStyle.PREVIEW_BODY.value
+    code_style = FontStyle.PREVIEW_CODE.value
+    h1_style = FontStyle.EDITOR_HEADING1.value
+    h2_style = FontStyle.EDITOR_HEADING2.value
+    channel_script = WEB_CHANNEL_SCRIPT + VIRTUAL_TABLE_SCRIPT + PREVIEW_PATCH_SCRIPT if include_web_channel else ''
+    if scripts is not None:
+        channel_script = scripts
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>{html.escape(title)}</title>
+        {channel_script}
+        <style>
+            body {{
+                font-family: {preview_style['family']};
+                font-size: {preview_style['size']}pt;
+                font-weight: {preview_style['weight']};
+                line-height: 1.6;
+                padding: 20px;
+                color: #333;
+                max-width: 900px;
+                margin: 0 auto;
+            }}
+            pre, code {{
+                font-family: {code_style['family']};
+                font-size: {code_style['size']}pt;
+                font-weight: {code_style['weight']};
+                background-color: #f6f8fa;
+                border-radius: 3px;
+            }}
+            pre {{
+                padding: 16px;
+                overflow-x: auto;
+                white-space: pre-wrap;
+                word-wrap: break-word;
+                margin: 1em 0;
+            }}
+            code {{
+                padding: 2px 4px;
+            }}
+            h1 {{
+                font-family: {h1_style['family']};
+                font-size: {h1_style['size']}pt;
+                font-weight: {h1_style['weight']};
+                border-bottom: 2px solid #eaecef;
+                padding-bottom: 0.3em;
+                margin-top: 1.5em;
+                margin-bottom: 1em;
+                color: #24292e;
+            }}
+            h2 {{
+                font-family: {h2_style['family']};
+                font-size: {h2_style['size']}pt;
+                font-weight: {h2_style['weight']};
+                border-bottom: 1px solid #eaecef;
+                padding-bottom: 0.3em;
+                margin-top: 1.5em;
+                margin-bottom: 1em;
+                color: #24292e;
+            }}
+            h3 {{
+                font-family: {h2_style['family']};
+                font-size: {int(h2_style['size'] * 0.8)}pt;
+                font-weight: {h2_style['weight']};
+                margin-top: 1.2em;
+                margin-bottom: 0.8em;
+                color: #24292e;
+            }}
+            h4 {{
+                font-family: {h2_style['family']};
+                font-size: {int(h2_style['size'] * 0.7)}pt;
+                font-weight: {h2_style['weight']};
+                margin-top: 1.2em;
+                margin-bottom: 0.8em;
+                color: #24292e;
+            }}
+            blockquote {{
+                font-family: {preview_style['family']};
+                font-size: {preview_style['size']}pt;
+                font-style: italic;
+                padding: 0 1em;
+                border-left: 0.25em solid #dfe2e5;
+                margin: 1em 0;
+                color: #6a737d;
+            }}
+            table {{
+                border-collapse: collapse;
+                width: 100%;
+                margin: 1em 0;
+            }}
+            th, td {{
+                border: 1px solid #dfe2e5;
+                padding: 6px 13px;
+            }}
+            th {{
+                background-color: #f6f8fa;
+                font-weight: 600;
+            }}
+            tr:nth-child(even) {{
+                background-color: #f6f8fa;
+            }}
+            ul, ol {{
+                padding-left: 2em;
+                margin: 1em 0;
+            }}
+            li {{
+                margin: 0.5em 0;
+            }}
+            hr {{
+                height: 2px;
+                background-color: #e1e4e8;
+                border: none;
+                margin: 2em 0;
+            }}
+            a {{
+                color: #0366d6;
+                text-decoration: none;
+            }}
+            a:hover {{
+                text-decoration: underline;
+            }}
+            img {{
+                max-width: 100%;
+                height: auto;
+            }}
+            .language-diff {{
+                color: #24292e;
+            }}
+            .language-diff .deletion {{
+                background-color: #ffeef0;
+                color: #b31d28;
+            }}
+            .language-diff .addition {{
+                background-color: #e6ffed;
+                color: #22863a;
+            }}
+            .md-vtable {{
+                margin: 1em 0;
+            }}
+            .md-vtable table {{
+                table-layout: fixed;
+                margin: 0;
+            }}
+            .md-vtable th {{
+                cursor: pointer;
+                user-select: none;
+            }}
+            .md-vtable th[data-sort="asc"]::after {{
+                content: " \\25B2";
+            }}
+            .md-vtable th[data-sort="desc"]::after {{
+                content: " \\25BC";
+            }}
+            .md-vtable td {{
+                height: 17px;
+                white-space: nowrap;
+                overflow: hidden;
+                text-overflow: ellipsis;
+            }}
+            .md-vtable-viewport {{
+                height: 480px;
+                overflow-y: auto;
+                border-bottom: 1px solid #dfe2e5;
+            }}
+            .md-vtable-toolbar {{
+                display: flex;
+                align-items: center;
+                gap: 1em;
+                margin-bottom: 0.5em;
+                color: #6a737d;
+            }}
+            .md-vtable-filter {{
+                flex: 1;
+                padding: 4px 8px;
+                border: 1px solid #dfe2e5;
+                border-radius: 3px;
+            }}
+            .{RENDER_TIMEOUT_CLASS}, #md-render-warning {{
+                border-left: 4px solid #d73a49;
+                background-color: #fff5f5;
+                padding: 8px 12px;
+                margin: 1em 0;
+                color: #86181d;
+            }}
+            .md-block {{
+                border-radius: 4px;
+                transition: background-color 0.2s;
+            }}
+            .md-block:hover {{
+                background-color: #faf8fc;
+                cursor: copy;
+            }}
+            .md-block.md-copied {{
+                background-color: {ColorTheme.BUTTON_HOVER_BG};
+                outline: 2px solid {ColorTheme.ACCENT_SECONDARY};
+            }}
+            .md-diff-summary {{
+                color: #6a737d;
+                border-bottom: 1px solid #dfe2e5;
+                padding-bottom: 0.5em;
+                margin-bottom: 1em;
+            }}
+            .md-diff-block {{
+                border-left: 4px solid transparent;
+                padding-left: 12px;
+            }}
+            .md-diff-inserted {{
+                border-left-color: #28a745;
+                background-color: #e6ffed;
+            }}
+            .md-diff-removed {{
+                border-left-color: #d73a49;
+                background-color: #ffeef0;
+                text-decoration: line-through;
+                opacity: 0.75;
+            }}
+            .md-diff-modified {{
+                margin: 0.5em 0;
+            }}
+            .md-diff-skipped {{
+                color: #6a737d;
+                text-align: center;
+                border-top: 1px dashed #dfe2e5;
+                border-bottom: 1px dashed #dfe2e5;
+                margin: 0.5em 0;
+            }}
+            .md-chapter {{
+                border-top: 1px solid #dfe2e5;
+                padding-top: 1em;
+            }}
+            .md-chapter-title {{
+                color: #6a737d;
+                font-size: 0.85em;
+                cursor: pointer;
+            }}
+        </style>
+    </head>
+    <body>
+        {html_content}
+    </body>
+    </html>
+    """
+
+# With the 'auto' preview backend, machines with less memory than this get the native preview
+LOW_MEMORY_BYTES = 4 * 1024 * 1024 * 1024
+# Large tables are a virtualized grid in the browser preview; the native one shows this many rows
+NATIVE_TABLE_ROWS = 1000
+VIRTUAL_TABLE_PATTERN = re.compile(
+    r'<div class="md-vtable" data-rows="\d+"><script type="application/json" class="md-vtable-data">(.*?)</script></div>',
+    re.DOTALL)
+BLOCK_ANCHOR_PATTERN = re.compile(r'<div class="md-block" id="([^"]*)"')
+
+def native_preview_style() -> str:
+    """The part of the preview CSS that Qt's rich text engine understands"""
+    preview_style = FontStyle.PREVIEW_BODY.value
+    code_style = FontStyle.PREVIEW_CODE.value
+    h1_style = FontStyle.EDITOR_HEADING1.value
+    h2_style = FontStyle.EDITOR_HEADING2.value
+
+    def weight(style: Dict[str, Any]) -> str:
+        return 'bold' if style['weight'] >= 63 else 'normal'
+
+    return f"""
+        body {{ font-family: {preview_style['family']}; font-size: {preview_style['size']}pt; color: #333333; }}
+        pre, code {{ font-family: {code_style['family']}; font-size: {code_style['size']}pt; background-color: #f6f8fa; }}
+        pre {{ white-space: pre-wrap; margin-top: 12px; margin-bottom: 12px; }}
+        h1 {{ font-family: {h1_style['family']}; font-size: {h1_style['size']}pt; font-weight: {weight(h1_style)}; color: #24292e; }}
+        h2 {{ font-family: {h2_style['family']}; font-size: {h2_style['size']}pt; font-weight: {weight(h2_style)}; color: #24292e; }}
+        h3 {{ font-size: {int(h2_style['size'] * 0.8)}pt; color: #24292e; }}
+        h4 {{ font-size: {int(h2_style['size'] * 0.7)}pt; color: #24292e; }}
+        blockquote {{ font-style: italic; color: #6a737d; margin-left: 16px; }}
+        th {{ background-color: #f6f8fa; font-weight: bold; }}
+        a {{ color: #0366d6; text-decoration: none; }}
+        .{RENDER_TIMEOUT_CLASS} {{ background-color: #fff5f5; color: #86181d; }}
+        .md-diff-inserted {{ background-color: #e6ffed; }}
+        .md-diff-removed {{ background-color: #ffeef0; text-decoration: line-through; }}
+        .md-diff-summary, .md-diff-skipped {{ color: #6a737d; }}
+    """
+
+def native_table_html(data: Dict[str, Any]) -> str:
+    """A large table's grid data as a plain table, cut to NATIVE_TABLE_ROWS rows"""
+    aligns = [align or 'left' for align in data['align']]
+    header = ''.join(f'<th align="{align}">{html.escape(title)}</th>' for title, align in zip(data['headers'], aligns))
+    rows = [
+        '<tr>' + ''.join(f'<td align="{align}">{html.escape(str(value))}</td>' for value, align in zip(row, aligns)) + '</tr>'
+        for row in data['rows'][:NATIVE_TABLE_ROWS]
+    ]
+    note = ''
+    if len(data['rows']) > NATIVE_TABLE_ROWS:
+        note = f'<p><i>Showing {NATIVE_TABLE_ROWS} of {len(data["rows"])} rows.</i></p>'
+    return f'<table><tr>{header}</tr>{"".join(rows)}</table>{note}'
+
+def build_native_html_document(full_html: str) -> str:
+    """Rewrite a preview page for QTextBrowser: no scripts, plain tables and anchors it can scroll to"""
+    body = full_html[full_html.index('<body>') + len('<body>'):full_html.rindex('</body>')]
+    body = VIRTUAL_TABLE_PATTERN.sub(lambda match: native_table_html(json.loads(match.group(1))), body)
+    # QTextBrowser scrolls to named anchors, not to element ids
+    body = BLOCK_ANCHOR_PATTERN.sub(r'<a name="\1"></a>\g<0>', body)
+    body = body.replace('<table>', '<table border="1" cellspacing="0" cellpadding="6" width="100%">')
+    return f'<html><body>{body}</body></html>'
+
+def total_memory() -> Optional[int]:
+    """Physical memory of this machine in bytes, or None where it cannot be read"""
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong)] + [
+                (name, ctypes.c_ulonglong) for name in (
+                    'ullTotalPhys', 'ullAvailPhys', 'ullTotalPageFile', 'ullAvailPageFile',
+                    'ullTotalVirtual', 'ullAvailVirtual', 'ullAvailExtendedVirtual')
+            ]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+        return None
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def choose_preview_backend(setting: str) -> str:
+    """'web' or 'native' for the preview_backend setting"""
+    if setting in ('web', 'native'):
+        return setting
+    memory = total_memory()
+    return 'native' if memory is not None and memory < LOW_MEMORY_BYTES else 'web'
+
+def slugify_heading(title: str) -> str:
+    """Turn a heading title into an HTML anchor id"""
+    slug = re.sub(r'[^\w\- ]', '', title.lower()).strip()
+    slug = re.sub(r'[\s_]+', '-', slug)
+    return slug or 'section'
+
+def heading_anchors(titles: List[str]) -> List[str]:
+    """Unique anchors for headings in document order, numbering repeated titles"""
+    anchors = []
+    seen: Dict[str, int] = {}
+    for title in titles:
+        slug = slugify_heading(title)
+        count = seen.get(slug, 0)
+        seen[slug] = count + 1
+        anchors.append(slug if count == 0 else f'{slug}-{count}')
+    return anchors
+
+def is_large_table(block_text: str, min_rows: int = LARGE_TABLE_ROWS) -> bool:
+    if block_text.count('\n') < min_rows + 1:
+        return False
+    lines = block_text.split('\n', 2)
+    return '|' in lines[0] and bool(TABLE_DELIMITER_PATTERN.match(lines[1]))
+
+def split_table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in TABLE_CELL_SPLIT_PATTERN.split(line)]
+
+def parse_markdown_table(block_text: str) -> Tuple[List[str], List[str], List[List[str]]]:
+    """Parse a pipe table into headers, column alignments and rows without markdown conversion"""
+    lines = block_text.split('\n')
+    headers = split_table_row(lines[0])
+    alignments = []
+    for cell in split_table_row(lines[1]):
+        if cell.startswith(':') and cell.endswith(':'):
+            alignments.append('center')
+        elif cell.endswith(':'):
+            alignments.append('right')
+        else:
+            alignments.append('')
+    alignments += [''] * (len(headers) - len(alignments))
+    rows = [split_table_row(line) for line in lines[2:] if line.strip()]
+    return headers, alignments[:len(headers)], rows
+
+def render_virtual_table(block_text: str) -> str:
+    """Embed a large table as data for the client-side virtualized grid"""
+    headers, alignments, rows = parse_markdown_table(block_text)
+    data = json.dumps({'headers': headers, 'align': alignments, 'rows': rows}, ensure_ascii=False)
+    # Keep the JSON from closing its script element
+    data = data.replace('</', '<\\/')
+    return (
+        f'<div class="md-vtable" data-rows="{len(rows)}">'
+        f'<script type="application/json" class="md-vtable-data">{data}</script></div>'
+    )
+
+class MarkdownBlock(NamedTuple):
+    """A top-level markdown block and its range in the source text"""
+    start: int
+    end: int
+    first_line: int
+    last_line: int
+    text: str
+
+def split_markdown_blocks(markdown_text: str) -> List[MarkdownBlock]:
+    """Split markdown into independently renderable top-level blocks.
+
+    Fenced code and block-level HTML are kept whole, headings get their own
+    block, and lists stay together across blank lines so numbering and
+    nesting survive.
+    """
+    lines = markdown_text.split('\n')
+    offsets = []
+    position = 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + 1
+
+    blocks: List[MarkdownBlock] = []
+
+    def add_block(first: int, last: int) -> None:
+        start = offsets[first]
+        end = offsets[last] + len(lines[last])
+        blocks.append(MarkdownBlock(start, end, first, last, markdown_text[start:end]))
+
+    def skip_fence(i: int, marker: str) -> int:
+        """Return the index of the line closing the fence opened at line i"""
+        i += 1
+        while i < len(lines) and not lines[i].lstrip().startswith(marker):
+            i += 1
+        return min(i, len(lines) - 1)
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        fence = FENCE_PATTERN.match(line)
+        if fence:
+            last = skip_fence(i, fence.group(1))
+            add_block(i, last)
+            i = last + 1
+            continue
+
+        if ATX_HEADING_PATTERN.match(line):
+            add_block(i, i)
+            i += 1
+            continue
+
+        html_tag = HTML_BLOCK_PATTERN.match(line)
+        if html_tag and html_tag.group(1).lower() in HTML_BLOCK_TAGS:
+            closing_tag = f'</{html_tag.group(1).lower()}>'
+            last = i
+            while last < len(lines) - 1 and closing_tag not in lines[last].lower():
+                last += 1
+            add_block(i, last)
+            i = last + 1
+            continue
+
+        first = i
+        is_list = bool(LIST_ITEM_PATTERN.match(line))
+        last = i
+        i += 1
+        while i < len(lines):
+            line = lines[i]
+            if line.strip():
+                indented = line[:1] in (' ', '\t')
+                fence = FENCE_PATTERN.match(line)
+                if fence and is_list and indented:
+                    last = skip_fence(i, fence.group(1))
+                    i = last + 1
+                    continue
+                if fence or ATX_HEADING_PATTERN.match(line):
+                    break
+                last = i
+                i += 1
+                continue
+
+            # A blank line ends the block unless the next line continues it
+            next_line = i
+            while next_line < len(lines) and not lines[next_line].strip():
+                next_line += 1
+            if next_line == len(lines):
+                break
+            following = lines[next_line]
+            continues_list = is_list and LIST_ITEM_PATTERN.match(following)
+            if following[:1] in (' ', '\t') or continues_list:
+                i = next_line
+                continue
+            break
+        add_block(first, last)
+        i = last + 1
+
+    return blocks
+
+def convert_block(key: str, block_text: str) -> str:
+    """Convert one block; key is the block text with any link definitions it needs appended"""
+    if is_large_table(block_text):
+        return render_virtual_table(block_text)
+    # Let the text lay out before images arrive from the asset handler
+    return convert_markdown(key).replace('<img ', '<img loading="lazy" decoding="async" ')
+
+RENDER_TIMEOUT_CLASS = 'md-render-timeout'
+
+def render_timeout_html(block_text: str) -> str:
+    """Stand-in for a block that took too long to convert: its source as plain text"""
+    return (
+        f'<div class="{RENDER_TIMEOUT_CLASS}">This block took too long to render and is shown as plain text.'
+        f'<pre>{html.escape(block_text)}</pre></div>'
+    )
+
+def changed_blocks(old_parts: List[str], new_parts: List[str]) -> Tuple[int, int, int]:
+    """(start, old_end, new_end) of the wrapped blocks that differ between two renders.
+
+    Blocks after an edit may only have moved, so the common suffix ignores
+    their data-block and data-lines attributes.
+    """
+    limit = min(len(old_parts), len(new_parts))
+    start = 0
+    while start < limit and old_parts[start] == new_parts[start]:
+        start += 1
+    old_end, new_end = len(old_parts), len(new_parts)
+    while old_end > start and new_end > start and \
+            same_block_content(old_parts[old_end - 1], new_parts[new_end - 1]):
+        old_end -= 1
+        new_end -= 1
+    return start, old_end, new_end
+
+def same_block_content(old_part: str, new_part: str) -> bool:
+    if old_part == new_part:
+        return True
+    old_data, new_data = old_part.find(' data-block='), new_part.find(' data-block=')
+    return old_part[:old_data] == new_part[:new_data] and \
+        old_part[old_part.index('>', old_data):] == new_part[new_part.index('>', new_data):]
+
+class BlockRenderer:
+    """Renders markdown block by block, caching each block's HTML by its source.
+
+    The block map of the last render is kept so that a rendered block id can
+    be resolved back to its markdown source without touching the DOM.
+    """
+
+    def __init__(self, max_cached_blocks: int = 5000, max_cached_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_cached_blocks = max_cached_blocks
+        self.max_cached_bytes = max_cached_bytes
+        self.cache: 'OrderedDict[str, str]' = OrderedDict()
+        self.cache_size = 0
+        self.blocks: List[MarkdownBlock] = []
+        self.source_text = ''
+        # Wrapped blocks of the last render; None when the body came from elsewhere and did not split cleanly
+        self.rendered_parts: Optional[List[str]] = []
+        self.body: Optional[str] = ''
+        # Checking for missing blocks and rendering split the same text, once is enough
+        self.split_text = ''
+        self.split_blocks: List[MarkdownBlock] = []
+        # Blocks of another version the changes view needs besides the document's own
+        self.extra_blocks = 0
+
+    @property
+    def rendered_body(self) -> str:
+        # Joined on demand, edits that patch the preview block by block never need the whole body
+        if self.body is None:
+            self.body = '\n'.join(self.rendered_parts)
+        return self.body
+
+    def split(self, markdown_text: str) -> List[MarkdownBlock]:
+        if markdown_text != self.split_text or not self.split_blocks:
+            self.split_blocks = split_markdown_blocks(markdown_text)
+            self.split_text = markdown_text
+        return self.split_blocks
+
+    @staticmethod
+    def cache_key(block_text: str, references: str) -> str:
+        # Reference-style links need the document's link definitions to resolve
+        if references and '[' in block_text:
+            return f'{block_text}\n\n{references}'
+        return block_text
+
+    def render_block(self, block_text: str, references: str = '') -> str:
+        key = self.cache_key(block_text, references)
+        html_content = self.cache.get(key)
+        if html_content is None:
+            html_content = convert_block(key, block_text)
+            self.store(key, html_content)
+        else:
+            self.cache.move_to_end(key)
+        return html_content
+
+    def store(self, block_text: str, html_content: str) -> None:
+        if block_text in self.cache:
+            self.cache_size -= len(block_text) + len(self.cache.pop(block_text))
+        self.cache[block_text] = html_content
+        self.cache_size += len(block_text) + len(html_content)
+        # Never evict blocks of the document being rendered, or large documents would miss on every block.
+        # The worker fills in the blocks of the pending split before it becomes self.blocks, count both.
+        # Typing leaves a version of the edited block behind on every keystroke, the byte limit drops those.
+        document_blocks = max(len(self.blocks), len(self.split_blocks)) + self.extra_blocks
+        limit = max(self.max_cached_blocks, 2 * document_blocks)
+        while len(self.cache) > limit or \
+                (self.cache_size > self.max_cached_bytes and len(self.cache) > document_blocks):
+            evicted_text, evicted_html = self.cache.popitem(last=False)
+            self.cache_size -= len(evicted_text) + len(evicted_html)
+
+    def clear_cache(self) -> None:
+        self.cache.clear()
+        self.cache_size = 0
+
+    def missing_blocks(self, markdown_text: str) -> List[Tuple[str, str]]:
+        """(cache key, block text) of the blocks a render of markdown_text would have to convert"""
+        references = '\n'.join(LINK_REFERENCE_PATTERN.findall(markdown_text))
+        missing = {}
+        for block in self.split(markdown_text):
+            key = self.cache_key(block.text, references)
+            if key not in self.cache:
+                missing[key] = block.text
+        return list(missing.items())
+
+    def render(self, markdown_text: str, anchors: Optional[List[str]] = None) -> str:
+        self.render_parts(markdown_text, anchors)
+        return self.rendered_body
+
+    def render_parts(self, markdown_text: str, anchors: Optional[List[str]] = None) -> List[str]:
+        """Render the whole document, wrapping each block in an element carrying its source range.
+
+        Heading blocks get an anchor id, taken from the heading index when
+        it agrees with the blocks and derived from the heading titles otherwise.
+        """
+        self.source_text = markdown_text
+        self.blocks = self.split(markdown_text)
+        self.extra_blocks = 0
+        references = '\n'.join(LINK_REFERENCE_PATTERN.findall(markdown_text))
+        headings = [
+            (index, ATX_HEADING_PATTERN.match(block.text))
+            for index, block in enumerate(self.blocks)
+        ]
+        headings = [(index, match.group(2) or '') for index, match in headings if match]
+        if anchors is None or len(anchors) != len(headings):
+            anchors = heading_anchors([title for _, title in headings])
+        block_anchors = {index: anchor for (index, _), anchor in zip(headings, anchors)}
+        parts = []
+        for index, block in enumerate(self.blocks):
+            anchor = block_anchors.get(index)
+            anchor_attribute = f' id="{html.escape(anchor)}"' if anchor else ''
+            parts.append(
+                f'<div class="md-block"{anchor_attribute} data-block="{index}" '
+                f'data-lines="{block.first_line + 1}-{block.last_line + 1}">'
+                f'{self.render_block(block.text, references)}</div>'
+            )
+        self.rendered_parts = parts
+        self.body = None
+        return parts
+
+    def set_source(self, markdown_text: str, rendered_body: str) -> None:
+        """Rebuild the block map for HTML rendered elsewhere, e.g. loaded from the disk cache"""
+        self.source_text = markdown_text
+        self.body = rendered_body
+        self.rendered_parts = None
+        self.blocks = self.split(markdown_text)
+        # Seed the block cache from the wrappers so the next edit only converts what changed
+        parts = rendered_body.split('\n<div class="md-block" ')
+        if len(parts) != len(self.blocks):
+            return
+        self.rendered_parts = parts[:1] + ['<div class="md-block" ' + part for part in parts[1:]]
+        references = '\n'.join(LINK_REFERENCE_PATTERN.findall(markdown_text))
+        for block, part in zip(self.blocks, parts):
+            inner = part[part.index('>') + 1:]
+            if inner.endswith('</div>'):
+                self.store(self.cache_key(block.text, references), inner[:-len('</div>')])
+
+    def block_text(self, block_index: int) -> Optional[str]:
+        if 0 <= block_index < len(self.blocks):
+            block = self.blocks[block_index]
+            return self.source_text[block.start:block.end]
+        return None
+
+class DiffBase(NamedTuple):
+    """A version of a document the buffer is compared with in the changes view"""
+    label: str
+    # The file the version was read from, reread when it changes on disk; None for fixed versions
+    file_path: Optional[str]
+    stat: Optional[Tuple[int, int]]
+    text: str
+    blocks: List[MarkdownBlock]
+
+def diff_block_lists(old_blocks: List[MarkdownBlock],
+                     new_blocks: List[MarkdownBlock]) -> List[Tuple[str, int, int, int, int]]:
+    """Opcodes in the form of SequenceMatcher.get_opcodes between two block lists, comparing blocks by text.
+
+    The common head and tail are skipped before the rest is matched the way
+    line_opcodes matches lines, so an edit to a large document only diffs
+    around the change and repeated blocks never make it quadratic.
+    """
+    # The texts themselves, not their hashes, so colliding blocks are never taken for equal;
+    # str caches its hash and compares lengths first, so this costs little more
+    old_keys = [block.text for block in old_blocks]
+    new_keys = [block.text for block in new_blocks]
+    limit = min(len(old_keys), len(new_keys))
+    start = 0
+    while start < limit and old_keys[start] == new_keys[start]:
+        start += 1
+    old_end, new_end = len(old_keys), len(new_keys)
+    while old_end > start and new_end > start and old_keys[old_end - 1] == new_keys[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    opcodes = [('equal', 0, start, 0, start)]
+    for tag, i1, i2, j1, j2 in line_opcodes(old_keys[start:old_end], new_keys[start:new_end]):
+        opcodes.append((tag, start + i1, start + i2, start + j1, start + j2))
+    opcodes.append(('equal', old_end, len(old_keys), new_end, len(new_keys)))
+    # line_opcodes reports anchors one by one; merge runs of the same kind
+    merged: List[Tuple[str, int, int, int, int]] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged and merged[-1][0] == tag:
+            merged[-1] = (tag, merged[-1][1], i2, merged[-1][3], j2)
+        else:
+            merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+def render_block_diff(renderer: BlockRenderer, base: DiffBase, markdown_text: str,
+                      context: int = 2, needed: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, int]]:
+    """Body of the changes view and the number of inserted, removed and modified blocks.
+
+    Blocks come from the renderer's cache, which already holds nearly all of
+    both versions. Unchanged runs show context blocks around each change and
+    collapse the rest, so only blocks near a change are rendered at all.
+    With needed given nothing is rendered; the blocks the body would show
+    are collected into it as cache key and block text instead.
+    """
+    new_blocks = renderer.split(markdown_text)
+    old_references = '\n'.join(LINK_REFERENCE_PATTERN.findall(base.text))
+    new_references = '\n'.join(LINK_REFERENCE_PATTERN.findall(markdown_text))
+
+    def block(text: str, references: str, kind: str) -> str:
+        if needed is not None:
+            needed[renderer.cache_key(text, references)] = text
+            return ''
+        return f'<div class="md-diff-block md-diff-{kind}">{renderer.render_block(text, references)}</div>'
+
+    def skipped(count: int) -> str:
+        return f'<div class="md-diff-skipped">{count} unchanged block{"s" if count != 1 else ""}</div>'
+
+    counts = {'inserted': 0, 'removed': 0, 'modified': 0}
+    opcodes = diff_block_lists(base.blocks, new_blocks)
+    parts = []
+    for position, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == 'equal':
+            # Context after the previous change and before the next one
+            head = context if position > 0 else 0
+            tail = context if position < len(opcodes) - 1 else 0
+            if head + tail >= j2 - j1:
+                head, tail = j2 - j1, 0
+            for index in range(j1, j1 + head):
+                parts.append(block(new_blocks[index].text, new_references, 'equal'))
+            if j2 - j1 - head - tail > 0:
+                parts.append(skipped(j2 - j1 - head - tail))
+            for index in range(j2 - tail, j2):
+                parts.append(block(new_blocks[index].text, new_references, 'equal'))
+            continue
+        paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        for offset in range(paired):
+            parts.append(
+                '<div class="md-diff-modified">'
+                f'{block(base.blocks[i1 + offset].text, old_references, "removed")}'
+                f'{block(new_blocks[j1 + offset].text, new_references, "inserted")}</div>'
+            )
+        counts['modified'] += paired
+        for index in range(i1 + paired, i2):
+            parts.append(block(base.blocks[index].text, old_references, 'removed'))
+        counts['removed'] += i2 - i1 - paired
+        for index in range(j1 + paired, j2):
+            parts.append(block(new_blocks[index].text, new_references, 'inserted'))
+        counts['inserted'] += j2 - j1 - paired
+    if any(counts.values()):
+        summary = ', '.join(f'{count} {kind}' for kind, count in counts.items() if count)
+    else:
+        summary = 'no changes'
+    header = f'<div class="md-diff-summary">Changes against {html.escape(base.label)}: {summary}</div>'
+    return header + '\n'.join(parts), counts
+
+def block_diff_missing(renderer: BlockRenderer, base: DiffBase, markdown_text: str,
+                       context: int = 2) -> List[Tuple[str, str]]:
+    """(cache key, block text) of the blocks render_block_diff would have to convert.
+
+    The cached blocks it needs are marked as recently used, and the renderer
+    keeps room for them until the changes view is rendered.
+    """
+    needed: Dict[str, str] = {}
+    render_block_diff(renderer, base, markdown_text, context, needed)
+    renderer.extra_blocks = len(needed)
+    missing = []
+    for key, block_text in needed.items():
+        if key in renderer.cache:
+            renderer.cache.move_to_end(key)
+        else:
+            missing.append((key, block_text))
+    return missing
+
+class ExportFormat(Enum):
+    HTML = '.html'
+    PDF = '.pdf'
+
+def collect_markdown_files(root: str) -> List[str]:
+    """Collect all markdown files below root in a stable order, skipping hidden directories"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                files.append(os.path.join(dirpath, filename))
+    return files
+
+def build_export_jobs(root: str, output_dir: str, export_format: ExportFormat) -> List[Tuple[str, str, Optional[str]]]:
+    """Map every markdown file below root to a destination mirroring the folder structure"""
+    jobs = []
+    for source_path in collect_markdown_files(root):
+        relative_path = os.path.splitext(os.path.relpath(source_path, root))[0]
+        jobs.append((source_path, os.path.join(output_dir, relative_path + export_format.value), None))
+    return jobs
+
+def render_export_document(source_path: str, text: Optional[str] = None) -> Tuple[str, str]:
+    """Render a markdown file to a standalone HTML document (runs inside export worker processes)"""
+    if text is None:
+        text = read_text_file(source_path)
+    title = os.path.splitext(os.path.basename(source_path))[0]
+    return source_path, build_html_document(convert_markdown(text), title, include_web_channel=False)
+
+class BatchExporter(QObject):
+    """Exports markdown files to HTML or PDF.
+
+    Markdown conversion runs in a pool of worker processes, PDF printing in a
+    small pool of offscreen web pages. Jobs are fed in with backpressure so
+    memory stays bounded however many files are exported.
+    """
+    progress = pyqtSignal(int, int, str)
+    finished = pyqtSignal(int, list)
+    _rendered = pyqtSignal(str, str, str, str)
+
+    def __init__(self, export_format: ExportFormat, max_workers: Optional[int] = None,
+                 page_pool_size: int = 4, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.export_format = export_format
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.page_pool_size = page_pool_size
+        self.jobs: List[Tuple[str, str, Optional[str]]] = []
+        self.pending_pdf: List[Tuple[str, str, str]] = []
+        self.pages: List[QWebEnginePage] = []
+        self.idle_pages: List[QWebEnginePage] = []
+        self.page_jobs: Dict[QWebEnginePage, Tuple[str, str, Optional[str]]] = {}
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # Submitted renders, cancelled when the export stops early
+        self.futures: List[Future] = []
+        self.total = 0
+        self.done = 0
+        self.exported = 0
+        self.in_flight = 0
+        self.errors: List[str] = []
+        self.cancelled = False
+        self._rendered.connect(self._on_rendered)
+
+    def start(self, jobs: List[Tuple[str, str, Optional[str]]]) -> None:
+        self.jobs = list(reversed(jobs))
+        self.total = len(jobs)
+        if not self.total:
+            self.finished.emit(0, [])
+            return
+
+        # Spawning worker processes only pays off for more than one file
+        if self.total > 1:
+            self.executor = spawn_process_pool(min(self.max_workers, self.total))
+
+        if self.export_format == ExportFormat.PDF:
+            for _ in range(min(self.page_pool_size, self.total)):
+                page = QWebEnginePage(self)
+                page.loadFinished.connect(lambda ok, p=page: self._on_page_loaded(p, ok))
+                page.pdfPrintingFinished.connect(lambda path, ok, p=page: self._on_pdf_printed(p, ok))
+                self.pages.append(page)
+                self.idle_pages.append(page)
+
+        self._feed()
+
+    def cancel(self) -> None:
+        if self.cancelled or self.done == self.total:
+            return
+        self.cancelled = True
+        self.jobs.clear()
+        self.pending_pdf.clear()
+        self._shutdown()
+        self.finished.emit(self.exported, self.errors)
+
+    def _feed(self) -> None:
+        """Submit jobs while keeping the number of rendered-but-unwritten documents bounded"""
+        limit = self.max_workers * 2
+        while self.jobs and not self.cancelled and self.in_flight + len(self.pending_pdf) < limit:
+            source_path, dest_path, text = self.jobs.pop()
+            self.in_flight += 1
+            if self.executor is None:
+                try:
+                    _, html_document = render_export_document(source_path, text)
+                    self._on_rendered(source_path, dest_path, html_document, '')
+                except Exception as e:
+                    self._on_rendered(source_path, dest_path, '', str(e))
+                continue
+            future = self.executor.submit(render_export_document, source_path, text)
+            self.futures = [f for f in self.futures if not f.done()] + [future]
+            future.add_done_callback(
+                lambda f, s=source_path, d=dest_path: self._on_future_done(f, s, d)
+            )
+
+    def _on_future_done(self, future: Future, source_path: str, dest_path: str) -> None:
+        # Called on an executor thread; the signal hands the result to the GUI thread
+        if future.cancelled():
+            return
+        try:
+            _, html_document = future.result()
+            self._rendered.emit(source_path, dest_path, html_document, '')
+        except Exception as e:
+            self._rendered.emit(source_path, dest_path, '', str(e))
+
+    def _on_rendered(self, source_path: str, dest_path: str, html_document: str, error: str) -> None:
+        self.in_flight -= 1
+        if self.cancelled:
+            return
+        if error:
+            self._finish_job(source_path, error)
+        elif self.export_format == ExportFormat.HTML:
+            try:
+                os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+                with open(dest_path, 'w', encoding='utf-8') as file:
+                    file.write(html_document)
+                self._finish_job(source_path)
+            except OSError as e:
+                self._finish_job(source_path, str(e))
+        else:
+            self.pending_pdf.append((source_path, dest_path, html_document))
+            self._print_next()
+        self._feed()
+
+    def _print_next(self) -> None:
+        while self.idle_pages and self.pending_pdf:
+            page = self.idle_pages.pop()
+            source_path, dest_path, html_document = self.pending_pdf.pop(0)
+            base_url = QUrl.fromLocalFile(os.path.dirname(os.path.abspath(source_path)) + os.sep)
+            temp_path = None
+            if len(html_document.encode('utf-8')) > SET_HTML_SIZE_LIMIT:
+                # setHtml cannot take documents above 2MB, load those from a file in the cache instead,
+                # with a <base> so relative images still resolve against the source folder
+                temp_path = os.path.join(CACHE_DIR, 'exports', f'{uuid.uuid4().hex}.html')
+                base = f'<head>\n    <base href="{html.escape(base_url.toString())}">'
+                try:
+                    atomic_write_text(temp_path, html_document.replace('<head>', base, 1))
+                except OSError as e:
+                    self.idle_pages.append(page)
+                    self._finish_job(source_path, str(e))
+                    continue
+            self.page_jobs[page] = (source_path, dest_path, temp_path)
+            if temp_path:
+                page.load(QUrl.fromLocalFile(temp_path))
+            else:
+                page.setHtml(html_document, base_url)
+
+    def _on_page_loaded(self, page: QWebEnginePage, ok: bool) -> None:
+        job = self.page_jobs.get(page)
+        if job is None or self.cancelled:
+            return
+        source_path, dest_path, _ = job
+        if not ok:
+            self._release_page(page)
+            self._finish_job(source_path, 'Could not load rendered document')
+            return
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        layout = QPageLayout(QPageSize(QPageSize.A4), QPageLayout.Portrait,
+                             QMarginsF(15, 15, 15, 15), QPageLayout.Millimeter)
+        page.printToPdf(dest_path, layout)
+
+    def _on_pdf_printed(self, page: QWebEnginePage, ok: bool) -> None:
+        job = self.page_jobs.get(page)
+        if job is None or self.cancelled:
+            return
+        source_path = job[0]
+        self._release_page(page)
+        self._finish_job(source_path, '' if ok else 'PDF printing failed')
+        self._print_next()
+        self._feed()
+
+    def _release_page(self, page: QWebEnginePage) -> None:
+        _, _, temp_path = self.page_jobs.pop(page)
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        self.idle_pages.append(page)
+
+    def _finish_job(self, source_path: str, error: str = '') -> None:
+        self.done += 1
+        if error:
+            self.errors.append(f"{source_path}: {error}")
+        else:
+            self.exported += 1
+        self.progress.emit(self.done, self.total, source_path)
+        if self.done == self.total:
+            self._shutdown()
+            self.finished.emit(self.exported, self.errors)
+
+    def _shutdown(self) -> None:
+        if self.executor is not None:
+            stop_process_pool(self.executor, self.futures)
+            self.executor = None
+            self.futures = []
+        for page in self.pages:
+            page.deleteLater()
+        self.pages = []
+        self.idle_pages = []
+
+class RenderDiskCache:
+    """Size-bounded LRU cache of rendered document bodies on disk.
+
+    Entries are keyed by a hash of the markdown source, the markdown2 extras
+    and the renderer version. Every entry starts with a checksum of its body,
+    so torn or corrupted files are detected and dropped instead of shown.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, 'render')
+        self.max_bytes = max_bytes
+        self.entries: Optional['OrderedDict[str, int]'] = None
+        self.total_size = 0
+
+    @staticmethod
+    def key(markdown_text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{RENDERER_VERSION}\0{markdown2.__version__}\0{",".join(MARKDOWN_EXTRAS)}\0'.encode('utf-8'))
+        digest.update(markdown_text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.html')
+
+    def contains(self, markdown_text: str) -> bool:
+        return self.contains_key(self.key(markdown_text))
+
+    def contains_key(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, markdown_text: str) -> Optional[str]:
+        return self.get_by_key(self.key(markdown_text))
+
+    def get_by_key(self, key: str) -> Optional[str]:
+        """Look up an entry by key, e.g. one remembered for text that has since changed"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checksum = f.readline().rstrip('\n')
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError):
+            self._discard(path)
+            return None
+        if hashlib.sha256(body.encode('utf-8')).hexdigest() != checksum:
+            self._discard(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if self.entries is not None and path in self.entries:
+            self.entries.move_to_end(path)
+        return body
+
+    def put(self, markdown_text: str, body: str) -> None:
+        path = self._path(self.key(markdown_text))
+        checksum = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        try:
+            atomic_write_text(path, f'{checksum}\n{body}')
+        except OSError as e:
+            print(f"Render cache write failed: {str(e)}")
+            return
+        self._load_entries()
+        size = os.path.getsize(path)
+        self.total_size += size - self.entries.pop(path, 0)
+        self.entries[path] = size
+        self._evict()
+
+    def _load_entries(self) -> None:
+        """Index existing entries by last use, once, the first time the cache grows"""
+        if self.entries is not None:
+            return
+        found = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        found.sort()
+        self.entries = OrderedDict((path, size) for _, path, size in found)
+        self.total_size = sum(self.entries.values())
+
+    def _evict(self) -> None:
+        while self.entries and self.total_size > self.max_bytes:
+            path, size = self.entries.popitem(last=False)
+            self.total_size -= size
+            self._discard(path)
+
+    def _discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if self.entries is not None and path in self.entries:
+            self.total_size -= self.entries.pop(path)
+
+def register_asset_scheme() -> None:
+    """Register the asset scheme; must run before the QApplication is created"""
+    scheme = QWebEngineUrlScheme(ASSET_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalScheme |
+                    QWebEngineUrlScheme.LocalAccessAllowed | QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+def asset_url(file_path: str) -> QUrl:
+    url = QUrl.fromLocalFile(file_path)
+    url.setScheme(ASSET_SCHEME.decode())
+    return url
+
+def asset_base_url(file_path: Optional[str]) -> QUrl:
+    """Base URL resolving relative references of a document through the asset scheme"""
+    if not file_path:
+        return QUrl()
+    return asset_url(os.path.dirname(os.path.abspath(file_path)) + '/')
+
+class ThumbnailDiskCache(RenderDiskCache):
+    """Size-bounded LRU cache of encoded thumbnails on disk.
+
+    Shares the last-use index and eviction of RenderDiskCache. Thumbnail
+    threads read and write it concurrently, so the index is guarded by a lock.
+    """
+    EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg'}
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 100 * 1024 * 1024) -> None:
+        super().__init__(cache_dir or os.path.join(CACHE_DIR, 'thumbs'), max_bytes)
+        self.lock = threading.Lock()
+
+    def thumbnail_path(self, digest: str, mime_type: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest + self.EXTENSIONS[mime_type])
+
+    def get_thumbnail(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        for mime_type in self.EXTENSIONS:
+            path = self.thumbnail_path(digest, mime_type)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            with self.lock:
+                if self.entries is not None and path in self.entries:
+                    self.entries.move_to_end(path)
+            return data, mime_type
+        return None
+
+    def put_thumbnail(self, digest: str, data: bytes, mime_type: str) -> None:
+        path = self.thumbnail_path(digest, mime_type)
+        try:
+            atomic_write_bytes(path, data)
+        except OSError as e:
+            print(f"Thumbnail cache write failed: {str(e)}")
+            return
+        with self.lock:
+            self._load_entries()
+            self.total_size += len(data) - self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self._evict()
+
+class ThumbnailSignals(QObject):
+    finished = pyqtSignal(object, bytes, str)
+
+class ThumbnailTask(QRunnable):
+    """Decodes an image at most once per size, downscaled to the preview width"""
+
+    def __init__(self, key: Tuple[str, float, int, int], signals: ThumbnailSignals,
+                 disk_cache: ThumbnailDiskCache) -> None:
+        super().__init__()
+        self.key = key
+        self.signals = signals
+        self.disk_cache = disk_cache
+
+    def run(self) -> None:
+        file_path, mtime, size, width = self.key
+        extension = os.path.splitext(file_path)[1].lower()
+        try:
+            if extension in UNSCALED_IMAGE_TYPES:
+                with open(file_path, 'rb') as f:
+                    self.signals.finished.emit(self.key, f.read(), IMAGE_MIME_TYPES[extension])
+                return
+
+            digest = hashlib.sha1(f'{file_path}|{mtime}|{size}|{width}'.encode('utf-8')).hexdigest()
+            cached = self.disk_cache.get_thumbnail(digest)
+            if cached is not None:
+                self.signals.finished.emit(self.key, *cached)
+                return
+
+            reader = QImageReader(file_path)
+            reader.setAutoTransform(True)
+            original = reader.size()
+            if original.isValid() and original.width() > width:
+                reader.setScaledSize(QSize(width, max(1, original.height() * width // original.width())))
+            image = reader.read()
+            if image.isNull():
+                raise IOError(reader.errorString())
+
+            thumb_format, mime_type = ('PNG', 'image/png') if image.hasAlphaChannel() else ('JPG', 'image/jpeg')
+            data = QByteArray()
+            buffer = QBuffer(data)
+            buffer.open(QIODevice.WriteOnly)
+            image.save(buffer, thumb_format, 85)
+            buffer.close()
+            thumb_data = bytes(data)
+            self.disk_cache.put_thumbnail(digest, thumb_data, mime_type)
+            self.signals.finished.emit(self.key, thumb_data, mime_type)
+        except Exception as e:
+            print(f"Thumbnail failed for {file_path}: {str(e)}")
+            self.signals.finished.emit(self.key, b'', '')
+
+class AssetSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Serves local images for the preview as downscaled, cached thumbnails.
+
+    Images are decoded on a thread pool and answered asynchronously, so the
+    text of a document appears before its images. Encoded thumbnails are
+    kept in memory and in a bounded disk cache, so re-rendering never
+    decodes them again.
+    Also serves preview pages too large for setHtml.
+    """
+
+    def __init__(self, parent: Optional[QObject] = None, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_cache: Optional[ThumbnailDiskCache] = None) -> None:
+        super().__init__(parent)
+        self.target_width = 1000
+        self.disk_cache = disk_cache or ThumbnailDiskCache()
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_cache: 'OrderedDict[Tuple[str, float, int, int], Tuple[bytes, str]]' = OrderedDict()
+        self.memory_size = 0
+        self.pending: Dict[Tuple[str, float, int, int], List[QWebEngineUrlRequestJob]] = {}
+        self.preview_page = b''
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals(self)
+        self.signals.finished.connect(self._on_thumbnail_ready)
+
+    def set_target_width(self, width: int) -> None:
+        # Bucket widths so resizing the window does not regenerate every thumbnail
+        self.target_width = max(200, (width + 199) // 200 * 200)
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob) -> None:
+        url = QUrl(job.requestUrl())
+        url.setScheme('file')
+        file_path = url.toLocalFile()
+        if os.path.basename(file_path) == PREVIEW_PAGE_NAME:
+            self._reply(job, self.preview_page, 'text/html')
+            return
+
+        mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(file_path)[1].lower())
+        if mime_type is None:
+            job.fail(QWebEngineUrlRequestJob.RequestDenied)
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+
+        key = (file_path, stat.st_mtime, stat.st_size, self.target_width)
+        cached = self.memory_cache.get(key)
+        if cached is not None:
+            self.memory_cache.move_to_end(key)
+            self._reply(job, *cached)
+            return
+        jobs = self.pending.setdefault(key, [])
+        jobs.append(job)
+        # Jobs are deleted by the engine when the page navigates away, which sip cannot see
+        job.destroyed.connect(lambda _=None, key=key, job=job: self._drop_job(key, job))
+        if len(jobs) == 1:
+            self.thread_pool.start(ThumbnailTask(key, self.signals, self.disk_cache))
+
+    def _drop_job(self, key: Tuple[str, float, int, int], job: QWebEngineUrlRequestJob) -> None:
+        jobs = self.pending.get(key, [])
+        jobs[:] = [pending for pending in jobs if pending is not job]
+
+    def _on_thumbnail_ready(self, key: Tuple[str, float, int, int], data: bytes, mime_type: str) -> None:
+        if data:
+            self.memory_cache[key] = (data, mime_type)
+            self.memory_size += len(data)
+            while self.memory_size > self.max_memory_bytes and len(self.memory_cache) > 1:
+                _, (evicted, _) = self.memory_cache.popitem(last=False)
+                self.memory_size -= len(evicted)
+        # Jobs of pages replaced while the image was decoding were dropped when they were destroyed
+        for job in self.pending.pop(key, []):
+            if data:
+                self._reply(job, data, mime_type)
+            else:
+                job.fail(QWebEngineUrlRequestJob.RequestFailed)
+
+    @staticmethod
+    def _reply(job: QWebEngineUrlRequestJob, data: bytes, mime_type: str) -> None:
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(mime_type.encode(), buffer)
+
+class NativePreview(QTextBrowser):
+    """Preview without a browser process, for fast startup and a fraction of the memory.
+
+    Shows the same rendered blocks through Qt's rich text engine. Scripts do
+    not run, so large tables are plain tables cut to NATIVE_TABLE_ROWS rows
+    and clicking a block does not copy its source. Links to headings scroll,
+    links to local files are handed to the editor and the rest go to the
+    system browser.
+    """
+
+    fileLinkActivated = pyqtSignal(str)
+
+    def __init__(self, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.setOpenLinks(False)
+        self.anchorClicked.connect(self.on_anchor_clicked)
+        self.document().setDefaultStyleSheet(native_preview_style())
+
+    def show_page(self, full_html: str, directory: str) -> None:
+        """Show a preview page, keeping the scroll position across re-renders"""
+        scroll = self.verticalScrollBar().value()
+        self.document().setBaseUrl(QUrl.fromLocalFile(os.path.join(directory, '')))
+        self.setHtml(build_native_html_document(full_html))
+        self.verticalScrollBar().setValue(scroll)
+
+    def on_anchor_clicked(self, url: QUrl) -> None:
+        if url.hasFragment() and not url.path() and not url.scheme():
+            self.scrollToAnchor(url.fragment())
+            return
+        url = self.document().baseUrl().resolved(url)
+        if url.isLocalFile():
+            self.fileLinkActivated.emit(url.toLocalFile())
+        else:
+            QDesktopServices.openUrl(url)
+
+class PrefetchedFile(NamedTuple):
+    """A file read and rendered ahead of being opened"""
+    mtime: float
+    size: int
+    text: str
+    blocks: List[Tuple[str, str]]
+
+class PrefetchSignals(QObject):
+    finished = pyqtSignal(str, object)
+    failed = pyqtSignal(str)
+
+class PrefetchTask(QRunnable):
+    """Reads and renders one file on a pool thread"""
+
+    def __init__(self, file_path: str, signals: PrefetchSignals,
+                 render_cache: Optional[RenderDiskCache] = None) -> None:
+        super().__init__()
+        self.file_path = file_path
+        self.signals = signals
+        self.render_cache = render_cache
+
+    def run(self) -> None:
+        try:
+            stat = os.stat(self.file_path)
+            text = read_text_file(self.file_path)
+            blocks: List[Tuple[str, str]] = []
+            # Files already in the disk cache open without conversion anyway
+            if self.render_cache is None or not self.render_cache.contains(text):
+                renderer = BlockRenderer()
+                renderer.render(text)
+                blocks = list(renderer.cache.items())
+            prefetched = PrefetchedFile(stat.st_mtime, stat.st_size, text, blocks)
+            self.signals.finished.emit(self.file_path, prefetched)
+        except Exception:
+            self.signals.failed.emit(self.file_path)
+
+class FilePrefetcher(QObject):
+    """Speculatively reads and renders files into a bounded LRU cache.
+
+    Opening a prefetched file then only needs to seed the tab's block cache,
+    so neither the disk read nor the markdown conversion happens on click.
+    """
+
+    def __init__(self, render_cache: Optional[RenderDiskCache] = None, max_entries: int = 32,
+                 max_bytes: int = 32 * 1024 * 1024, max_file_size: int = 2 * 1024 * 1024,
+                 parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.render_cache = render_cache
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.cache: 'OrderedDict[str, PrefetchedFile]' = OrderedDict()
+        self.cache_size = 0
+        self.in_flight: set = set()
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.signals = PrefetchSignals(self)
+        self.signals.finished.connect(self._on_finished)
+        self.signals.failed.connect(self.in_flight.discard)
+
+    @staticmethod
+    def _entry_size(prefetched: PrefetchedFile) -> int:
+        return len(prefetched.text) + sum(len(t) + len(h) for t, h in prefetched.blocks)
+
+    def prefetch(self, file_path: str) -> None:
+        if not file_path or not file_path.lower().endswith(MARKDOWN_EXTENSIONS):
+            return
+        if file_path in self.in_flight or self._fresh(file_path) is not None:
+            return
+        try:
+            if os.path.getsize(file_path) > self.max_file_size:
+                return
+        except OSError:
+            return
+        self.in_flight.add(file_path)
+        self.thread_pool.start(PrefetchTask(file_path, self.signals, self.render_cache))
+
+    def take(self, file_path: str) -> Optional[PrefetchedFile]:
+        """Remove and return the cached entry if the file has not changed since it was read"""
+        prefetched = self._fresh(file_path)
+        if prefetched is not None:
+            self._remove(file_path)
+        return prefetched
+
+    def _fresh(self, file_path: str) -> Optional[PrefetchedFile]:
+        prefetched = self.cache.get(file_path)
+        if prefetched is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stat = None
+        if stat is None or stat.st_mtime != prefetched.mtime or stat.st_size != prefetched.size:
+            self._remove(file_path)
+            return None
+        return prefetched
+
+    def _remove(self, file_path: str) -> None:
+        prefetched = self.cache.pop(file_path, None)
+        if prefetched is not None:
+            self.cache_size -= self._entry_size(prefetched)
+
+    def _on_finished(self, file_path: str, prefetched: PrefetchedFile) -> None:
+        self.in_flight.discard(file_path)
+        self._remove(file_path)
+        self.cache[file_path] = prefetched
+        self.cache_size += self._entry_size(prefetched)
+        while self.cache and (len(self.cache) > self.max_entries or self.cache_size > self.max_bytes):
+            oldest = next(iter(self.cache))
+            self._remove(oldest)
+
+NATURAL_SORT_PATTERN = re.compile(r'(\d+)')
+
+def natural_sort_key(name: str) -> List[Union[int, str]]:
+    """Sort key putting 'chapter 2' before 'chapter 10'"""
+    return [int(part) if part.isdigit() else part.lower() for part in NATURAL_SORT_PATTERN.split(name)]
+
+def collect_book_files(folder: str) -> List[str]:
+    """The markdown files directly inside folder, in natural order"""
+    try:
+        names = [
+            name for name in os.listdir(folder)
+            if name.lower().endswith(MARKDOWN_EXTENSIONS) and not name.startswith('.')
+            and os.path.isfile(os.path.join(folder, name))
+        ]
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names, key=natural_sort_key)]
+
+def estimated_chapter_height(file_size: int) -> int:
+    """Placeholder height in pixels until a chapter is rendered: about 90 characters per 26px line"""
+    return max(120, file_size * 26 // 90)
+
+def build_book_document(folder: str, files: List[str]) -> str:
+    """A page with an empty, roughly sized section per chapter for the book view to fill in"""
+    sections = []
+    for index, file_path in enumerate(files):
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            file_size = 0
+        sections.append(
+            f'<section class="md-chapter" id="md-chapter-{index}">'
+            f'<div class="md-chapter-title" data-index="{index}">{html.escape(os.path.basename(file_path))}</div>'
+            f'<div class="md-chapter-body" style="height: {estimated_chapter_height(file_size)}px"></div>'
+            f'</section>'
+        )
+    return build_html_document('\n'.join(sections), os.path.basename(folder),
+                               scripts=BOOK_SCRIPT + VIRTUAL_TABLE_SCRIPT)
+
+def render_book_chapter(file_path: str, cache_dir: str) -> Tuple[str, Optional[str]]:
+    """Render a chapter (runs inside book worker processes).
+
+    Returns the body and, when it was not in the disk cache yet, the source
+    text so the GUI process can add it; the cache has a single owner.
+    """
+    text = read_text_file(file_path)
+    body = RenderDiskCache(cache_dir).get(text)
+    if body is not None:
+        return body, None
+    return BlockRenderer().render(text), text
+
+class BookLoader(QObject):
+    """Renders the chapters of a book in a pool of worker processes.
+
+    Chapters the page asks for go first; the others follow in order, so the
+    render cache is warm by the time they are scrolled to. Bodies are kept
+    in a byte-bounded LRU and only a few renders are in flight at a time.
+    """
+    chapterReady = pyqtSignal(int, str)
+    progress = pyqtSignal(int, int)
+    _rendered = pyqtSignal(int, object, str)
+
+    def __init__(self, files: List[str], render_cache: RenderDiskCache, max_workers: Optional[int] = None,
+                 max_bytes: int = 32 * 1024 * 1024, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.files = files
+        self.render_cache = render_cache
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_bytes = max_bytes
+        self.cache: 'OrderedDict[int, Tuple[float, str]]' = OrderedDict()
+        self.cache_size = 0
+        # Chapters the page is waiting for, most urgent first
+        self.requested: List[int] = []
+        self.in_flight: Dict[int, float] = {}
+        self.rendered: set = set()
+        self.next_background = 0
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.futures: List[Future] = []
+        self.closed = False
+        self._rendered.connect(self._on_rendered)
+
+    @staticmethod
+    def mtime(file_path: str) -> float:
+        try:
+            return os.path.getmtime(file_path)
+        except OSError:
+            return 0.0
+
+    def request(self, first: int, last: int, indices: List[int]) -> None:
+        """Deliver chapters to the page; requests outside first..last were scrolled past and are dropped"""
+        self.requested = [index for index in self.requested if first <= index <= last]
+        for index in indices:
+            if not 0 <= index < len(self.files):
+                continue
+            body = self._cached(index)
+            if body is not None:
+                self.chapterReady.emit(index, body)
+            elif index not in self.requested:
+                self.requested.append(index)
+        self._feed()
+
+    def _cached(self, index: int) -> Optional[str]:
+        entry = self.cache.get(index)
+        if entry is None:
+            return None
+        if entry[0] != self.mtime(self.files[index]):
+            self._remove(index)
+            return None
+        self.cache.move_to_end(index)
+        return entry[1]
+
+    def _remove(self, index: int) -> None:
+        entry = self.cache.pop(index, None)
+        if entry is not None:
+            self.cache_size -= len(entry[1])
+
+    def _next_job(self) -> Optional[int]:
+        for index in self.requested:
+            if index not in self.in_flight:
+                return index
+        while self.next_background < len(self.files):
+            index = self.next_background
+            self.next_background += 1
+            if index not in self.rendered and index not in self.in_flight:
+                return index
+        return None
+
+    def _feed(self) -> None:
+        while not self.closed and len(self.in_flight) < self.max_workers * 2:
+            index = self._next_job()
+            if index is None:
+                return
+            if self.executor is None:
+                self.executor = spawn_process_pool(self.max_workers)
+            file_path = self.files[index]
+            self.in_flight[index] = self.mtime(file_path)
+            future = self.executor.submit(render_book_chapter, file_path, self.render_cache.cache_dir)
+            self.futures = [f for f in self.futures if not f.done()] + [future]
+            future.add_done_callback(lambda f, i=index: self._on_future_done(f, i))
+
+    def _on_future_done(self, future: Future, index: int) -> None:
+        # Called on an executor thread; the signal hands the result to the GUI thread
+        if future.cancelled():
+            return
+        try:
+            self._rendered.emit(index, future.result(), '')
+        except Exception as e:
+            self._rendered.emit(index, None, str(e))
+
+    def _on_rendered(self, index: int, result: Optional[Tuple[str, Optional[str]]], error: str) -> None:
+        mtime = self.in_flight.pop(index, 0.0)
+        if self.closed:
+            return
+        if error:
+            body = f'<pre class="{RENDER_TIMEOUT_CLASS}">{html.escape(f"Could not render this chapter: {error}")}</pre>'
+        else:
+            body, text = result
+            if text is not None:
+                self.render_cache.put(text, body)
+            self._remove(index)
+            self.cache[index] = (mtime, body)
+            self.cache_size += len(body)
+            while len(self.cache) > 1 and self.cache_size > self.max_bytes:
+                self._remove(next(iter(self.cache)))
+        self.rendered.add(index)
+        if index in self.requested:
+            self.requested.remove(index)
+            self.chapterReady.emit(index, body)
+        self.progress.emit(len(self.rendered), len(self.files))
+        self._feed()
+
+    def close(self) -> None:
+        self.closed = True
+        self.requested = []
+        if self.executor is not None:
+            stop_process_pool(self.executor, self.futures)
+            self.executor = None
+            self.futures = []
+
+class BookBridge(QObject):
+    """The book page's side of the web channel"""
+    chaptersRequested = pyqtSignal(int, int, list)
+    chapterOpened = pyqtSignal(int)
+
+    @pyqtSlot(int, int, 'QVariantList')
+    def request_chapters(self, first: int, last: int, indices: List[Any]) -> None:
+        self.chaptersRequested.emit(first, last, [int(index) for index in indices])
+
+    @pyqtSlot(int)
+    def open_chapter(self, index: int) -> None:
+        self.chapterOpened.emit(index)
+
+class BookView(QMainWindow):
+    """A folder of markdown files read as one scrolling page.
+
+    The page opens with an empty section per chapter, sized from the file.
+    Chapters are filled in as they scroll near the viewport and emptied again
+    once far from it, so the page holds a few chapters however long the book.
+    """
+    fileOpenRequested = pyqtSignal(str)
+
+    def __init__(self, folder: str, files: List[str], render_cache: RenderDiskCache,
+                 parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent, Qt.Window)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.folder = folder
+        self.files = files
+        self.setWindowTitle(f'{os.path.basename(folder) or folder} - Book')
+        self.resize(1000, 800)
+        self.view = QWebEngineView(self)
+        self.setCentralWidget(self.view)
+        self.loader = BookLoader(self.files, render_cache, parent=self)
+        self.loader.chapterReady.connect(self.fill_chapter)
+        self.loader.progress.connect(self.on_progress)
+        self.bridge = BookBridge(self)
+        self.bridge.chaptersRequested.connect(self.loader.request)
+        self.bridge.chapterOpened.connect(self.open_chapter)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject('bookBridge', self.bridge)
+        self.view.page().setWebChannel(self.channel)
+        self.view.setHtml(build_book_document(folder, self.files), asset_base_url(os.path.join(folder, 'book')))
+        self.statusBar().showMessage(f'{len(self.files)} chapters')
+
+    def fill_chapter(self, index: int, body: str) -> None:
+        self.view.page().runJavaScript(f'mdBookFill({index}, {json.dumps(body)});')
+
+    def on_progress(self, done: int, total: int) -> None:
+        message = f'Rendered {done} of {total} chapters' if done < total else f'{total} chapters'
+        self.statusBar().showMessage(message)
+
+    def open_chapter(self, index: int) -> None:
+        if 0 <= index < len(self.files):
+            self.fileOpenRequested.emit(self.files[index])
+
+    def closeEvent(self, event) -> None:
+        self.loader.close()
+        super().closeEvent(event)
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+TOKEN_PUNCTUATION_PATTERN = re.compile(r'[^\w\s]', re.UNICODE)
+
+def text_statistics(text: str) -> Tuple[int, int, int]:
+    """Words, characters and an approximate LLM token count of text.
+
+    Tokens are estimated the way BPE vocabularies tend to split English:
+    about one token per four characters of a word, at least one per word,
+    plus one per punctuation character.
+    """
+    words = WORD_PATTERN.findall(text)
+    tokens = sum((len(word) + 3) // 4 for word in words) + len(TOKEN_PUNCTUATION_PATTERN.findall(text))
+    return len(text.split()), len(text), tokens
+
+def file_statistics(texts: List[str]) -> List[Tuple[int, int, int]]:
+    """Statistics of a batch of texts (runs inside statistics worker processes)"""
+    return [text_statistics(text) for text in texts]
+
+class BlockData(QTextBlockUserData):
+    """Per-block bookkeeping attached to editor text blocks"""
+
+    def __init__(self, uid: int) -> None:
+        super().__init__()
+        self.uid = uid
+        self.statistics = (0, 0, 0)
+
+class HeadingEntry(NamedTuple):
+    cursor: QTextCursor
+    level: int
+    title: str
+
+class DocumentIndexer(QSyntaxHighlighter):
+    """Maintains the heading index of a document incrementally.
+
+    Qt only calls highlightBlock for blocks touched by an edit (and the
+    following ones while the fence state keeps changing), so each keystroke
+    costs O(changed blocks). Headings are tracked by a cursor anchored at
+    their block, which Qt keeps in place as text moves around them.
+    """
+    headingsChanged = pyqtSignal()
+    statisticsChanged = pyqtSignal()
+
+    def __init__(self, document: QTextDocument) -> None:
+        super().__init__(document)
+        self.next_uid = 1
+        self.headings: Dict[int, HeadingEntry] = {}
+        # Word, character and token counts, kept as running totals of per-block counts
+        self.blocks: Dict[int, BlockData] = {}
+        self.totals = [0, 0, 0]
+        # uid of the block following each block as last seen, 0 standing in for the start of the document.
+        # Qt deletes the user data of blocks merged away, these links lead to exactly those blocks.
+        self.next_blocks: Dict[int, Optional[int]] = {}
+
+    def block_data(self) -> BlockData:
+        data = self.currentBlockUserData()
+        if not isinstance(data, BlockData):
+            data = BlockData(self.next_uid)
+            self.next_uid += 1
+            self.setCurrentBlockUserData(data)
+            self.blocks[data.uid] = data
+        return data
+
+    def update_statistics(self, text: str) -> None:
+        data = self.block_data()
+        statistics = text_statistics(text)
+        changed = self.link_block(data)
+        if statistics != data.statistics:
+            for i in range(3):
+                self.totals[i] += statistics[i] - data.statistics[i]
+            data.statistics = statistics
+            changed = True
+        if changed:
+            self.statisticsChanged.emit()
+
+    def link_block(self, data: BlockData) -> bool:
+        """Record the current block's neighbours, True if blocks deleted since were dropped"""
+        block = self.currentBlock()
+        previous_data = block.previous().userData()
+        next_data = block.next().userData()
+        dropped = self.set_next_block(previous_data.uid if isinstance(previous_data, BlockData) else 0, data.uid)
+        next_uid = next_data.uid if isinstance(next_data, BlockData) else None
+        return self.set_next_block(data.uid, next_uid) or dropped
+
+    def set_next_block(self, uid: int, next_uid: Optional[int]) -> bool:
+        """Link uid to next_uid, first dropping the deleted blocks it used to lead to and their headings"""
+        dropped = False
+        old_uid = self.next_blocks.get(uid)
+        while old_uid in self.blocks and old_uid != next_uid and sip.isdeleted(self.blocks[old_uid]):
+            statistics = self.blocks.pop(old_uid).statistics
+            for i in range(3):
+                self.totals[i] -= statistics[i]
+            if self.headings.pop(old_uid, None) is not None:
+                self.headingsChanged.emit()
+            dropped = True
+            old_uid = self.next_blocks.pop(old_uid, None)
+        self.next_blocks[uid] = next_uid
+        return dropped
+
+    def statistics(self) -> Dict[str, int]:
+        blocks = self.document().blockCount()
+        return {
+            'words': self.totals[0],
+            # Line breaks between blocks count as characters
+            'characters': self.totals[1] + blocks - 1,
+            'tokens': self.totals[2],
+            'lines': blocks,
+        }
+
+    def highlightBlock(self, text: str) -> None:
+        # Block state: 0 outside fenced code, 1 inside a ``` fence, 2 inside a ~~~ fence
+        previous_state = max(self.previousBlockState(), 0)
+        fence = FENCE_PATTERN.match(text)
+        heading = None
+        if previous_state:
+            marker = '`' if previous_state == 1 else '~'
+            closes = fence is not None and fence.group(1)[0] == marker
+            self.setCurrentBlockState(0 if closes else previous_state)
+        elif fence:
+            self.setCurrentBlockState(1 if fence.group(1)[0] == '`' else 2)
+        else:
+            self.setCurrentBlockState(0)
+            heading = ATX_HEADING_PATTERN.match(text)
+
+        self.update_statistics(text)
+        data = self.currentBlockUserData()
+        if heading:
+            data = self.block_data()
+            level, title = len(heading.group(1)), (heading.group(2) or '').strip()
+            entry = self.headings.get(data.uid)
+            if entry is None or entry.level != level or entry.title != title:
+                cursor = QTextCursor(self.currentBlock())
+                self.headings[data.uid] = HeadingEntry(cursor, level, title)
+                self.headingsChanged.emit()
+        elif isinstance(data, BlockData) and data.uid in self.headings:
+            del self.headings[data.uid]
+            self.headingsChanged.emit()
+
+    def outline(self) -> List[Tuple[int, int, str]]:
+        """Headings in document order as (position, level, title)"""
+        return sorted(
+            (entry.cursor.block().position(), entry.level, entry.title)
+            for entry in self.headings.values()
+        )
+
+    def anchors(self) -> List[str]:
+        return heading_anchors([title for _, _, title in self.outline()])
+
+LINK_PATTERN = re.compile(
+    r'(!?)\[(?:[^\]\\]|\\.)*\]\(\s*<?([^)\s>]+)>?(?:\s+(?:"[^"]*"|\'[^\']*\'))?\s*\)'
+)
+HTML_LINK_PATTERN = re.compile(r'<(a|img)\b[^>]*?\b(?:href|src)\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+REFERENCE_DEFINITION_PATTERN = re.compile(r'^[ ]{0,3}\[[^\]]+\]:[ \t]*<?([^\s>]+)>?')
+URL_SCHEME_PATTERN = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|//)')
+LINK_COMPLETION_PATTERN = re.compile(r'\]\(([^)\s]*)$')
+LINK_SCAN_IGNORED_DIRS = {'node_modules', '__pycache__'}
+
+class MarkdownLink(NamedTuple):
+    """A relative link or image reference found in a markdown file"""
+    source: str
+    target: str
+    raw: str
+    line: int
+    is_image: bool
+
+def normalize_link_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+def resolve_link_target(source_path: str, raw: str, root: Optional[str] = None) -> Optional[str]:
+    """Resolve a link to a local path, or None for external links and in-page anchors"""
+    if not raw or raw.startswith('#') or URL_SCHEME_PATTERN.match(raw):
+        return None
+    target = unquote(raw.split('#', 1)[0].split('?', 1)[0])
+    if not target:
+        return None
+    if target.startswith('/') and root:
+        return os.path.normpath(os.path.join(root, target.lstrip('/')))
+    return os.path.normpath(os.path.join(os.path.dirname(source_path), target))
+
+def extract_links(source_path: str, text: str, root: Optional[str] = None) -> List[MarkdownLink]:
+    """Find local links, images and link definitions outside of fenced code"""
+    links = []
+    fence_marker = None
+    for line_number, line in enumerate(text.split('\n')):
+        fence = FENCE_PATTERN.match(line)
+        if fence_marker:
+            if fence and fence.group(1)[0] == fence_marker:
+                fence_marker = None
+            continue
+        if fence:
+            fence_marker = fence.group(1)[0]
+            continue
+        if '](' not in line and '<' not in line and ']:' not in line:
+            continue
+        candidates = [(match.group(2), match.group(1) == '!') for match in LINK_PATTERN.finditer(line)]
+        candidates += [
+            (match.group(2), match.group(1).lower() == 'img') for match in HTML_LINK_PATTERN.finditer(line)
+        ]
+        reference = REFERENCE_DEFINITION_PATTERN.match(line)
+        if reference:
+            candidates.append((reference.group(1), False))
+        for raw, is_image in candidates:
+            target = resolve_link_target(source_path, raw, root)
+            if target:
+                links.append(MarkdownLink(source_path, target, raw, line_number, is_image))
+    return links
+
+def scan_link_files(file_paths: List[str], root: str) -> List[Tuple[str, float, List[MarkdownLink]]]:
+    """Extract the links of a batch of files (runs inside link scan worker processes)"""
+    results = []
+    for file_path in file_paths:
+        try:
+            mtime = os.path.getmtime(file_path)
+            results.append((file_path, mtime, extract_links(file_path, read_text_file(file_path), root)))
+        except Exception:
+            continue
+    return results
+
+def moved_path(path: str, old_path: str, new_path: str) -> str:
+    """Where path ends up when old_path, a file or a folder, moves to new_path"""
+    key, old_key = normalize_link_path(path), normalize_link_path(old_path)
+    if key == old_key:
+        return new_path
+    if key.startswith(old_key + os.sep):
+        # normcase keeps the length, so the key's prefix length slices the path as written
+        return os.path.join(new_path, os.path.normpath(os.path.abspath(path))[len(old_key) + 1:])
+    return path
+
+def relink(raw: str, source_path: str, target: str, root: Optional[str] = None) -> str:
+    """raw pointed from source_path at target, keeping its anchor, query, root-relative style and escaping"""
+    path_length = len(raw.split('#', 1)[0].split('?', 1)[0])
+    path_part, suffix = raw[:path_length], raw[path_length:]
+    if path_part.startswith('/') and root:
+        new_path = '/' + os.path.relpath(target, root).replace(os.sep, '/')
+    else:
+        new_path = os.path.relpath(target, os.path.dirname(source_path)).replace(os.sep, '/')
+        if path_part.startswith('./') and not new_path.startswith('../'):
+            new_path = './' + new_path
+    if unquote(path_part) != path_part or ' ' in new_path:
+        new_path = quote(new_path)
+    return new_path + suffix
+
+def rewrite_link_targets(text: str, replacements: Dict[int, Dict[str, str]]) -> Tuple[str, int]:
+    """Replace link destinations on the given lines, leaving the same text elsewhere on the line alone"""
+    lines = text.split('\n')
+    count = 0
+    for line_number, mapping in replacements.items():
+        line = lines[line_number]
+        spans = [match.span(2) for match in LINK_PATTERN.finditer(line)]
+        spans += [match.span(2) for match in HTML_LINK_PATTERN.finditer(line)]
+        reference = REFERENCE_DEFINITION_PATTERN.match(line)
+        if reference:
+            spans.append(reference.span(1))
+        for start, end in sorted(set(spans), reverse=True):
+            new_raw = mapping.get(line[start:end])
+            if new_raw is not None and new_raw != line[start:end]:
+                line = line[:start] + new_raw + line[end:]
+                count += 1
+        lines[line_number] = line
+    return '\n'.join(lines), count
+
+def rewrite_moved_links(source_path: str, current_path: str, old_path: str, new_path: str,
+                        root: Optional[str]) -> Tuple[str, str, str, int]:
+    """Point one file's links at their targets after old_path moved to new_path (runs on rewrite threads).
+
+    source_path is where the file was when its links were written and
+    current_path where it is now. Returns (current_path, text before, text
+    after, links changed); the file is written only when a link changed.
+    """
+    text = read_text_file(current_path)
+    replacements: Dict[int, Dict[str, str]] = {}
+    for link in extract_links(source_path, text, root):
+        target = moved_path(link.target, old_path, new_path)
+        if resolve_link_target(current_path, link.raw, root) == os.path.normpath(target):
+            continue
+        replacements.setdefault(link.line, {})[link.raw] = relink(link.raw, current_path, target, root)
+    new_text, count = rewrite_link_targets(text, replacements)
+    if count:
+        atomic_write_text(current_path, new_text)
+    return current_path, text, new_text, count
+
+class MoveRecord(NamedTuple):
+    """A finished rename or move, with what undoing it needs"""
+    old_path: str
+    new_path: str
+    # (path after the move, text before, text written) of every file whose links were rewritten
+    rewrites: List[Tuple[str, str, str]]
+
+class LinkIndex(QObject):
+    """Forward and backward link index over all project roots.
+
+    The full build walks the roots on a background thread and extracts links
+    in a process pool. Afterwards single files are updated incrementally on
+    save and when a watched directory changes. Every scanned directory is
+    watched, and directories created later are watched once they appear.
+    """
+    changed = pyqtSignal()
+    build_finished = pyqtSignal(float)
+    _build_done = pyqtSignal(object, object, object, float)
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.roots: List[str] = []
+        self.links: Dict[str, List[MarkdownLink]] = {}
+        self.mtimes: Dict[str, float] = {}
+        self.backlinks_index: Dict[str, set] = {}
+        self.files: Dict[str, str] = {}
+        self.building = False
+        self.version = 0
+        self.target_cache: Dict[str, Tuple[int, List[str]]] = {}
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self._build_done.connect(self._on_build_done)
+
+    def build(self, roots: List[str]) -> None:
+        if self.building:
+            return
+        self.building = True
+        self.roots = [os.path.normpath(os.path.abspath(root)) for root in roots if os.path.isdir(root)]
+        threading.Thread(target=self._build_worker, args=(list(self.roots),), name='LinkIndex', daemon=True).start()
+
+    def _build_worker(self, roots: List[str]) -> None:
+        started = time.perf_counter()
+        files: Dict[str, str] = {}
+        directories: List[str] = []
+        results: List[Tuple[str, float, List[MarkdownLink]]] = []
+        try:
+            self._scan(roots, files, directories, results)
+        except Exception as e:
+            print(f"Could not build link index: {str(e)}")
+        finally:
+            # Always report back, a build that never finishes would keep the index from ever building again
+            self._build_done.emit(files, directories, results, time.perf_counter() - started)
+
+    @staticmethod
+    def _scan(roots: List[str], files: Dict[str, str], directories: List[str],
+              results: List[Tuple[str, float, List[MarkdownLink]]]) -> None:
+        """Fill files, directories and results in place, so a failed build keeps what it found"""
+        batches: List[Tuple[List[str], str]] = []
+        for root in roots:
+            markdown_files = []
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if LinkIndex.scanned_directory(d)]
+                directories.append(dirpath)
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    files[normalize_link_path(path)] = path
+                    if filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                        markdown_files.append(path)
+            batches += [(markdown_files[i:i + 64], root) for i in range(0, len(markdown_files), 64)]
+
+        if len(batches) == 1:
+            results.extend(scan_link_files(*batches[0]))
+        elif batches:
+            with spawn_process_pool(min(len(batches), os.cpu_count() or 2)) as executor:
+                for batch_results in executor.map(scan_link_files, *zip(*batches)):
+                    results.extend(batch_results)
+
+    @staticmethod
+    def scanned_directory(name: str) -> bool:
+        return not name.startswith('.') and name not in LINK_SCAN_IGNORED_DIRS
+
+    def _on_build_done(self, files: Dict[str, str], directories: List[str],
+                       results: List[Tuple[str, float, List[MarkdownLink]]], elapsed: float) -> None:
+        self.files = files
+        self.links = {}
+        self.mtimes = {}
+        self.backlinks_index = {}
+        for source_path, mtime, links in results:
+            self._set_links(source_path, mtime, links)
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if directories:
+            # Every directory, so files and folders created anywhere below the roots are noticed
+            self.watcher.addPaths(directories)
+        self.building = False
+        self.version += 1
+        self.changed.emit()
+        self.build_finished.emit(elapsed)
+
+    def _set_links(self, source_path: str, mtime: float, links: List[MarkdownLink]) -> None:
+        key = normalize_link_path(source_path)
+        self._drop_links(key)
+        self.links[key] = links
+        self.mtimes[key] = mtime
+        for link in links:
+            self.backlinks_index.setdefault(normalize_link_path(link.target), set()).add(key)
+
+    def _drop_links(self, key: str) -> None:
+        for link in self.links.pop(key, []):
+            target_key = normalize_link_path(link.target)
+            sources = self.backlinks_index.get(target_key)
+            if sources is not None:
+                sources.discard(key)
+                if not sources:
+                    del self.backlinks_index[target_key]
+        self.mtimes.pop(key, None)
+
+    def root_for(self, path: str) -> Optional[str]:
+        path = os.path.normpath(os.path.abspath(path))
+        matches = [root for root in self.roots if path == root or path.startswith(root + os.sep)]
+        return max(matches, key=len) if matches else None
+
+    def update_file(self, file_path: str, text: Optional[str] = None) -> None:
+        """Re-index a single file, e.g. after it was saved"""
+        root = self.root_for(file_path)
+        if root is None:
+            return
+        try:
+            if text is None:
+                text = read_text_file(file_path)
+            mtime = os.path.getmtime(file_path)
+        except Exception:
+            return
+        self.files[normalize_link_path(file_path)] = file_path
+        self._set_links(file_path, mtime, extract_links(file_path, text, root))
+        self.version += 1
+        self.changed.emit()
+
+    def remove_file(self, file_path: str) -> None:
+        key = normalize_link_path(file_path)
+        self._drop_links(key)
+        self.files.pop(key, None)
+        self.version += 1
+        self.changed.emit()
+
+    def files_under(self, path: str) -> List[str]:
+        """Indexed files at path or below it"""
+        key = normalize_link_path(path)
+        return [file_path for file_key, file_path in self.files.items()
+                if file_key == key or file_key.startswith(key + os.sep)]
+
+    def move_path(self, old_path: str, new_path: str) -> None:
+        """Re-key the files moved from old_path to new_path and re-index the markdown among them"""
+        moved_markdown = []
+        for file_path in self.files_under(old_path):
+            key = normalize_link_path(file_path)
+            self._drop_links(key)
+            del self.files[key]
+            new_file_path = moved_path(file_path, old_path, new_path)
+            self.files[normalize_link_path(new_file_path)] = new_file_path
+            if new_file_path.lower().endswith(MARKDOWN_EXTENSIONS):
+                moved_markdown.append(new_file_path)
+        for file_path in moved_markdown:
+            self.update_file(file_path)
+        self.version += 1
+        self.changed.emit()
+
+    def _on_directory_changed(self, directory: str) -> None:
+        """Re-index the changed files of a directory, and watch and index its new subdirectories"""
+        changed = self._index_directory(directory)
+        watched = {normalize_link_path(path) for path in self.watcher.directories()}
+        new_directories = []
+        try:
+            subdirectories = [entry.path for entry in os.scandir(directory)
+                              if entry.is_dir(follow_symlinks=False) and self.scanned_directory(entry.name)]
+        except OSError:
+            subdirectories = []
+        for subdirectory in subdirectories:
+            if normalize_link_path(subdirectory) in watched:
+                continue
+            # A folder moved in may already hold a whole tree
+            for dirpath, dirnames, _ in os.walk(subdirectory):
+                dirnames[:] = [d for d in dirnames if self.scanned_directory(d)]
+                new_directories.append(dirpath)
+        if new_directories:
+            self.watcher.addPaths(new_directories)
+            for new_directory in new_directories:
+                changed = self._index_directory(new_directory) or changed
+        if changed:
+            self.version += 1
+            self.changed.emit()
+
+    def _index_directory(self, directory: str) -> bool:
+        """Re-index only the files of the directory whose mtime moved, True if anything changed"""
+        changed = False
+        try:
+            entries = {normalize_link_path(entry.path): entry for entry in os.scandir(directory) if entry.is_file()}
+        except OSError:
+            entries = {}
+        directory_key = normalize_link_path(directory)
+        for key in [k for k in self.files if os.path.dirname(k) == directory_key and k not in entries]:
+            self._drop_links(key)
+            del self.files[key]
+            changed = True
+        for key, entry in entries.items():
+            if key not in self.files:
+                self.files[key] = entry.path
+                changed = True
+            if not entry.name.lower().endswith(MARKDOWN_EXTENSIONS):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if self.mtimes.get(key) != mtime:
+                try:
+                    text = read_text_file(entry.path)
+                except Exception:
+                    continue
+                self._set_links(entry.path, mtime, extract_links(entry.path, text, self.root_for(entry.path)))
+                changed = True
+        return changed
+
+    def exists(self, target: str) -> bool:
+        return normalize_link_path(target) in self.files or os.path.exists(target)
+
+    def backlinks(self, file_path: str) -> List[MarkdownLink]:
+        key = normalize_link_path(file_path)
+        return sorted(
+            (link for source in self.backlinks_index.get(key, ()) for link in self.links.get(source, [])
+             if normalize_link_path(link.target) == key),
+            key=lambda link: (link.source.lower(), link.line)
+        )
+
+    def broken_links(self) -> List[MarkdownLink]:
+        return sorted(
+            (link for links in self.links.values() for link in links if not self.exists(link.target)),
+            key=lambda link: (link.source.lower(), link.line)
+        )
+
+    def link_targets(self, directory: str) -> List[str]:
+        """Paths of all indexed files under the directory's project, relative to the directory"""
+        cached = self.target_cache.get(directory)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        root = self.root_for(directory)
+        if root is None:
+            return []
+        root_key = normalize_link_path(root)
+        targets = sorted(
+            os.path.relpath(path, directory).replace(os.sep, '/')
+            for key, path in self.files.items()
+            if key == root_key or key.startswith(root_key + os.sep)
+        )
+        self.target_cache[directory] = (self.version, targets)
+        return targets
+
+# {{name}}, {{name|default}} and {{> include}} in .prompt files
+PROMPT_TAG_PATTERN = re.compile(r'\{\{\s*(>)?\s*([^{}|]+?)\s*(?:\|([^{}]*))?\}\}')
+PROMPT_EXTENSION = '.prompt'
+# Shared prompt library, the AI_Prompts submodule next to the editor
+PROMPT_LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AI_Prompts')
+PROMPT_INCLUDE_DEPTH = 16
+
+def is_prompt_file(file_path: Optional[str]) -> bool:
+    return bool(file_path) and file_path.lower().endswith(PROMPT_EXTENSION)
+
+class PromptTemplate:
+    """A .prompt file compiled into literal text and variable slots, with includes inlined"""
+
+    def __init__(self, parts: List[Union[str, Tuple[str, str]]],
+                 dependencies: Dict[str, Optional[int]]) -> None:
+        self.parts = parts
+        # Included files and the mtimes they were compiled from
+        self.dependencies = dependencies
+        self.variables: List[str] = []
+        self.defaults: Dict[str, str] = {}
+        for part in parts:
+            if isinstance(part, tuple):
+                name, default = part
+                if name not in self.defaults:
+                    self.variables.append(name)
+                    self.defaults[name] = default
+                elif default and not self.defaults[name]:
+                    self.defaults[name] = default
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Fill in the variables; unset ones without a default stay visible as {{name}}"""
+        output = []
+        for part in self.parts:
+            if isinstance(part, tuple):
+                name, default = part
+                value = values.get(name) or default or self.defaults.get(name)
+                output.append(value if value else f'{{{{{name}}}}}')
+            else:
+                output.append(part)
+        return ''.join(output)
+
+class PromptTemplateCache:
+    """Compiles prompt templates once and caches them.
+
+    The text being edited is cached by content, included files by path and
+    mtime, so filling in a variable only substitutes strings and never reads
+    or parses an include again.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self.templates: 'OrderedDict[Tuple[str, str], PromptTemplate]' = OrderedDict()
+        self.includes: Dict[str, Tuple[Optional[int], PromptTemplate]] = {}
+
+    @staticmethod
+    def mtime(file_path: str) -> Optional[int]:
+        try:
+            return os.stat(file_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def is_current(self, template: PromptTemplate) -> bool:
+        return all(self.mtime(path) == mtime for path, mtime in template.dependencies.items())
+
+    def get(self, text: str, base_dir: str) -> PromptTemplate:
+        key = (base_dir, text)
+        template = self.templates.get(key)
+        if template is not None and self.is_current(template):
+            self.templates.move_to_end(key)
+            return template
+        template = self.compile(text, base_dir, ())
+        self.templates[key] = template
+        while len(self.templates) > self.max_entries:
+            self.templates.popitem(last=False)
+        return template
+
+    def resolve_include(self, name: str, base_dir: str) -> Optional[str]:
+        candidates = [name] if os.path.isabs(name) else [
+            os.path.join(base_dir, name), os.path.join(PROMPT_LIBRARY_DIR, name)]
+        for candidate in candidates:
+            for path in (candidate, candidate + PROMPT_EXTENSION):
+                if os.path.isfile(path):
+                    return os.path.normpath(os.path.abspath(path))
+        return None
+
+    def load_include(self, file_path: str, stack: Tuple[str, ...]) -> PromptTemplate:
+        mtime = self.mtime(file_path)
+        cached = self.includes.get(file_path)
+        if cached is not None and cached[0] == mtime and self.is_current(cached[1]):
+            return cached[1]
+        template = self.compile(read_text_file(file_path), os.path.dirname(file_path), stack + (file_path,))
+        template.dependencies[file_path] = mtime
+        self.includes[file_path] = (mtime, template)
+        return template
+
+    def compile(self, text: str, base_dir: str, stack: Tuple[str, ...]) -> PromptTemplate:
+        parts: List[Union[str, Tuple[str, str]]] = []
+        dependencies: Dict[str, Optional[int]] = {}
+        position = 0
+        for match in PROMPT_TAG_PATTERN.finditer(text):
+            if match.start() > position:
+                parts.append(text[position:match.start()])
+            position = match.end()
+            is_include, name, default = match.groups()
+            if not is_include:
+                parts.append((name, (default or '').strip()))
+                continue
+            include_path = self.resolve_include(name, base_dir)
+            if include_path is None:
+                parts.append(f'**[missing include: {name}]**')
+            elif include_path in stack or len(stack) >= PROMPT_INCLUDE_DEPTH:
+                parts.append(f'**[include cycle: {name}]**')
+            else:
+                try:
+                    included = self.load_include(include_path, stack)
+                except Exception as e:
+                    parts.append(f'**[include failed: {name}: {str(e)}]**')
+                    continue
+                parts.extend(included.parts)
+                dependencies.update(included.dependencies)
+        if position < len(text):
+            parts.append(text[position:])
+        # Adjacent literals from inlined includes are merged so rendering is a short join
+        merged: List[Union[str, Tuple[str, str]]] = []
+        for part in parts:
+            if merged and isinstance(part, str) and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+        return PromptTemplate(merged, dependencies)
+
+class StatisticsReport(QObject):
+    """Word, character and token counts of every prompt file in the projects.
+
+    Files are read and hashed on a background thread. Only content whose
+    hash is not in the on-disk cache is counted, in a process pool.
+    """
+    finished = pyqtSignal(object, float)
+
+    def __init__(self, parent: Optional[QObject] = None, max_entries: int = 20000) -> None:
+        super().__init__(parent)
+        self.cache_path = os.path.join(CACHE_DIR, 'statistics.json')
+        self.max_entries = max_entries
+        self.running = False
+
+    def build(self, roots: List[str], extensions: Tuple[str, ...] = (PROMPT_EXTENSION,)) -> None:
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self._build_worker, args=(list(roots), extensions),
+                         name='StatisticsReport', daemon=True).start()
+
+    def _build_worker(self, roots: List[str], extensions: Tuple[str, ...]) -> None:
+        started = time.perf_counter()
+        rows: List[Tuple] = []
+        try:
+            rows = self._count(roots, extensions)
+        except Exception as e:
+            print(f"Could not build statistics report: {str(e)}")
+        finally:
+            # Always report back, a report that never finishes would keep the next one from starting
+            self.running = False
+            self.finished.emit(rows, time.perf_counter() - started)
+
+    def _count(self, roots: List[str], extensions: Tuple[str, ...]) -> List[Tuple]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache: Dict[str, List[int]] = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        files: List[Tuple[str, str]] = []
+        missing: Dict[str, str] = {}
+        for root in roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in LINK_SCAN_IGNORED_DIRS]
+                for filename in filenames:
+                    if not filename.lower().endswith(extensions):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        text = read_text_file(path)
+                    except Exception:
+                        continue
+                    key = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+                    files.append((path, key))
+                    if key not in cache:
+                        missing[key] = text
+
+        keys = list(missing)
+        batches = [keys[i:i + 64] for i in range(0, len(keys), 64)]
+        if len(batches) == 1:
+            results = file_statistics([missing[key] for key in batches[0]])
+        elif batches:
+            with spawn_process_pool(min(len(batches), os.cpu_count() or 2)) as executor:
+                results = [
+                    statistics for batch_results in executor.map(
+                        file_statistics, [[missing[key] for key in batch] for batch in batches])
+                    for statistics in batch_results
+                ]
+        else:
+            results = []
+        cache.update((key, list(statistics)) for key, statistics in zip(keys, results))
+
+        if missing:
+            # Keep the entries of current files first when trimming
+            current = {key for _, key in files}
+            kept = {key: value for key, value in cache.items() if key in current}
+            for key, value in cache.items():
+                if len(kept) >= self.max_entries:
+                    break
+                kept.setdefault(key, value)
+            try:
+                atomic_write_text(self.cache_path, json.dumps(kept))
+            except OSError as e:
+                print(f"Could not write statistics cache: {str(e)}")
+        return [(path, *cache[key]) for path, key in files]
+
+def utf16_length(text: str) -> int:
+    """Length of text in QTextDocument positions, which count UTF-16 code units"""
+    return len(text.encode('utf-16-le')) // 2
+
+# Changed line ranges up to this many characters are narrowed down to the changed characters
+CHARACTER_DIFF_LIMIT = 4000
+
+def character_edits(old_chunk: str, new_chunk: str, start: int) -> List[Tuple[int, int, str]]:
+    """Edits turning old_chunk, found at document position start, into new_chunk"""
+    if len(old_chunk) + len(new_chunk) > CHARACTER_DIFF_LIMIT:
+        return [(start, start + utf16_length(old_chunk), new_chunk)]
+    positions = [start]
+    for char in old_chunk:
+        positions.append(positions[-1] + (2 if ord(char) > 0xFFFF else 1))
+    matcher = difflib.SequenceMatcher(None, old_chunk, new_chunk, autojunk=False)
+    return [
+        (positions[i1], positions[i2], new_chunk[j1:j2])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+def line_opcodes(old_lines: List[str], new_lines: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    """Opcodes in the form of SequenceMatcher.get_opcodes, anchored on lines unique to both sides.
+
+    Matching the unique lines first (as in patience diff) splits the texts
+    into short stretches, so repeated lines such as blank lines never make
+    the matching quadratic.
+    """
+    old_positions: Dict[str, int] = {}
+    for i, line in enumerate(old_lines):
+        old_positions[line] = -1 if line in old_positions else i
+    new_positions: Dict[str, int] = {}
+    for j, line in enumerate(new_lines):
+        new_positions[line] = -1 if line in new_positions else j
+    pairs = sorted(
+        (j, old_positions[line]) for line, j in new_positions.items()
+        if j >= 0 and old_positions.get(line, -1) >= 0
+    )
+    # Longest run of unique lines that appear in the same order on both sides
+    tail_values: List[int] = []
+    tail_pairs: List[int] = []
+    previous = [-1] * len(pairs)
+    for k, (_, i) in enumerate(pairs):
+        position = bisect.bisect_left(tail_values, i)
+        previous[k] = tail_pairs[position - 1] if position else -1
+        if position == len(tail_values):
+            tail_values.append(i)
+            tail_pairs.append(k)
+        else:
+            tail_values[position] = i
+            tail_pairs[position] = k
+    anchors: List[Tuple[int, int]] = []
+    k = tail_pairs[-1] if tail_pairs else -1
+    while k >= 0:
+        anchors.append((pairs[k][1], pairs[k][0]))
+        k = previous[k]
+    anchors.reverse()
+
+    opcodes: List[Tuple[str, int, int, int, int]] = []
+    i = j = 0
+    for anchor_i, anchor_j in anchors + [(len(old_lines), len(new_lines))]:
+        if anchor_i - i == anchor_j - j:
+            # Lines edited in place, e.g. by replace all, pair up one to one
+            opcodes += [
+                ('equal' if old_lines[i + n] == new_lines[j + n] else 'replace', i + n, i + n + 1, j + n, j + n + 1)
+                for n in range(anchor_i - i)
+            ]
+        else:
+            matcher = difflib.SequenceMatcher(None, old_lines[i:anchor_i], new_lines[j:anchor_j])
+            opcodes += [
+                (tag, i + i1, i + i2, j + j1, j + j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            ]
+        if anchor_i < len(old_lines):
+            opcodes.append(('equal', anchor_i, anchor_i + 1, anchor_j, anchor_j + 1))
+        i, j = anchor_i + 1, anchor_j + 1
+    return opcodes
+
+def apply_text_diff(document: QTextDocument, new_text: str) -> int:
+    """Turn the document's text into new_text by editing only the ranges that differ.
+
+    This is the one way programmatic updates change a document. Lines are
+    diffed first and small changed line ranges are narrowed to the changed
+    characters. The edits run in one edit block, so they form a single undo
+    step and one contentsChanged, and cursors, block user data, highlighting
+    and per-block caches outside the changed ranges are kept. Returns the
+    number of edits.
+    """
+    old_text = document.toPlainText()
+    if old_text == new_text:
+        return 0
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+    # Most updates touch a small region, so match only what lies between the shared ends
+    prefix = 0
+    limit = min(len(old_lines), len(new_lines))
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    opcodes = line_opcodes(old_middle, new_middle)
+
+    offsets = [utf16_length(''.join(old_lines[:prefix]))]
+    for line in old_middle:
+        offsets.append(offsets[-1] + utf16_length(line))
+    edits: List[Tuple[int, int, str]] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'replace':
+            edits += character_edits(''.join(old_middle[i1:i2]), ''.join(new_middle[j1:j2]), offsets[i1])
+        elif tag != 'equal':
+            edits.append((offsets[i1], offsets[i2], ''.join(new_middle[j1:j2])))
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    # Apply from the end so earlier positions stay valid
+    for start, end, text in reversed(edits):
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        cursor.insertText(text)
+    cursor.endEditBlock()
+    return len(edits)
+
+def render_worker_main(connection) -> None:
+    """Entry point of the render worker process: converts blocks until the pipe closes"""
+    connection.send(('ready',))
+    while True:
+        try:
+            request_id, blocks = connection.recv()
+        except (EOFError, OSError):
+            return
+        for index, (key, block_text) in enumerate(blocks):
+            try:
+                html_content = convert_block(key, block_text)
+            except Exception as e:
+                html_content = f'<pre>{html.escape(str(e))}</pre>'
+            connection.send(('block', request_id, index, html_content))
+
+class RenderWorker(QObject):
+    """Converts markdown blocks in a supervised child process.
+
+    markdown2 is regex heavy and can run for a very long time on
+    pathological input. Blocks are converted in a worker process and
+    streamed back one at a time. A watchdog kills and restarts the worker
+    when one block exceeds the time budget, and that block is shown as
+    plain text from then on, so the GUI thread never waits on markdown2.
+    Only the newest request waits while one is in flight.
+    """
+    finished = pyqtSignal(object)
+    timedOut = pyqtSignal(str)
+    _message = pyqtSignal(int, object)
+
+    def __init__(self, timeout: int = 2000, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.timeout = timeout
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.connection = None
+        self.generation = 0
+        self.ready = False
+        self.failures = 0
+        self.request_id = 0
+        # [request id, renderer, blocks, index of the block being converted]
+        self.current: Optional[list] = None
+        self.pending: Optional[Tuple[BlockRenderer, List[Tuple[str, str]]]] = None
+        self.watchdog = QTimer(self)
+        self.watchdog.setSingleShot(True)
+        self.watchdog.timeout.connect(self._on_timeout)
+        self._message.connect(self._on_message)
+
+    @property
+    def available(self) -> bool:
+        # Give up on the worker if it keeps dying on startup
+        return self.failures < 3
+
+    def start(self) -> None:
+        parent_connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target=render_worker_main, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.connection = parent_connection
+        self.generation += 1
+        self.ready = False
+        threading.Thread(target=self._reader, args=(parent_connection, self.generation),
+                         name='RenderWorker', daemon=True).start()
+
+    def _reader(self, connection, generation: int) -> None:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                self._message.emit(generation, None)
+                return
+            self._message.emit(generation, message)
+
+    def stop(self) -> None:
+        self.watchdog.stop()
+        self.generation += 1
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(1)
+            self.process = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def render(self, renderer: BlockRenderer, blocks: List[Tuple[str, str]]) -> None:
+        """Convert blocks into renderer's cache, emitting finished(renderer) when done"""
+        if self.current is not None:
+            self.pending = (renderer, blocks)
+            return
+        if not self.available:
+            for key, block_text in blocks:
+                renderer.store(key, convert_block(key, block_text))
+            self.finished.emit(renderer)
+            return
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self.start()
+        self.request_id += 1
+        self.current = [self.request_id, renderer, blocks, 0]
+        self.connection.send((self.request_id, blocks))
+        # Starting a worker imports the editor module, allow for that on the first request
+        self.watchdog.start(self.timeout if self.ready else max(self.timeout, 20000))
+
+    def _next(self) -> None:
+        if self.pending is None:
+            return
+        renderer, blocks = self.pending
+        self.pending = None
+        blocks = [(key, block_text) for key, block_text in blocks if key not in renderer.cache]
+        if blocks:
+            self.render(renderer, blocks)
+        else:
+            self.finished.emit(renderer)
+
+    def _on_message(self, generation: int, message: Optional[tuple]) -> None:
+        if generation != self.generation:
+            return
+        if message is None:
+            # The worker died; retry the request on a fresh one
+            self.failures += 0 if self.ready else 1
+            current, self.current = self.current, None
+            self.stop()
+            if current is not None and self.pending is None:
+                self.pending = (current[1], current[2][current[3]:])
+            self._next()
+            return
+        if message[0] == 'ready':
+            self.ready = True
+            self.failures = 0
+            if self.current is not None:
+                self.watchdog.start(self.timeout)
+            return
+        _, request_id, index, html_content = message
+        if self.current is None or request_id != self.current[0]:
+            return
+        _, renderer, blocks, _ = self.current
+        renderer.store(blocks[index][0], html_content)
+        self.current[3] = index + 1
+        if index + 1 < len(blocks):
+            self.watchdog.start(self.timeout)
+            return
+        self.watchdog.stop()
+        self.current = None
+        self.finished.emit(renderer)
+        self._next()
+
+    def _on_timeout(self) -> None:
+        if self.current is None:
+            return
+        _, renderer, blocks, index = self.current
+        self.current = None
+        self.stop()
+        if not self.ready:
+            # The worker never came up; retry, falling back to converting in process
+            self.failures += 1
+            if self.pending is None:
+                self.pending = (renderer, blocks)
+            self._next()
+            return
+        key, block_text = blocks[index]
+        renderer.store(key, render_timeout_html(block_text))
+        self.timedOut.emit(block_text)
+        if self.pending is None and index + 1 < len(blocks):
+            self.pending = (renderer, blocks[index + 1:])
+        if self.pending is None:
+            self.finished.emit(renderer)
+        self.start()
+        self._next()
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident memory of a process in bytes, or None where it cannot be read"""
+    if not pid:
+        return None
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')
+            ]
+
+        # PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000 | 0x0010, False, pid)
+        if not handle:
+            return None
+        try:
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return None
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemoryDiagnostics:
+    """Samples memory every few preview updates to find what grows over a long session.
+
+    A sample diffs a tracemalloc snapshot against the previous sample, counts
+    the window's live Qt objects by class and reads the resident memory of
+    this process and of the preview's render process.
+    """
+
+    def __init__(self, interval: int = 0, log_path: Optional[str] = None, top: int = 10) -> None:
+        self.interval = interval
+        self.log_path = log_path or os.path.join(CONFIG_DIR, 'memory_diagnostics.log')
+        self.top = top
+        self.renders = 0
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.object_counts: Counter = Counter()
+
+    def record_render(self, window: QWidget, render_pid: int = 0) -> None:
+        self.renders += 1
+        if self.interval > 0 and self.renders % self.interval == 0:
+            self.log(self.sample(window, render_pid))
+
+    def sample(self, window: QWidget, render_pid: int = 0) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),))
+        python_growth = []
+        if self.snapshot is not None:
+            python_growth = [str(stat) for stat in snapshot.compare_to(self.snapshot, 'lineno')[:self.top]]
+        self.snapshot = snapshot
+        object_counts = Counter(type(child).__name__ for child in window.findChildren(QObject))
+        object_growth = object_counts.copy()
+        object_growth.subtract(self.object_counts)
+        self.object_counts = object_counts
+        return {
+            'renders': self.renders,
+            'python_bytes': tracemalloc.get_traced_memory()[0],
+            'rss_bytes': process_rss(os.getpid()),
+            'render_process_rss_bytes': process_rss(render_pid),
+            'qt_objects': sum(object_counts.values()),
+            'qt_object_growth': [(name, count) for name, count in object_growth.most_common(self.top) if count > 0],
+            'python_growth': python_growth,
+        }
+
+    def log(self, sample: Dict[str, Any]) -> None:
+        def megabytes(value: Optional[int]) -> str:
+            return f'{value / (1024 * 1024):.1f} MB' if value is not None else 'n/a'
+
+        lines = [
+            f'{time.strftime("%Y-%m-%d %H:%M:%S")} after {sample["renders"]} renders: '
+            f'python {megabytes(sample["python_bytes"])}, rss {megabytes(sample["rss_bytes"])}, '
+            f'render process {megabytes(sample["render_process_rss_bytes"])}, {sample["qt_objects"]} Qt objects'
+        ]
+        lines += [f'  Qt +{count} {name}' for name, count in sample['qt_object_growth']]
+        lines += [f'  {stat}' for stat in sample['python_growth']]
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            print(f"Could not write memory diagnostics: {str(e)}")
+
+class SamplingProfiler(QObject):
+    """Records where the editor's Python threads spend their time, for a few seconds.
+
+    A background thread samples the current frame of every other thread at
+    a fixed interval. Frames are named by their qualified name, such as
+    MarkdownEditor.update_preview or MultiProjectModel.rowCount, so time is
+    attributed to the editor's own methods. The profile is saved in the
+    cache directory as speedscope JSON, one profile per thread, with the
+    same samples as collapsed stacks next to it.
+    """
+
+    finished = pyqtSignal(str)
+
+    def __init__(self, parent: Optional[QObject] = None, interval: float = 0.01,
+                 output_dir: Optional[str] = None) -> None:
+        super().__init__(parent)
+        self.interval = interval
+        self.output_dir = output_dir or os.path.join(CACHE_DIR, 'profiles')
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.frame_names: Dict[Any, Tuple[str, str, int]] = {}
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds: float) -> None:
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(seconds,), name='SamplingProfiler', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop early; the samples so far are still saved"""
+        self.stop_event.set()
+
+    def frame_name(self, frame) -> Tuple[str, str, int]:
+        code = frame.f_code
+        name = self.frame_names.get(code)
+        if name is None:
+            qualified_name = getattr(code, 'co_qualname', None)
+            if qualified_name is None:
+                # Before Python 3.11 the class comes from the frame's self
+                instance = frame.f_locals.get('self')
+                qualified_name = f'{type(instance).__name__}.{code.co_name}' if instance is not None else code.co_name
+            name = (qualified_name, code.co_filename, code.co_firstlineno)
+            self.frame_names[code] = name
+        return name
+
+    def _run(self, seconds: float) -> None:
+        own_thread = threading.get_ident()
+        samples: Dict[int, Counter] = {}
+        started = time.monotonic()
+        deadline = started + seconds
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self.frame_name(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                samples.setdefault(thread_id, Counter())[tuple(stack)] += 1
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        thread_names[threading.main_thread().ident] = 'GUI'
+        try:
+            path = self.save(samples, thread_names, time.monotonic() - started)
+        except OSError as e:
+            print(f"Could not save profile: {str(e)}")
+            path = ''
+        self.finished.emit(path)
+
+    def save(self, samples: Dict[int, Counter], thread_names: Dict[int, str], duration: float) -> str:
+        """Write the samples as speedscope JSON and collapsed stacks; returns the JSON path"""
+        frames: List[Dict[str, Any]] = []
+        frame_indexes: Dict[Tuple[str, str, int], int] = {}
+        profiles = []
+        collapsed = []
+        weight = self.interval * 1000
+        # The GUI thread first, then the busiest
+        for thread_id, stacks in sorted(samples.items(), key=lambda item: (thread_names.get(item[0]) != 'GUI',
+                                                                          -sum(item[1].values()))):
+            thread_name = thread_names.get(thread_id, f'thread {thread_id}')
+            profile_samples = []
+            weights = []
+            for stack, count in stacks.most_common():
+                indexes = []
+                for name in stack:
+                    if name not in frame_indexes:
+                        frame_indexes[name] = len(frames)
+                        frames.append({'name': name[0], 'file': name[1], 'line': name[2]})
+                    indexes.append(frame_indexes[name])
+                profile_samples.append(indexes)
+                weights.append(count * weight)
+                collapsed.append(';'.join([thread_name] + [
+                    f'{qualified_name} ({os.path.basename(file_name)}:{line})'
+                    for qualified_name, file_name, line in stack
+                ]) + f' {count}')
+            profiles.append({
+                'type': 'sampled',
+                'name': thread_name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': profile_samples,
+                'weights': weights,
+            })
+        base_path = os.path.join(self.output_dir, f'profile-{time.strftime("%Y%m%d-%H%M%S")}')
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f'Markdown editor, {duration:.1f} s',
+            'exporter': 'markdown_editor',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': profiles,
+        }
+        atomic_write_text(f'{base_path}.txt', '\n'.join(collapsed) + '\n')
+        atomic_write_text(f'{base_path}.speedscope.json', json.dumps(document))
+        return f'{base_path}.speedscope.json'
+
+# A piece whose hash ends in these bits closes a group of a version's piece list
+HISTORY_GROUP_MASK = 0x1f
+# Objects younger than this survive garbage collection, another editor may be writing a version with them
+HISTORY_GC_GRACE_SECONDS = 3600
+
+class HistoryVersion(NamedTuple):
+    """A saved version of a document in the history store"""
+    time: float
+    root: str
+    size: int
+    path: str
+
+def thin_versions(versions: List[HistoryVersion], now: float, keep_days: int) -> List[HistoryVersion]:
+    """The versions retention keeps: all of the last day, one per hour for a week, then one per day.
+
+    The newest version in each hour or day survives, as does the newest version overall.
+    """
+    kept = []
+    buckets = set()
+    for version in sorted(versions, key=lambda v: v.time, reverse=True):
+        age = now - version.time
+        if kept and age > keep_days * 86400:
+            continue
+        if age > 7 * 86400:
+            bucket = ('day', int(version.time // 86400))
+        elif age > 86400:
+            bucket = ('hour', int(version.time // 3600))
+        else:
+            bucket = None
+        if kept and bucket is not None and bucket in buckets:
+            continue
+        buckets.add(bucket)
+        kept.append(version)
+    kept.reverse()
+    return kept
+
+class VersionHistory(QObject):
+    """Content-addressed history of saved documents under the cache directory.
+
+    A saved text is cut at its block boundaries and every piece is stored
+    once, compressed, as an object named by its hash. A version is a root
+    object listing groups of piece hashes, each group itself an object, cut
+    where a piece hash ends in five zero bits so that an edit changes the
+    one group around it. Another version of a large file then costs the few
+    pieces that changed, a group or two and a line in the document's log.
+
+    Snapshots, retention and garbage collection run one after another on a
+    background thread; versions are read on the caller's thread.
+    """
+    snapshotSaved = pyqtSignal(str)
+
+    def __init__(self, root: Optional[str] = None, keep_days: int = 90, max_cached_bytes: int = 16 * 1024 * 1024,
+                 parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.root = root or os.path.join(CACHE_DIR, 'history')
+        self.keep_days = keep_days
+        self.max_cached_bytes = max_cached_bytes
+        # Pieces read for the history browser; neighbouring versions share nearly all of them
+        self.object_cache: 'OrderedDict[str, str]' = OrderedDict()
+        self.object_cache_size = 0
+        self.jobs: 'queue.Queue[tuple]' = queue.Queue()
+        # Objects known to exist, with the time this editor last wrote or renewed them
+        self.known_objects: Dict[str, float] = {}
+        self.last_roots: Dict[str, str] = {}
+        self.snapshots_since_maintenance = 0
+        self.stopping = False
+        threading.Thread(target=self._worker, name='VersionHistory', daemon=True).start()
+
+    @staticmethod
+    def object_key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def object_path(self, key: str) -> str:
+        return os.path.join(self.root, 'objects', key[:2], key[2:])
+
+    def log_path(self, file_path: str) -> str:
+        document_key = hashlib.sha256(os.path.normcase(os.path.abspath(file_path)).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'documents', f'{document_key[:32]}.jsonl')
+
+    def has_versions(self, file_path: str) -> bool:
+        return os.path.exists(self.log_path(file_path))
+
+    def snapshot(self, file_path: str, text: str, timestamp: Optional[float] = None) -> None:
+        """Queue a version of file_path; a text equal to the last version adds nothing"""
+        self.jobs.put(('snapshot', file_path, text, timestamp or time.time()))
+
+    def snapshot_original(self, file_path: str) -> None:
+        """Keep the text on disk before a file's first save, so it can be restored too"""
+        if self.has_versions(file_path) or not os.path.exists(file_path):
+            return
+        try:
+            self.snapshot(file_path, read_text_file(file_path), os.path.getmtime(file_path))
+        except Exception as e:
+            print(f"Could not record the original version: {str(e)}")
+
+    def move(self, old_file_path: str, new_file_path: str) -> None:
+        """Queue handing a renamed file's versions over to its new path"""
+        self.jobs.put(('move', old_file_path, new_file_path))
+
+    def maintain(self) -> None:
+        """Queue retention of old versions and removal of the objects no version uses"""
+        self.jobs.put(('maintain',))
+
+    def flush(self) -> None:
+        """Wait for queued snapshots, cutting short a running maintenance"""
+        self.stopping = True
+        self.jobs.join()
+
+    def versions(self, file_path: str) -> List[HistoryVersion]:
+        return self._read_log(self.log_path(file_path))
+
+    def read_version(self, version: HistoryVersion) -> str:
+        pieces = []
+        for group in self._read_object(version.root, cached=False).split('\n'):
+            for piece in self._read_object(group, cached=False).split('\n'):
+                pieces.append(self._read_object(piece))
+        return ''.join(pieces)
+
+    def _read_object(self, key: str, cached: bool = True) -> str:
+        if not key:
+            return ''
+        text = self.object_cache.get(key)
+        if text is not None:
+            self.object_cache.move_to_end(key)
+            return text
+        with open(self.object_path(key), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if self.object_key(data) != key:
+            raise ValueError(f'History object {key} is damaged')
+        text = data.decode('utf-8', 'surrogatepass')
+        if cached:
+            self.object_cache[key] = text
+            self.object_cache_size += len(text)
+            while self.object_cache_size > self.max_cached_bytes and len(self.object_cache) > 1:
+                _, evicted = self.object_cache.popitem(last=False)
+                self.object_cache_size -= len(evicted)
+        return text
+
+    @staticmethod
+    def _read_log(log_path: str) -> List[HistoryVersion]:
+        versions = []
+        try:
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        versions.append(HistoryVersion(
+                            float(entry['time']), entry['root'], int(entry['size']), entry.get('path', '')))
+                    except (ValueError, KeyError, TypeError):
+                        # A line torn by a crash while appending
+                        continue
+        except OSError:
+            pass
+        return versions
+
+    def _worker(self) -> None:
+        while True:
+            job = self.jobs.get()
+            try:
+                if job[0] == 'snapshot':
+                    self._write_snapshot(*job[1:])
+                elif job[0] == 'move':
+                    self._move_log(*job[1:])
+                elif not self.stopping:
+                    self._run_maintenance()
+            except Exception as e:
+                print(f"Version history {job[0]} failed: {str(e)}")
+            finally:
+                self.jobs.task_done()
+
+    def _store(self, text: str) -> str:
+        data = text.encode('utf-8', 'surrogatepass')
+        key = self.object_key(data)
+        now = time.time()
+        if now - self.known_objects.get(key, 0.0) > HISTORY_GC_GRACE_SECONDS / 2:
+            path = self.object_path(key)
+            try:
+                # Reusing an object renews it, so another editor's garbage collection leaves it alone
+                os.utime(path)
+            except FileNotFoundError:
+                atomic_write_bytes(path, zlib.compress(data))
+            if len(self.known_objects) > 500000:
+                self.known_objects.clear()
+            self.known_objects[key] = now
+        return key
 
-class ColorTheme(Enum):
-    # Backgrounds
-    WINDOW_BG = '#2B2B2B'          # Main window background
-    EDITOR_BG = '#1E1E1E'          # Editor and panels background
-    
-    # Text Colors
-    TEXT_PRIMARY = '#FFFFFF'        # Primary text color
-    TEXT_SECONDARY = '##000000'      # Secondary text color
-    
-    # Button Colors
-    BUTTON_BG = '#FFFFFF'          # Button background
-    BUTTON_TEXT = '#663399'        # Button text color
-    BUTTON_BORDER = '#FFD700'      # Button border
-    BUTTON_HOVER_BG = '#faebd7'    # Button hover background
-    BUTTON_HOVER_TEXT = '#B8860B'  # Button hover text
-    
-    # Accent Colors
-    ACCENT_PRIMARY = '#663399'     # Primary accent (purple)
-    ACCENT_SECONDARY = '#FFD700'   # Secondary accent (gold)
-    ACCENT_TERTIARY = '#B8860B'    # Tertiary accent (dark gold)
-    ACCENT_HIGHLIGHT = '#eb93eb'   # Highlight accent (light purple)
-    
-    # Interactive Elements
-    HOVER_BG = '#3D3D3D'          # Generic hover background
-    FOCUS_BORDER = '#eb93eb'      # Focus state border
-    SELECTION_BG = '#663399'      # Selected item background
-    
-    # Scrollbar
-    SCROLLBAR_BG = '#1E1E1E'      # Scrollbar background
-    SCROLLBAR_HANDLE = '#FFFFFF'   # Scrollbar handle
-    SCROLLBAR_BORDER = '#B8860B'   # Scrollbar border
-    
-    # Menu and Toolbar
-    MENU_BG = '#1E1E1E'           # Menu background
-    MENU_TEXT = '#FFFFFF'         # Menu text
-    MENU_BORDER = '#B8860B'       # Menu border
-    MENU_ITEM_SELECTED = '#663399' # Selected menu item
+    def _write_snapshot(self, file_path: str, text: str, timestamp: float) -> None:
+        blocks = split_markdown_blocks(text)
+        cuts = [0] + [block.start for block in blocks[1:]] + [len(text)]
+        groups = []
+        group: List[str] = []
+        for start, end in zip(cuts, cuts[1:]):
+            key = self._store(text[start:end])
+            group.append(key)
+            if int(key[-2:], 16) & HISTORY_GROUP_MASK == 0:
+                groups.append(self._store('\n'.join(group)))
+                group = []
+        if group or not groups:
+            groups.append(self._store('\n'.join(group)))
+        root = self._store('\n'.join(groups))
+        log_path = self.log_path(file_path)
+        if log_path not in self.last_roots:
+            versions = self._read_log(log_path)
+            self.last_roots[log_path] = versions[-1].root if versions else ''
+        if self.last_roots[log_path] == root:
+            return
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(self._log_line(HistoryVersion(timestamp, root, len(text), file_path)))
+        self.last_roots[log_path] = root
+        self.snapshotSaved.emit(file_path)
+        self.snapshots_since_maintenance += 1
+        if self.snapshots_since_maintenance >= 200:
+            self.maintain()
 
-    def __str__(self):
-        return self.value
+    def _move_log(self, old_file_path: str, new_file_path: str) -> None:
+        old_log, new_log = self.log_path(old_file_path), self.log_path(new_file_path)
+        if old_log == new_log or not os.path.exists(old_log) or os.path.exists(new_log):
+            return
+        os.replace(old_log, new_log)
+        self.last_roots.pop(old_log, None)
+        self.last_roots.pop(new_log, None)
 
-    def __format__(self, format_spec):
-        return self.value
+    @staticmethod
+    def _log_line(version: HistoryVersion) -> str:
+        return json.dumps(version._asdict()) + '\n'
 
-class CopyHandler(QObject):
-    def __init__(self, parent: Optional[QObject] = None) -> None:
+    def _run_maintenance(self) -> None:
+        self.snapshots_since_maintenance = 0
+        now = time.time()
+        documents_dir = os.path.join(self.root, 'documents')
+        try:
+            log_names = os.listdir(documents_dir)
+        except OSError:
+            return
+        live = set()
+        for name in log_names:
+            if self.stopping:
+                return
+            log_path = os.path.join(documents_dir, name)
+            versions = self._read_log(log_path)
+            kept = thin_versions(versions, now, self.keep_days)
+            if len(kept) != len(versions):
+                atomic_write_text(log_path, ''.join(self._log_line(version) for version in kept))
+            for version in kept:
+                if version.root in live:
+                    continue
+                live.add(version.root)
+                try:
+                    groups = [key for key in self._read_object(version.root, cached=False).split('\n') if key]
+                    for group in groups:
+                        if group not in live:
+                            live.add(group)
+                            live.update(key for key in self._read_object(group, cached=False).split('\n') if key)
+                except (OSError, ValueError, zlib.error) as e:
+                    # Without knowing everything still in use, deleting anything could lose a version
+                    print(f"Version history garbage collection skipped: {str(e)}")
+                    return
+        objects_dir = os.path.join(self.root, 'objects')
+        for dirpath, _, filenames in os.walk(objects_dir):
+            if self.stopping:
+                return
+            for filename in filenames:
+                key = os.path.basename(dirpath) + filename
+                path = os.path.join(dirpath, filename)
+                try:
+                    if key not in live and now - os.path.getmtime(path) > HISTORY_GC_GRACE_SECONDS:
+                        os.remove(path)
+                        self.known_objects.pop(key, None)
+                except OSError:
+                    continue
+
+class FileChangeMonitor(QObject):
+    """Reports changes other programs make to open files.
+
+    A QFileSystemWatcher gives quick notice; a stat poll catches what it
+    misses, e.g. files replaced by rename or on network drives. Only
+    mtime and size are compared, so polling costs one stat per open file.
+    """
+    fileChanged = pyqtSignal(str)
+
+    def __init__(self, poll_interval: int = 2000, parent: Optional[QObject] = None) -> None:
         super().__init__(parent)
-    
-    @pyqtSlot(str)
-    def copy_to_clipboard(self, text: str) -> None:
-        pyperclip.copy(text)
+        self.known: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.check)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.poll)
+        self.poll_timer.start(poll_interval)
 
-class KeyBindings(Enum):
-    # Editor Mode Controls
-    TOGGLE_EDIT_MODE = 'E'
-    EXIT_EDIT_MODE = 'Esc'
-    
-    # File Operations
-    SAVE_FILE = 'Ctrl+S'
-    NEW_FILE = 'Ctrl+N'
-    OPEN_FILE = 'Ctrl+O'
-    
-    # Edit Operations
-    UNDO = 'Ctrl+Z'
-    REDO = 'Ctrl+Y'
-    CUT = 'Ctrl+X'
-    COPY = 'Ctrl+C'
-    PASTE = 'Ctrl+V'
-    
-    # Navigation
-    FIND = 'Ctrl+F'
-    REPLACE = 'Ctrl+H'
-    
-    # View Controls
-    TOGGLE_PREVIEW = 'Q'
-    TOGGLE_FILE_BROWSER = 'Ctrl+B'
+    @staticmethod
+    def stat(file_path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
-class FontStyle(Enum):
-    # Editor fonts
-    EDITOR_MAIN = {
-        'family': 'Consolas',
-        'size': 12,
-        'weight': 75,  # Bold
-        'italic': False
-    }
-    
-    EDITOR_HEADING1 = {
-        'family': 'Consolas',
-        'size': 20,
-        'weight': 75,  # Bold
-        'italic': False
-    }
-    
-    EDITOR_HEADING2 = {
-        'family': 'Consolas',
-        'size': 16,
-        'weight': 75,  # Bold
-        'italic': False
-    }
-    
-    # UI Element fonts
-    BUTTON_TEXT = {
-        'family': 'Segoe UI',
-        'size': 10,
-        'weight': 63,  # DemiBold
-        'italic': False
-    }
-    
-    MENU_TEXT = {
-        'family': 'Segoe UI',
-        'size': 10,
-        'weight': 50,  # Normal
-        'italic': False
-    }
-    
-    STATUS_BAR = {
-        'family': 'Segoe UI',
-        'size': 9,
-        'weight': 50,  # Normal
-        'italic': False
-    }
-    
-    FILE_BROWSER = {
-        'family': 'Segoe UI',
-        'size': 10,
-        'weight': 50,  # Normal
-        'italic': False
-    }
-    
-    TITLE_BAR = {
-        'family': 'Segoe UI',
-        'size': 11,
-        'weight': 63,  # DemiBold
-        'italic': False
-    }
-    
-    # Preview fonts
-    PREVIEW_BODY = {
-        'family': 'Segoe UI',
-        'size': 12,
-        'weight': 50,  # Normal
-        'italic': False
-    }
-    
-    PREVIEW_CODE = {
-        'family': 'Consolas',
-        'size': 12,
-        'weight': 50,  # Normal
-        'italic': False
-    }
-    
-    PREVIEW_QUOTE = {
-        'family': 'Segoe UI',
-        'size': 12,
-        'weight': 50,  # Normal
-        'italic': True
-    }
+    def watch(self, file_path: str) -> None:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        self.known[file_path] = self.stat(file_path)
+        if os.path.exists(file_path) and file_path not in self.watcher.files():
+            self.watcher.addPath(file_path)
 
-    def create_font(self):
-        """Create a QFont object from the style configuration"""
-        font = QFont(self.value['family'], self.value['size'])
-        font.setWeight(self.value['weight'])
-        font.setItalic(self.value['italic'])
-        return font
+    def unwatch(self, file_path: str) -> None:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        self.known.pop(file_path, None)
+        if file_path in self.watcher.files():
+            self.watcher.removePath(file_path)
+
+    def mark_current(self, file_path: str) -> None:
+        """Accept the file's present state, e.g. right after the editor wrote it"""
+        self.watch(file_path)
+
+    def is_changed(self, file_path: str) -> bool:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        return file_path in self.known and self.stat(file_path) != self.known[file_path]
+
+    def check(self, file_path: str) -> None:
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        if file_path not in self.known:
+            return
+        current = self.stat(file_path)
+        if current == self.known[file_path]:
+            return
+        self.known[file_path] = current
+        # Saving by rename drops the file from the watcher
+        if current is not None and file_path not in self.watcher.files():
+            self.watcher.addPath(file_path)
+        self.fileChanged.emit(file_path)
+
+    def poll(self) -> None:
+        for file_path in list(self.known):
+            self.check(file_path)
+
+class DocumentTab:
+    """An open document with its own undo history, block render cache and last rendered HTML"""
+
+    def __init__(self, file_path: Optional[str], document: Optional[QTextDocument]) -> None:
+        self.tab_id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.document: Optional[QTextDocument] = None
+        self.indexer: Optional[DocumentIndexer] = None
+        # Tabs restored from a session have no document until they are activated
+        if document is not None:
+            self.set_document(document)
+        self.renderer = BlockRenderer()
+        self.rendered_html = ''
+        self.cursor_position = 0
+        self.scroll_position = 0
+        self.prompt_values: Dict[str, str] = {}
+        # The version shown changes against instead of the preview; None shows the preview
+        self.diff_base: Optional[DiffBase] = None
+        self.spill_path: Optional[str] = None
+        self.last_used = time.monotonic()
+
+    @property
+    def title(self) -> str:
+        return os.path.basename(self.file_path) if self.file_path else 'Untitled'
+
+    def set_document(self, document: QTextDocument) -> None:
+        self.document = document
+        self.indexer = DocumentIndexer(document)
+
+    def memory_usage(self) -> int:
+        """Rough size in bytes of what this tab keeps in memory"""
+        usage = self.renderer.cache_size + len(self.rendered_html)
+        if self.document is not None:
+            # QTextDocument keeps layout data on top of the characters themselves
+            usage += self.document.characterCount() * 8
+        return usage
+
+    def evict(self, drop_document: bool = False) -> int:
+        """Release rendered state, spilling the block cache to disk; returns bytes freed"""
+        before = self.memory_usage()
+        if self.renderer.cache and self.spill_path is None:
+            spill_path = os.path.join(CACHE_DIR, 'tabs', f'{self.tab_id}.json')
+            try:
+                atomic_write_text(spill_path, json.dumps(list(self.renderer.cache.items())))
+                self.spill_path = spill_path
+            except OSError as e:
+                print(f"Could not spill render cache: {str(e)}")
+        self.renderer.clear_cache()
+        self.rendered_html = ''
+        # Unmodified documents can be reloaded from disk when the tab is activated again
+        if drop_document and self.document is not None and self.file_path and not self.document.isModified():
+            self.document.deleteLater()
+            self.document = None
+            self.indexer = None
+        return before - self.memory_usage()
+
+    def restore_cache(self) -> None:
+        if self.spill_path is None:
+            return
+        try:
+            with open(self.spill_path, 'r', encoding='utf-8') as f:
+                for block_text, html_content in json.load(f):
+                    self.renderer.store(block_text, html_content)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not restore render cache: {str(e)}")
+        self.discard_spill()
+
+    def discard_spill(self) -> None:
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+        self.spill_path = None
+
+class MarkdownTreeIndex(QObject):
+    """Directories that hold markdown or prompt files somewhere below them.
+
+    One walk per root on a background thread builds the index, never
+    entering directories that match the ignore globs, so the file browser
+    can hide folders without markdown without listing them itself.
+    """
+    changed = pyqtSignal()
+    _build_done = pyqtSignal(object, object, int)
+
+    def __init__(self, ignore_globs: List[str], parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.ignore_globs = list(ignore_globs)
+        self.roots: List[str] = []
+        # Roots of the finished build, the only paths the index can answer for
+        self.built_roots: List[str] = []
+        self.directories: set = set()
+        self.generation = 0
+        self.version = 0
+        self._build_done.connect(self._on_build_done)
+
+    def is_ignored(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.ignore_globs)
+
+    def build(self, roots: List[str]) -> None:
+        """Rebuild for roots; the previous index answers until the new one is done"""
+        self.roots = sorted({normalize_link_path(root) for root in roots if os.path.isdir(root)})
+        self.generation += 1
+        threading.Thread(target=self._build_worker, args=(list(self.roots), list(self.ignore_globs), self.generation),
+                         name='MarkdownTreeIndex', daemon=True).start()
+
+    def _build_worker(self, roots: List[str], ignore_globs: List[str], generation: int) -> None:
+        directories: set = set()
+        for root in roots:
+            real_root = os.path.realpath(root)
+            seen = {real_root}
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if any(fnmatch.fnmatchcase(entry.name, pattern) for pattern in ignore_globs):
+                                continue
+                            if entry.is_symlink():
+                                # Linked folders can lead back up the tree
+                                target = os.path.realpath(entry.path)
+                                if target in seen or real_root.startswith(target + os.sep):
+                                    continue
+                                seen.add(target)
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith(MARKDOWN_EXTENSIONS):
+                            self._mark(directories, directory, root)
+                    except OSError:
+                        continue
+        self._build_done.emit(roots, directories, generation)
+
+    @staticmethod
+    def _mark(directories: set, directory: str, root: str) -> None:
+        """Add directory and its parents up to root, stopping at the first one already known"""
+        key = normalize_link_path(directory)
+        while key not in directories:
+            directories.add(key)
+            parent = os.path.dirname(key)
+            if key == root or parent == key:
+                break
+            key = parent
+
+    def _on_build_done(self, roots: List[str], directories: set, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self.built_roots = roots
+        self.directories = directories
+        self.version += 1
+        self.changed.emit()
+
+    def root_for(self, path: str) -> Optional[str]:
+        matches = [root for root in self.built_roots if path == root or path.startswith(root + os.sep)]
+        return max(matches, key=len) if matches else None
+
+    def add_file(self, file_path: str) -> None:
+        """Show the folders of a markdown file created after the build"""
+        directory = normalize_link_path(os.path.dirname(file_path))
+        root = self.root_for(directory)
+        if root is None or directory in self.directories:
+            return
+        self._mark(self.directories, directory, root)
+        self.version += 1
+        self.changed.emit()
+
+    def accepts(self, path: str, is_dir: bool) -> bool:
+        """Whether the file browser lists path; folders outside the built roots are always listed"""
+        if not is_dir:
+            return True
+        key = normalize_link_path(path)
+        if key in self.roots:
+            return True
+        if self.is_ignored(os.path.basename(key)):
+            return False
+        return self.root_for(key) is None or key in self.directories
+
+class MarkdownTreeFilter(QSortFilterProxyModel):
+    """A QFileSystemModel without the folders the tree index knows hold no markdown"""
+
+    def __init__(self, source_model: QFileSystemModel, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.tree_index: Optional[MarkdownTreeIndex] = None
+        self.setSourceModel(source_model)
+
+    def set_tree_index(self, tree_index: Optional[MarkdownTreeIndex]) -> None:
+        """Filter by tree_index, or list everything again with None"""
+        self.tree_index = tree_index
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self.tree_index is None:
+            return True
+        model = self.sourceModel()
+        index = model.index(source_row, 0, source_parent)
+        return self.tree_index.accepts(model.filePath(index), model.isDir(index))
+
+    def filePath(self, index: QModelIndex) -> str:
+        return self.sourceModel().filePath(self.mapToSource(index))
+
+    def index_for_path(self, path: str) -> QModelIndex:
+        return self.mapFromSource(self.sourceModel().index(path))
+
+    def setRootPath(self, path: str) -> QModelIndex:
+        return self.mapFromSource(self.sourceModel().setRootPath(path))
 
 class MultiProjectModel(QAbstractItemModel):
     def __init__(self, parent=None):
@@ -192,10 +4364,68 @@ class MultiProjectModel(QAbstractItemModel):
         self.root_paths: List[str] = []
         self.root_names: Dict[str, str] = {}
         self.file_model = QFileSystemModel()
-        self.file_model.setFilter(QDir.AllEntries | QDir.NoDotAndDotDot)
-        self.file_model.setNameFilters(['*.md', '*.markdown', '*.prompt'])
+        # AllDirs keeps folders out of the name filters; the tree index decides which are listed
+        self.file_model.setFilter(QDir.AllEntries | QDir.AllDirs | QDir.NoDotAndDotDot)
+        self.file_model.setNameFilters(MARKDOWN_NAME_FILTERS)
         self.file_model.setNameFilterDisables(False)
-        
+        self.tree_index: Optional[MarkdownTreeIndex] = None
+        # Listed children per folder with their rows by path_key, dropped whenever the file model changes
+        self.children_cache: Dict[str, Tuple[List[str], Dict[str, int]]] = {}
+        # createIndex keeps no reference to the path it is given
+        self.path_refs: Dict[str, str] = {}
+        for signal in (self.file_model.rowsInserted, self.file_model.rowsRemoved,
+                       self.file_model.layoutChanged, self.file_model.modelReset):
+            signal.connect(self.on_file_model_changed)
+
+    def on_file_model_changed(self, *args) -> None:
+        """Relist after the file model loaded or lost entries, keeping the view's indexes on their paths"""
+        self.layoutAboutToBeChanged.emit()
+        self.children_cache.clear()
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes, [self.index_for_path(str(index.internalPointer() or '')) for index in old_indexes])
+        self.layoutChanged.emit()
+
+    @staticmethod
+    def path_key(path: str) -> str:
+        """The same key for a path in the file model's form, with forward slashes, and in the platform's form"""
+        return os.path.normcase(os.path.normpath(path))
+
+    def root_row(self, path: str) -> Optional[int]:
+        key = self.path_key(path)
+        for row, root in enumerate(self.root_paths):
+            if self.path_key(root) == key:
+                return row
+        return None
+
+    def set_tree_index(self, tree_index: Optional[MarkdownTreeIndex]) -> None:
+        """Hide the folders tree_index knows hold no markdown, or list everything again with None"""
+        self.beginResetModel()
+        self.tree_index = tree_index
+        self.children_cache.clear()
+        # A reset drops every index, so the paths they pointed at need no keeping
+        self.path_refs.clear()
+        self.endResetModel()
+
+    def children(self, parent_path: str) -> Tuple[List[str], Dict[str, int]]:
+        """Paths listed under parent_path and their rows, looked up by path_key"""
+        parent_key = self.path_key(parent_path)
+        cached = self.children_cache.get(parent_key)
+        if cached is not None:
+            return cached
+        paths: List[str] = []
+        parent_model_index = self.file_model.index(parent_path)
+        if parent_model_index.isValid():
+            for row in range(self.file_model.rowCount(parent_model_index)):
+                child_index = self.file_model.index(row, 0, parent_model_index)
+                path = self.file_model.filePath(child_index)
+                if self.tree_index is None or self.tree_index.accepts(path, self.file_model.isDir(child_index)):
+                    paths.append(self.path_refs.setdefault(path, path))
+        cached = (paths, {self.path_key(path): row for row, path in enumerate(paths)})
+        if parent_model_index.isValid():
+            self.children_cache[parent_key] = cached
+        return cached
+
     def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
         """Improved index handling for better file display"""
         if not self.hasIndex(row, column, parent):
@@ -210,19 +4440,11 @@ class MultiProjectModel(QAbstractItemModel):
         if not parent_path:
             return QModelIndex()
 
-        # Get the file system model's index for the parent path
-        parent_model_index = self.file_model.index(parent_path)
-        if not parent_model_index.isValid():
-            return QModelIndex()
-
-        # Get the child from the file system model
-        child_index = self.file_model.index(row, 0, parent_model_index)
-        if not child_index.isValid():
+        # Children come from the file system model, less the folders the tree index hides
+        paths, rows = self.children(parent_path)
+        if row >= len(paths):
             return QModelIndex()
-
-        # Get the full path of the child
-        child_path = self.file_model.filePath(child_index)
-        return self.createIndex(row, column, child_path)
+        return self.createIndex(row, column, paths[row])
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         """Improved row count handling"""
@@ -233,11 +4455,24 @@ class MultiProjectModel(QAbstractItemModel):
         if not path:
             return 0
 
-        # Get count from file system model
-        model_index = self.file_model.index(path)
-        if model_index.isValid():
-            return self.file_model.rowCount(model_index)
-        return 0
+        return len(self.children(path)[0])
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        """Folders not listed yet can be expanded, which makes the file model list them"""
+        if not parent.isValid():
+            return bool(self.root_paths)
+        model_index = self.file_model.index(str(parent.internalPointer() or ''))
+        if model_index.isValid() and self.file_model.canFetchMore(model_index):
+            return self.file_model.isDir(model_index)
+        return self.rowCount(parent) > 0
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        model_index = self.file_model.index(str(parent.internalPointer() or '')) if parent.isValid() else QModelIndex()
+        return model_index.isValid() and self.file_model.canFetchMore(model_index)
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        if parent.isValid():
+            self.file_model.fetchMore(self.file_model.index(str(parent.internalPointer() or '')))
 
     def parent(self, index: QModelIndex) -> QModelIndex:
         """Improved parent handling"""
@@ -249,14 +4484,14 @@ class MultiProjectModel(QAbstractItemModel):
             return QModelIndex()
 
         parent_path = os.path.dirname(path)
-        if parent_path in self.root_paths:
-            row = self.root_paths.index(parent_path)
-            return self.createIndex(row, 0, parent_path)
+        row = self.root_row(parent_path)
+        if row is not None:
+            return self.createIndex(row, 0, self.root_paths[row])
 
-        # Get parent from file system model
-        parent_model_index = self.file_model.index(parent_path)
-        if parent_model_index.isValid():
-            return self.createIndex(parent_model_index.row(), 0, parent_path)
+        paths, rows = self.children(os.path.dirname(parent_path))
+        row = rows.get(self.path_key(parent_path))
+        if row is not None:
+            return self.createIndex(row, 0, paths[row])
 
         return QModelIndex()
 
@@ -289,6 +4524,8 @@ class MultiProjectModel(QAbstractItemModel):
         self.beginResetModel()
         self.root_paths = []
         self.root_names = {}
+        self.children_cache.clear()
+        self.path_refs.clear()
         
         for project in projects:
             try:
@@ -303,6 +4540,18 @@ class MultiProjectModel(QAbstractItemModel):
         
         self.endResetModel()
 
+    def index_for_path(self, path: str) -> QModelIndex:
+        """Index of a path below one of the roots, invalid while its folder is not yet listed"""
+        path = self.normalize_path(path)
+        row = self.root_row(path)
+        if row is not None:
+            return self.createIndex(row, 0, self.root_paths[row])
+        paths, rows = self.children(os.path.dirname(path))
+        row = rows.get(self.path_key(path))
+        if row is None:
+            return QModelIndex()
+        return self.createIndex(row, 0, paths[row])
+
     def filePath(self, index: QModelIndex) -> str:
         """Get file path from index"""
         if not index.isValid():
@@ -316,28 +4565,99 @@ class MultiProjectModel(QAbstractItemModel):
             self.beginResetModel()
             self.root_paths = [path]
             self.root_names = {path: os.path.basename(path)}
+            self.children_cache.clear()
+            self.path_refs.clear()
             self.file_model.setRootPath(path)
             self.endResetModel()
-        return self.createIndex(0, 0, path)
+        row = self.root_paths.index(path)
+        return self.createIndex(row, 0, self.root_paths[row])
 
 class MarkdownEditor(QMainWindow):
+    # The preview finished showing a render, whether loaded whole or patched in place
+    previewUpdated = pyqtSignal()
+
     def __init__(self) -> None:
         super().__init__()
-        self.current_file: Optional[str] = None
-        self.copy_handler: CopyHandler = CopyHandler()
+        self.settings = EditorSettings()
+        # The native preview starts no browser process; web channel features are left out with it
+        self.web_preview = choose_preview_backend(self.settings.get('preview_backend')) == 'web'
+        self.current_tab: Optional[DocumentTab] = None
+        self.render_cache = RenderDiskCache(
+            max_bytes=int(self.settings.get('render_cache_max_mb')) * 1024 * 1024)
+        self.prefetcher = FilePrefetcher(self.render_cache, parent=self)
+        self.link_index = LinkIndex(self)
+        self.tree_index = MarkdownTreeIndex(self.settings.get('tree_ignore_globs'), self)
+        self.hover_prefetch_path = ''
+        self.hover_prefetch_timer: QTimer = QTimer(self)
+        self.hover_prefetch_timer.setSingleShot(True)
+        self.hover_prefetch_timer.timeout.connect(lambda: self.prefetcher.prefetch(self.hover_prefetch_path))
+        self.copy_handler: CopyHandler = CopyHandler(lambda index: self.block_renderer.block_text(index))
+        self.copy_handler.copied.connect(
+            lambda text: self.show_status_message(f'Copied {len(text)} characters to clipboard'))
+        self.exporter: Optional[BatchExporter] = None
         self.is_split_view: bool = False
         self.is_file_browser_visible: bool = True
-        self.projects: Dict[str, List[Dict[str, str]]] = self.load_projects()
+        self.project_store = ProjectStore(parent=self)
+        self.project_store.changed.connect(self.update_projects_list)
+        self.session = EditorSession()
+        self.prompt_templates = PromptTemplateCache()
+        self.render_worker = RenderWorker(int(self.settings.get('render_timeout_ms')), self)
+        self.render_worker.finished.connect(self.on_blocks_rendered)
+        self.render_worker.timedOut.connect(self.on_render_timeout)
+        self.render_worker.start()
+        self.statistics_report = StatisticsReport(self)
+        self.statistics_report.finished.connect(self.show_statistics_report)
+        self.prompt_variables: Optional[List[str]] = None
+        self.file_monitor = FileChangeMonitor(int(self.settings.get('file_poll_interval_ms')), self)
+        self.file_monitor.fileChanged.connect(self.on_file_changed_on_disk)
+        self.expanded_paths: set = set()
+        self.pending_expanded_paths: set = set()
+        self.pending_preview_scroll: Optional[float] = None
+        self.stale_preview: Optional[str] = None
+        self.preview_refresh_pending = False
+        # Blocks currently in the preview page, for patching it in place; None when unknown
+        self.preview_tab: Optional[DocumentTab] = None
+        self.preview_parts: Optional[List[str]] = None
+        self.preview_loading = False
+        self.memory_diagnostics = MemoryDiagnostics(int(self.settings.get('memory_diagnostics_renders')))
+        self.profiler = SamplingProfiler(self)
+        self.profiler.finished.connect(self.on_profile_saved)
+        self.book_view: Optional[BookView] = None
+        self.last_move: Optional[MoveRecord] = None
+        self.history = VersionHistory(keep_days=int(self.settings.get('history_keep_days')), parent=self)
+        # Retention and garbage collection wait until the session has settled
+        QTimer.singleShot(60000, self.history.maintain)
         self.autosave_timer: QTimer = QTimer()
         self.autosave_timer.timeout.connect(self.autosave)
         self.autosave_timer.start(30000) # Autosave every 30 seconds
         self.initUI()
         self.setup_shortcuts()
+        # Restore once the window is up, so the first paint is not delayed
+        QTimer.singleShot(0, self.restore_session)
+        if QApplication.instance() is not None:
+            QApplication.instance().aboutToQuit.connect(self.save_session)
+            QApplication.instance().aboutToQuit.connect(self.render_worker.stop)
+            QApplication.instance().aboutToQuit.connect(self.close_book)
+            QApplication.instance().aboutToQuit.connect(self.history.flush)
         
         self.statusBar().showMessage('Ready')
         self.status_timer: QTimer = QTimer()
         self.status_timer.timeout.connect(lambda: self.statusBar().clearMessage())
 
+    @property
+    def current_file(self) -> Optional[str]:
+        return self.current_tab.file_path if self.current_tab else None
+
+    @current_file.setter
+    def current_file(self, file_path: Optional[str]) -> None:
+        if self.current_tab:
+            self.current_tab.file_path = file_path
+            self.update_tab_title(self.current_tab)
+
+    @property
+    def block_renderer(self) -> BlockRenderer:
+        return self.current_tab.renderer
+
     def show_status_message(self, message: str, timeout: int = 2000) -> None:
         self.statusBar().showMessage(message)
         self.status_timer.start(timeout)
@@ -387,6 +4707,27 @@ class MarkdownEditor(QMainWindow):
         self.toggle_browser_shortcut = QShortcut(QKeySequence(KeyBindings.TOGGLE_FILE_BROWSER.value), self)
         self.toggle_browser_shortcut.activated.connect(self.toggle_file_browser)
 
+        # Toggle outline shortcut
+        self.toggle_outline_shortcut = QShortcut(QKeySequence(KeyBindings.TOGGLE_OUTLINE.value), self)
+        self.toggle_outline_shortcut.activated.connect(
+            lambda: self.outline_dock.setVisible(not self.outline_dock.isVisible()))
+
+        # Changes view shortcut, comparing the buffer with the saved file
+        self.changes_shortcut = QShortcut(QKeySequence(KeyBindings.SHOW_CHANGES.value), self)
+        self.changes_shortcut.activated.connect(self.toggle_changes_view)
+
+        # Version history shortcut
+        self.history_shortcut = QShortcut(QKeySequence(KeyBindings.SHOW_HISTORY.value), self)
+        self.history_shortcut.activated.connect(self.show_history)
+
+        # Profile recording shortcut; pressing it again stops early
+        self.profile_shortcut = QShortcut(QKeySequence(KeyBindings.RECORD_PROFILE.value), self)
+        self.profile_shortcut.activated.connect(self.toggle_profiler)
+
+        # Export menu shortcut
+        self.export_shortcut = QShortcut(QKeySequence(KeyBindings.EXPORT.value), self)
+        self.export_shortcut.activated.connect(lambda: self.export_btn.showMenu())
+
         # Cut, Copy, Paste shortcuts for the editor
         self.cut_shortcut = QShortcut(QKeySequence(KeyBindings.CUT.value), self)
         self.cut_shortcut.activated.connect(lambda: self.input_text.cut())
@@ -513,6 +4854,9 @@ class MarkdownEditor(QMainWindow):
             QSplitter::handle {{
                 background-color: {ColorTheme.ACCENT_TERTIARY};
             }}
+            QDockWidget {{
+                color: {ColorTheme.ACCENT_SECONDARY};
+            }}
             QScrollBar:vertical {{
                 background-color: {ColorTheme.SCROLLBAR_BG};
                 width: 12px;
@@ -590,13 +4934,39 @@ class MarkdownEditor(QMainWindow):
         toolbar_layout.addWidget(open_folder_btn)
 
         # Add project management button
-        project_btn = QToolButton()
-        project_btn.setText('Projects')
+        self.project_btn = QToolButton()
+        self.project_btn.setText('Projects')
         project_menu = QMenu()
-        project_btn.setMenu(project_menu)
-        project_btn.setPopupMode(QToolButton.InstantPopup)
+        project_menu.setToolTipsVisible(True)
+        self.project_btn.setMenu(project_menu)
+        self.project_btn.setPopupMode(QToolButton.InstantPopup)
         self.update_project_menu(project_menu)
-        toolbar_layout.addWidget(project_btn)
+        toolbar_layout.addWidget(self.project_btn)
+
+        # Add recent files button
+        self.recent_btn = QToolButton()
+        self.recent_btn.setText('Recent')
+        recent_menu = QMenu()
+        recent_menu.setToolTipsVisible(True)
+        recent_menu.aboutToShow.connect(lambda: self.update_recent_menu(self.recent_btn.menu()))
+        self.recent_btn.setMenu(recent_menu)
+        self.recent_btn.setPopupMode(QToolButton.InstantPopup)
+        toolbar_layout.addWidget(self.recent_btn)
+
+        # Add export button
+        self.export_btn = QToolButton()
+        self.export_btn.setText('Export')
+        export_menu = QMenu()
+        export_menu.addAction('Current File as HTML...').triggered.connect(
+            lambda: self.export_current_file(ExportFormat.HTML))
+        export_menu.addAction('Current File as PDF...').triggered.connect(
+            lambda: self.export_current_file(ExportFormat.PDF))
+        export_menu.addSeparator()
+        export_menu.addAction('Folder...').triggered.connect(self.export_folder)
+        export_menu.addAction('Project...').triggered.connect(self.export_project)
+        self.export_btn.setMenu(export_menu)
+        self.export_btn.setPopupMode(QToolButton.InstantPopup)
+        toolbar_layout.addWidget(self.export_btn)
 
         # Add toggle view button with shortcut
         self.toggle_view_btn = self.create_button('Edit Mode', KeyBindings.TOGGLE_EDIT_MODE.value, self.toggle_view)
@@ -636,22 +5006,37 @@ class MarkdownEditor(QMainWindow):
         # Create file browser
         self.file_browser = QTreeView()
         self.file_system_model = QFileSystemModel()  # Create separate file system model
-        self.file_system_model.setFilter(QDir.AllEntries | QDir.NoDotAndDotDot)
-        self.file_system_model.setNameFilters(['*.md', '*.markdown', '*.prompt'])
+        self.file_system_model.setFilter(QDir.AllEntries | QDir.AllDirs | QDir.NoDotAndDotDot)
+        self.file_system_model.setNameFilters(MARKDOWN_NAME_FILTERS)
         self.file_system_model.setNameFilterDisables(False)
+        # The view shows the file system model through the markdown-only filter
+        self.file_system_tree = MarkdownTreeFilter(self.file_system_model, self)
         
         self.project_model = MultiProjectModel(self)  # Rename for clarity
-        if self.projects.get("projects"):
-            self.project_model.load_projects(self.projects["projects"])
+        if self.project_store.projects():
+            self.project_model.load_projects(self.project_store.projects())
         
         # Start with project model
         self.file_browser.setModel(self.project_model)
         self.current_model = self.project_model  # Track current model
+        self.connect_browser_selection()
+        self.tree_index.changed.connect(self.apply_tree_filter)
+        self.apply_tree_filter()
+        self.rebuild_tree_index()
         
+        # Prefetch files the pointer rests on
+        self.file_browser.setMouseTracking(True)
+        self.file_browser.entered.connect(self.on_browser_item_hovered)
         self.file_browser.clicked.connect(self.file_selected)
         self.file_browser.doubleClicked.connect(self.file_selected)
+        # Folders open as a book from the context menu
+        self.file_browser.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.file_browser.customContextMenuRequested.connect(self.show_browser_menu)
         self.file_browser.expanded.connect(self.on_tree_expanded)
         self.file_browser.collapsed.connect(self.on_tree_collapsed)
+        # Expanding restored nodes has to wait for their parents to be listed
+        self.file_system_model.directoryLoaded.connect(self.expand_pending_paths)
+        self.project_model.file_model.directoryLoaded.connect(self.expand_pending_paths)
         self.file_browser.setColumnWidth(0, 200)
         self.file_browser.hideColumn(1)
         self.file_browser.hideColumn(2)
@@ -672,25 +5057,43 @@ class MarkdownEditor(QMainWindow):
         self.splitter = QSplitter(Qt.Horizontal)
         self.splitter.setHandleWidth(1)
 
+        self.preview_timer: QTimer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.update_preview)
+
         # Create input text area with editor font
         self.input_text = QTextEdit()
         self.input_text.setFont(FontStyle.EDITOR_MAIN.create_font())
-        self.input_text.textChanged.connect(self.update_preview)
+        self.input_text.textChanged.connect(self.schedule_preview)
         self.input_text.setVisible(False)  # Start in preview mode
 
         # Create preview area
-        self.preview_area = QWebEngineView()
-        settings = self.preview_area.settings()
-        settings.setAttribute(QWebEngineSettings.JavascriptEnabled, True)
-        settings.setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
-        settings.setAttribute(QWebEngineSettings.ErrorPageEnabled, True)
-        settings.setAttribute(QWebEngineSettings.PluginsEnabled, True)
+        if self.web_preview:
+            self.preview_area = QWebEngineView()
+            settings = self.preview_area.settings()
+            settings.setAttribute(QWebEngineSettings.JavascriptEnabled, True)
+            settings.setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
+            settings.setAttribute(QWebEngineSettings.ErrorPageEnabled, True)
+            settings.setAttribute(QWebEngineSettings.PluginsEnabled, True)
+        else:
+            self.preview_area = NativePreview()
+            self.preview_area.fileLinkActivated.connect(self.open_linked_file)
 
         # Add widgets to splitter
         self.splitter.addWidget(self.input_text)
         self.splitter.addWidget(self.preview_area)
         self.splitter.setSizes([0, self.width()])  # Start with preview only
 
+        # Create document tabs
+        self.tab_bar = QTabBar()
+        self.tab_bar.setTabsClosable(True)
+        self.tab_bar.setMovable(True)
+        self.tab_bar.setDocumentMode(True)
+        self.tab_bar.setExpanding(False)
+        self.tab_bar.currentChanged.connect(self.on_tab_changed)
+        self.tab_bar.tabCloseRequested.connect(self.close_tab)
+        editor_layout.addWidget(self.tab_bar)
+
         # Add splitter to editor layout
         editor_layout.addWidget(self.splitter)
         editor_container.setLayout(editor_layout)
@@ -704,13 +5107,106 @@ class MarkdownEditor(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
-        # Set up web channel
-        channel = QWebChannel()
-        channel.registerObject('copyHandler', self.copy_handler)
-        self.preview_area.page().setWebChannel(channel)
+        # Create outline panel
+        self.outline_tree = QTreeWidget()
+        self.outline_tree.setHeaderHidden(True)
+        self.outline_tree.setFont(FontStyle.FILE_BROWSER.create_font())
+        self.outline_tree.itemClicked.connect(self.outline_item_clicked)
+        self.outline_dock = QDockWidget('Outline', self)
+        self.outline_dock.setObjectName('outline-dock')
+        self.outline_dock.setWidget(self.outline_tree)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.outline_dock)
+        self.outline_timer: QTimer = QTimer(self)
+        self.outline_timer.setSingleShot(True)
+        self.outline_timer.timeout.connect(self.refresh_outline)
 
-        # Initial preview
-        self.update_preview()
+        # Create backlinks and broken link panels
+        self.backlinks_tree = QTreeWidget()
+        self.backlinks_tree.setHeaderHidden(True)
+        self.backlinks_tree.setFont(FontStyle.FILE_BROWSER.create_font())
+        self.backlinks_tree.itemClicked.connect(self.link_item_clicked)
+        self.backlinks_dock = QDockWidget('Backlinks', self)
+        self.backlinks_dock.setObjectName('backlinks-dock')
+        self.backlinks_dock.setWidget(self.backlinks_tree)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.backlinks_dock)
+        self.tabifyDockWidget(self.outline_dock, self.backlinks_dock)
+
+        self.broken_links_tree = QTreeWidget()
+        self.broken_links_tree.setHeaderHidden(True)
+        self.broken_links_tree.setFont(FontStyle.FILE_BROWSER.create_font())
+        self.broken_links_tree.itemClicked.connect(self.link_item_clicked)
+        self.broken_links_dock = QDockWidget('Broken Links', self)
+        self.broken_links_dock.setObjectName('broken-links-dock')
+        self.broken_links_dock.setWidget(self.broken_links_tree)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.broken_links_dock)
+        self.tabifyDockWidget(self.outline_dock, self.broken_links_dock)
+        self.broken_links_dock.hide()
+
+        # Create statistics panel
+        self.statistics_label = QLabel()
+        self.statistics_label.setFont(FontStyle.FILE_BROWSER.create_font())
+        self.statistics_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.statistics_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.statistics_label.setMargin(8)
+        self.statistics_dock = QDockWidget('Statistics', self)
+        self.statistics_dock.setObjectName('statistics-dock')
+        self.statistics_dock.setWidget(self.statistics_label)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.statistics_dock)
+        self.tabifyDockWidget(self.outline_dock, self.statistics_dock)
+        self.statistics_timer: QTimer = QTimer(self)
+        self.statistics_timer.setSingleShot(True)
+        self.statistics_timer.timeout.connect(self.refresh_statistics)
+
+        # Create prompt variables panel, shown for .prompt files
+        self.prompt_form_widget = QWidget()
+        self.prompt_form = QFormLayout(self.prompt_form_widget)
+        prompt_scroll = QScrollArea()
+        prompt_scroll.setWidgetResizable(True)
+        prompt_scroll.setWidget(self.prompt_form_widget)
+        self.prompt_dock = QDockWidget('Prompt Variables', self)
+        self.prompt_dock.setObjectName('prompt-variables-dock')
+        self.prompt_dock.setWidget(prompt_scroll)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.prompt_dock)
+        self.tabifyDockWidget(self.outline_dock, self.prompt_dock)
+        self.prompt_dock.hide()
+        self.prompt_timer: QTimer = QTimer(self)
+        self.prompt_timer.setSingleShot(True)
+        self.prompt_timer.timeout.connect(self.update_preview)
+        self.outline_dock.raise_()
+
+        self.links_timer: QTimer = QTimer(self)
+        self.links_timer.setSingleShot(True)
+        self.links_timer.timeout.connect(self.refresh_link_panels)
+        self.link_index.changed.connect(lambda: self.links_timer.start(200))
+        self.link_index.build_finished.connect(self.on_link_index_built)
+        QTimer.singleShot(3000, self.rebuild_link_index)
+
+        # Complete link targets after typing "]("
+        self.link_completer = QCompleter(self)
+        # Directory and link index version the completion model was last filled for
+        self.link_completion_source: Optional[Tuple[str, int]] = None
+        self.link_completer.setWidget(self.input_text)
+        self.link_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.link_completer.setFilterMode(Qt.MatchContains)
+        self.link_completer.setModel(QStringListModel(self.link_completer))
+        self.link_completer.activated[str].connect(self.insert_link_completion)
+        self.input_text.textChanged.connect(self.update_link_completion)
+
+        if self.web_preview:
+            # Serve local images relative to the current file as cached thumbnails
+            self.asset_handler = AssetSchemeHandler(self, disk_cache=ThumbnailDiskCache(
+                max_bytes=int(self.settings.get('thumbnail_cache_max_mb')) * 1024 * 1024))
+            QWebEngineProfile.defaultProfile().installUrlSchemeHandler(ASSET_SCHEME, self.asset_handler)
+
+            # Set up web channel, kept on the window so it outlives initUI
+            self.web_channel = QWebChannel(self)
+            self.web_channel.registerObject('copyHandler', self.copy_handler)
+            self.preview_area.page().setWebChannel(self.web_channel)
+            self.preview_area.loadStarted.connect(self.on_preview_load_started)
+            self.preview_area.loadFinished.connect(self.on_preview_loaded)
+
+        # Initial document and preview
+        self.open_document(None, '')
         self.update_toggle_button_state()
 
         # Apply fonts to UI elements
@@ -718,6 +5214,354 @@ class MarkdownEditor(QMainWindow):
         self.statusBar().setFont(FontStyle.STATUS_BAR.create_font())
         self.file_browser.setFont(FontStyle.FILE_BROWSER.create_font())
 
+    def document_tabs(self) -> List[DocumentTab]:
+        return [self.tab_bar.tabData(i) for i in range(self.tab_bar.count())]
+
+    def find_tab(self, file_path: str) -> int:
+        normalized = os.path.normcase(os.path.abspath(file_path))
+        for i, tab in enumerate(self.document_tabs()):
+            if tab.file_path and os.path.normcase(os.path.abspath(tab.file_path)) == normalized:
+                return i
+        return -1
+
+    def create_document(self, content: str) -> QTextDocument:
+        document = QTextDocument(self)
+        document.setDefaultFont(self.input_text.font())
+        document.setPlainText(content)
+        document.setModified(False)
+        # Without a layout Qt emits no contentsChange, and the indexer would miss edits to background tabs
+        document.documentLayout()
+        return document
+
+    def open_document(self, file_path: Optional[str], content: Optional[str] = None) -> DocumentTab:
+        """Open a file in a tab, switching to its existing tab if it is already open"""
+        if file_path:
+            index = self.find_tab(file_path)
+            if index >= 0:
+                self.tab_bar.setCurrentIndex(index)
+                return self.tab_bar.tabData(index)
+        prefetched = self.prefetcher.take(file_path) if file_path and content is None else None
+        if prefetched is not None:
+            content = prefetched.text
+        elif content is None:
+            content = read_text_file(file_path)
+        # An untouched empty tab is replaced rather than left behind
+        placeholder = self.current_tab
+        if placeholder is None or placeholder.file_path or not file_path or \
+                placeholder.document.isModified() or not placeholder.document.isEmpty():
+            placeholder = None
+        tab = DocumentTab(file_path, self.create_document(content))
+        if file_path:
+            self.project_store.record_opened(file_path)
+            self.session.add_recent(file_path)
+            self.file_monitor.watch(file_path)
+        if prefetched is not None:
+            for block_text, html_content in prefetched.blocks:
+                tab.renderer.store(block_text, html_content)
+        self.connect_tab_document(tab)
+        index = self.tab_bar.addTab(tab.title)
+        self.tab_bar.setTabData(index, tab)
+        self.tab_bar.setTabToolTip(index, file_path or '')
+        if self.tab_bar.currentIndex() == index:
+            # The first tab becomes current on insertion, before its data is set
+            self.on_tab_changed(index)
+        else:
+            self.tab_bar.setCurrentIndex(index)
+        if placeholder is not None:
+            self.close_tab(self.document_tabs().index(placeholder))
+        return tab
+
+    def connect_tab_document(self, tab: DocumentTab) -> None:
+        tab.document.modificationChanged.connect(lambda modified, t=tab: self.update_tab_title(t))
+        tab.indexer.headingsChanged.connect(
+            lambda t=tab: self.outline_timer.start(150) if t is self.current_tab else None)
+        tab.indexer.statisticsChanged.connect(
+            lambda t=tab: self.statistics_timer.start(100) if t is self.current_tab else None)
+
+    def update_tab_title(self, tab: DocumentTab) -> None:
+        for i in range(self.tab_bar.count()):
+            if self.tab_bar.tabData(i) is tab:
+                modified = tab.document is not None and tab.document.isModified()
+                self.tab_bar.setTabText(i, f'{tab.title}{" *" if modified else ""}')
+                self.tab_bar.setTabToolTip(i, tab.file_path or '')
+        if tab is self.current_tab:
+            self.setWindowTitle(f'Modern Markdown Editor - {tab.title}')
+
+    def on_tab_changed(self, index: int) -> None:
+        tab = self.tab_bar.tabData(index) if index >= 0 else None
+        if tab is None or tab is self.current_tab:
+            return
+        if self.current_tab is not None:
+            self.current_tab.cursor_position = self.input_text.textCursor().position()
+            self.current_tab.scroll_position = self.input_text.verticalScrollBar().value()
+            self.current_tab.last_used = time.monotonic()
+            if not self.current_tab.rendered_html and self.preview_tab is self.current_tab and \
+                    self.preview_parts is not None:
+                self.current_tab.rendered_html = build_html_document('\n'.join(self.preview_parts))
+
+        if tab.document is None:
+            try:
+                self.file_monitor.mark_current(tab.file_path)
+                tab.set_document(self.create_document(read_text_file(tab.file_path)))
+            except Exception as e:
+                QMessageBox.critical(self, "Error", str(e))
+                tab.set_document(self.create_document(''))
+            self.connect_tab_document(tab)
+        tab.restore_cache()
+        tab.last_used = time.monotonic()
+        self.current_tab = tab
+
+        self.input_text.blockSignals(True)
+        self.input_text.setDocument(tab.document)
+        self.input_text.blockSignals(False)
+        cursor = self.input_text.textCursor()
+        cursor.setPosition(min(tab.cursor_position, tab.document.characterCount() - 1))
+        self.input_text.setTextCursor(cursor)
+        # The scroll range is only known once the editor has laid out the document
+        QTimer.singleShot(0, lambda t=tab: self.input_text.verticalScrollBar().setValue(t.scroll_position)
+                          if t is self.current_tab else None)
+        self.update_tab_title(tab)
+
+        if tab.rendered_html:
+            self.show_preview_html(tab.rendered_html)
+        else:
+            self.update_preview()
+        self.refresh_outline()
+        self.refresh_backlinks()
+        self.refresh_prompt_panel()
+        self.refresh_statistics()
+        self.enforce_tab_memory_budget()
+
+    def refresh_outline(self) -> None:
+        """Rebuild the outline panel from the current tab's heading index"""
+        self.outline_tree.clear()
+        if self.current_tab is None or self.current_tab.indexer is None:
+            return
+        outline = self.current_tab.indexer.outline()
+        anchors = heading_anchors([title for _, _, title in outline])
+        parents: List[Tuple[int, Any]] = []
+        for (position, level, title), anchor in zip(outline, anchors):
+            while parents and parents[-1][0] >= level:
+                parents.pop()
+            item = QTreeWidgetItem([title or '(untitled)'])
+            item.setData(0, Qt.UserRole, position)
+            item.setData(0, Qt.UserRole + 1, anchor)
+            if parents:
+                parents[-1][1].addChild(item)
+            else:
+                self.outline_tree.addTopLevelItem(item)
+            parents.append((level, item))
+        self.outline_tree.expandAll()
+
+    def outline_item_clicked(self, item: QTreeWidgetItem, column: int) -> None:
+        """Jump to a heading in both the editor and the preview"""
+        position = item.data(0, Qt.UserRole)
+        anchor = item.data(0, Qt.UserRole + 1)
+        cursor = self.input_text.textCursor()
+        cursor.setPosition(min(position, self.input_text.document().characterCount() - 1))
+        self.input_text.setTextCursor(cursor)
+        self.input_text.ensureCursorVisible()
+        if not self.web_preview:
+            self.preview_area.scrollToAnchor(anchor)
+            return
+        self.preview_area.page().runJavaScript(
+            f"var heading = document.getElementById({json.dumps(anchor)});"
+            f"if (heading) {{ heading.scrollIntoView(); }}"
+        )
+
+    def project_roots(self) -> List[str]:
+        return self.project_store.roots()
+
+    def rebuild_link_index(self) -> None:
+        self.link_index.build(self.project_roots())
+
+    def check_links(self) -> None:
+        """Rebuild the link index of all projects and show the broken link report"""
+        self.broken_links_dock.show()
+        self.broken_links_dock.raise_()
+        self.show_status_message('Checking links...', 10000)
+        self.rebuild_link_index()
+
+    def refresh_statistics(self) -> None:
+        """Show the current document's counts, kept up to date per block by its indexer"""
+        if self.current_tab is None or self.current_tab.indexer is None:
+            self.statistics_label.clear()
+            return
+        statistics = self.current_tab.indexer.statistics()
+        self.statistics_label.setText(
+            f"Words: {statistics['words']:,}\n"
+            f"Characters: {statistics['characters']:,}\n"
+            f"Lines: {statistics['lines']:,}\n"
+            f"Tokens (approx.): {statistics['tokens']:,}"
+        )
+
+    def build_statistics_report(self) -> None:
+        roots = self.project_roots()
+        if not roots:
+            QMessageBox.warning(self, "Warning", "No projects configured")
+            return
+        self.show_status_message('Counting prompt files...', 10000)
+        self.statistics_report.build(roots)
+
+    def show_statistics_report(self, rows: List[Tuple[str, int, int, int]], elapsed: float) -> None:
+        self.show_status_message(f'Counted {len(rows)} prompt file(s) in {elapsed:.1f}s', 5000)
+        dialog = QDialog(self)
+        dialog.setWindowTitle('Prompt Statistics')
+        dialog.resize(700, 500)
+        layout = QVBoxLayout(dialog)
+        totals = [sum(row[i] for row in rows) for i in (1, 2, 3)]
+        layout.addWidget(QLabel(
+            f'{len(rows)} prompt files: {totals[0]:,} words, {totals[1]:,} characters, '
+            f'~{totals[2]:,} tokens'))
+        tree = QTreeWidget()
+        tree.setHeaderLabels(['File', 'Words', 'Characters', 'Tokens'])
+        tree.setRootIsDecorated(False)
+        for path, words, characters, tokens in rows:
+            item = QTreeWidgetItem([path, '', '', ''])
+            for column, value in enumerate((words, characters, tokens), 1):
+                # Sort numerically
+                item.setData(column, Qt.DisplayRole, value)
+            item.setData(0, Qt.UserRole, (path, 0))
+            tree.addTopLevelItem(item)
+        tree.setSortingEnabled(True)
+        tree.sortByColumn(3, Qt.DescendingOrder)
+        tree.resizeColumnToContents(0)
+        tree.itemDoubleClicked.connect(self.link_item_clicked)
+        layout.addWidget(tree)
+        dialog.show()
+
+    def on_link_index_built(self, elapsed: float) -> None:
+        for root in self.link_index.roots:
+            prefix = normalize_link_path(root) + os.sep
+            markdown_files = [key for key in self.link_index.links if key.startswith(prefix)]
+            link_count = sum(len(self.link_index.links[key]) for key in markdown_files)
+            self.project_store.update_index_state(root, len(markdown_files), link_count, elapsed)
+        if self.broken_links_dock.isVisible():
+            broken = self.link_index.broken_links()
+            files = len({link.source for link in broken})
+            self.show_status_message(
+                f'{len(broken)} broken link(s) in {files} file(s), checked in {elapsed:.1f}s', 5000)
+
+    def refresh_link_panels(self) -> None:
+        self.refresh_backlinks()
+        if self.broken_links_dock.isVisible():
+            self.refresh_broken_links()
+
+    def refresh_backlinks(self) -> None:
+        self.backlinks_tree.clear()
+        if not self.current_file:
+            return
+        for link in self.link_index.backlinks(self.current_file):
+            item = QTreeWidgetItem([f'{os.path.basename(link.source)}:{link.line + 1}  {link.raw}'])
+            item.setToolTip(0, link.source)
+            item.setData(0, Qt.UserRole, (link.source, link.line))
+            self.backlinks_tree.addTopLevelItem(item)
+
+    def refresh_broken_links(self) -> None:
+        self.broken_links_tree.clear()
+        parents: Dict[str, QTreeWidgetItem] = {}
+        for link in self.link_index.broken_links():
+            parent = parents.get(link.source)
+            if parent is None:
+                parent = QTreeWidgetItem([os.path.basename(link.source)])
+                parent.setToolTip(0, link.source)
+                parent.setData(0, Qt.UserRole, (link.source, 0))
+                parents[link.source] = parent
+                self.broken_links_tree.addTopLevelItem(parent)
+            item = QTreeWidgetItem([f'{link.line + 1}: {link.raw}'])
+            item.setData(0, Qt.UserRole, (link.source, link.line))
+            parent.addChild(item)
+        self.broken_links_tree.expandAll()
+
+    def link_item_clicked(self, item: QTreeWidgetItem, column: int) -> None:
+        location = item.data(0, Qt.UserRole)
+        if not location:
+            return
+        file_path, line = location
+        try:
+            self.open_document(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
+        self.go_to_line(line)
+
+    def go_to_line(self, line: int) -> None:
+        block = self.input_text.document().findBlockByNumber(line)
+        if block.isValid():
+            cursor = self.input_text.textCursor()
+            cursor.setPosition(block.position())
+            self.input_text.setTextCursor(cursor)
+            self.input_text.ensureCursorVisible()
+
+    def update_link_completion(self) -> None:
+        """Offer indexed files as link targets while a link destination is being typed"""
+        cursor = self.input_text.textCursor()
+        before_cursor = cursor.block().text()[:cursor.positionInBlock()]
+        match = LINK_COMPLETION_PATTERN.search(before_cursor)
+        popup = self.link_completer.popup()
+        if not match or not self.current_file:
+            popup.hide()
+            return
+        directory = os.path.dirname(self.current_file)
+        targets = self.link_index.link_targets(directory)
+        prefix = match.group(1)
+        if not targets or prefix in targets:
+            popup.hide()
+            return
+        # Refill the model only when the targets changed, not on every keystroke
+        source = (directory, self.link_index.version)
+        if self.link_completion_source != source:
+            self.link_completer.model().setStringList(targets)
+            self.link_completion_source = source
+        self.link_completer.setCompletionPrefix(prefix)
+        rect = self.input_text.cursorRect()
+        rect.setWidth(400)
+        self.link_completer.complete(rect)
+
+    def insert_link_completion(self, target: str) -> None:
+        cursor = self.input_text.textCursor()
+        cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, len(self.link_completer.completionPrefix()))
+        cursor.insertText(target)
+        self.input_text.setTextCursor(cursor)
+
+    def close_tab(self, index: int) -> None:
+        tab = self.tab_bar.tabData(index)
+        if tab.document is not None and tab.document.isModified():
+            reply = QMessageBox.question(self, 'Save Changes?',
+                f'Do you want to save changes to {tab.title}?',
+                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Save:
+                self.tab_bar.setCurrentIndex(index)
+                self.save_file()
+                if tab.document.isModified():
+                    return
+        if self.tab_bar.count() == 1:
+            # Always keep one document open
+            self.open_document(None, '')
+            index = self.tab_bar.count() - 2
+        if tab is self.current_tab:
+            self.tab_bar.setCurrentIndex(index + 1 if index + 1 < self.tab_bar.count() else index - 1)
+        self.tab_bar.removeTab(index)
+        if tab.file_path and self.find_tab(tab.file_path) < 0:
+            self.file_monitor.unwatch(tab.file_path)
+        tab.discard_spill()
+        if tab.document is not None:
+            tab.document.deleteLater()
+
+    def enforce_tab_memory_budget(self) -> None:
+        """Evict the least recently used inactive tabs until the global budget is met"""
+        budget = int(self.settings.get('tab_memory_budget_mb')) * 1024 * 1024
+        drop_documents = bool(self.settings.get('tab_evict_documents'))
+        tabs = self.document_tabs()
+        total = sum(tab.memory_usage() for tab in tabs)
+        for tab in sorted(tabs, key=lambda t: t.last_used):
+            if total <= budget:
+                break
+            if tab is not self.current_tab:
+                total -= tab.evict(drop_documents)
+
     def update_toggle_button_state(self):
         if self.is_split_view:
             self.toggle_view_btn.setText('Preview Only')
@@ -728,48 +5572,46 @@ class MarkdownEditor(QMainWindow):
             self.input_text.setVisible(False)
             self.splitter.setSizes([0, self.width()])
 
-    def load_projects(self) -> Dict[str, List[Dict[str, str]]]:
-        try:
-            with open('projects.json', 'r') as f:
-                data = json.load(f)
-                if not isinstance(data, dict) or "projects" not in data:
-                    return {"projects": []}
-                return data
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Create default projects.json
-            default_projects = {
-                "projects": [
-                    {
-                        "name": "Documents",
-                        "path": os.path.expanduser("~/Documents")
-                    }
-                ]
-            }
-            with open('projects.json', 'w') as f:
-                json.dump(default_projects, f, indent=4)
-            return default_projects
-
-    def save_projects(self) -> None:
-        with open('projects.json', 'w') as f:
-            json.dump(self.projects, f, indent=4)
-
     def update_project_menu(self, menu: QMenu) -> None:
         menu.clear()
         add_project_action = menu.addAction('Add Current Folder as Project')
         add_project_action.triggered.connect(self.add_project)
-        if self.projects["projects"]:
+        check_links_action = menu.addAction('Check Links')
+        check_links_action.triggered.connect(self.check_links)
+        statistics_action = menu.addAction('Prompt Statistics')
+        statistics_action.triggered.connect(self.build_statistics_report)
+        if self.project_store.projects():
             menu.addSeparator()
-            for project in self.projects["projects"]:
+            for project in self.project_store.projects():
                 project_action = menu.addAction(project["name"])
+                file_count = project["snapshot"]["file_count"]
+                if file_count is not None:
+                    project_action.setToolTip(f'{project["path"]} ({file_count} Markdown files)')
                 project_action.triggered.connect(
                     lambda checked, path=project["path"]: self.open_project(path)
                 )
+                recent_files = project["snapshot"]["recent_files"]
+                if recent_files:
+                    recent_menu = menu.addMenu(f"Recent in {project['name']}")
+                    for file_path in recent_files:
+                        recent_action = recent_menu.addAction(os.path.basename(file_path))
+                        recent_action.setToolTip(file_path)
+                        recent_action.triggered.connect(
+                            lambda checked, path=file_path: self.open_recent_file(path)
+                        )
                 remove_action = menu.addAction(f"Remove {project['name']}")
                 remove_action.triggered.connect(
                     lambda checked, name=project["name"]: self.remove_project(name)
                 )
                 menu.addSeparator()
 
+    def open_recent_file(self, file_path: str) -> None:
+        try:
+            self.open_document(file_path)
+            self.show_status_message(f'Opened {os.path.basename(file_path)}')
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
+
     def add_project(self):
         if not self.file_model.rootPath():
             QMessageBox.warning(self, "Warning", "Please open a folder first")
@@ -780,19 +5622,14 @@ class MarkdownEditor(QMainWindow):
         )
         if ok and name:
             current_path = self.file_model.rootPath()
-            self.projects["projects"].append({
-                "name": name,
-                "path": current_path
-            })
-            self.save_projects()
-            self.update_project_menu(self.findChild(QToolButton).menu())
+            self.project_store.add(name, current_path)
+            self.rebuild_link_index()
+            self.rebuild_tree_index()
 
     def remove_project(self, project_name):
-        self.projects["projects"] = [
-            p for p in self.projects["projects"] if p["name"] != project_name
-        ]
-        self.save_projects()
-        self.update_project_menu(self.findChild(QToolButton).menu())
+        self.project_store.remove(project_name)
+        self.rebuild_link_index()
+        self.rebuild_tree_index()
 
     def open_project(self, path: str) -> None:
         """Open a project directory with improved path handling"""
@@ -804,11 +5641,14 @@ class MarkdownEditor(QMainWindow):
                 return
 
             # Switch to file system model for project contents
-            self.file_browser.setModel(self.file_system_model)
-            self.current_model = self.file_system_model
+            self.file_browser.setModel(self.file_system_tree)
+            self.current_model = self.file_system_tree
+            self.connect_browser_selection()
+            # The filter lists the new root at once and its folders when the index is rebuilt
+            self.rebuild_tree_index(path)
             
             # Set root path
-            root_index = self.file_system_model.setRootPath(path)
+            root_index = self.file_system_tree.setRootPath(path)
             if not root_index.isValid():
                 raise Exception("Failed to set root path in model")
 
@@ -823,230 +5663,73 @@ class MarkdownEditor(QMainWindow):
             QMessageBox.critical(self, "Error", f"Could not open project: {str(e)}")
 
     def autosave(self):
-        if self.current_file and os.path.exists(self.current_file):
+        for tab in self.document_tabs():
+            if not tab.file_path or tab.document is None or not tab.document.isModified():
+                continue
+            if not os.path.exists(tab.file_path):
+                continue
+            if self.file_monitor.is_changed(tab.file_path):
+                # Never overwrite a change made by another program without asking
+                self.file_monitor.check(tab.file_path)
+                continue
             try:
-                with open(self.current_file, 'w', encoding='utf-8') as file:
-                    file.write(self.input_text.toPlainText())
+                text = tab.document.toPlainText()
+                self.history.snapshot_original(tab.file_path)
+                with open(tab.file_path, 'w', encoding='utf-8') as file:
+                    file.write(text)
+                self.file_monitor.mark_current(tab.file_path)
+                tab.document.setModified(False)
+                self.history.snapshot(tab.file_path, text)
+                self.link_index.update_file(tab.file_path, text)
             except Exception as e:
                 print(f"Autosave failed: {str(e)}")
+        self.save_session()
 
     def update_preview(self):
         """Improved markdown preview with better code block handling"""
         preview_style = FontStyle.PREVIEW_BODY.value  # Define this first for error handling
-        code_style = FontStyle.PREVIEW_CODE.value  # Keep code font separate
-        h1_style = FontStyle.EDITOR_HEADING1.value  # Restore heading styles
-        h2_style = FontStyle.EDITOR_HEADING2.value
         try:
             markdown_text = self.input_text.toPlainText()
-            
-            # Pre-process code blocks to prevent markdown2 from failing
-            code_block_pattern = r'```(.*?)\n(.*?)```'
-            
-            def code_block_replacer(match):
-                header = match.group(1) or ''
-                code = match.group(2) or ''
-                
-                # Handle empty code blocks
-                if not code.strip():
-                    return '```\n \n```'  # Add a space to prevent parser errors
-                
-                # Process code block content
-                lines = code.split('\n')
-                # Remove empty lines at start and end
-                while lines and not lines[0].strip():
-                    lines.pop(0)
-                while lines and not lines[-1].strip():
-                    lines.pop()
-                
-                if not lines:  # If all lines were empty
-                    return '```\n \n```'
-                
-                # Ensure consistent indentation
-                min_indent = float('inf')
-                for line in lines:
-                    if line.strip():  # Only check non-empty lines
-                        indent = len(line) - len(line.lstrip())
-                        min_indent = min(min_indent, indent)
-                
-                if min_indent == float('inf'):
-                    min_indent = 0
-                
-                # Remove common indentation and ensure at least 4 spaces
-                processed_lines = []
-                for line in lines:
-                    if line.strip():  # Keep empty lines as-is
-                        line = line[min_indent:]
-                    processed_lines.append('    ' + line)
-                
-                # Reconstruct the code block
-                processed_code = '\n'.join(processed_lines)
-                return f'```{header}\n{processed_code}\n```'
-            
-            # Pre-process code blocks
-            processed_text = re.sub(code_block_pattern, code_block_replacer, markdown_text, flags=re.DOTALL)
-            
-            # Convert markdown to HTML with fallback
-            try:
-                html_content = markdown2.markdown(
-                    processed_text,
-                    extras=[
-                        'fenced-code-blocks',
-                        'tables',
-                        'code-friendly',
-                        'break-on-newline',
-                        'cuddled-lists',
-                        'markdown-in-html'
-                    ]
-                )
-            except Exception as md_error:
-                # Fallback to simpler conversion if full conversion fails
-                try:
-                    html_content = markdown2.markdown(
-                        processed_text,
-                        extras=['code-friendly']
-                    )
-                except:
-                    raise Exception(f"Markdown conversion failed: {str(md_error)}")
-
-            # Rest of your existing HTML template code...
-            full_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <script type="text/javascript" src="qrc:///qtwebchannel/qwebchannel.js"></script>
-                <style>
-                    body {{
-                        font-family: {preview_style['family']};
-                        font-size: {preview_style['size']}pt;
-                        font-weight: {preview_style['weight']};
-                        line-height: 1.6;
-                        padding: 20px;
-                        color: #333;
-                        max-width: 900px;
-                        margin: 0 auto;
-                    }}
-                    pre, code {{
-                        font-family: {code_style['family']};
-                        font-size: {code_style['size']}pt;
-                        font-weight: {code_style['weight']};
-                        background-color: #f6f8fa;
-                        border-radius: 3px;
-                    }}
-                    pre {{
-                        padding: 16px;
-                        overflow-x: auto;
-                        white-space: pre-wrap;
-                        word-wrap: break-word;
-                        margin: 1em 0;
-                    }}
-                    code {{
-                        padding: 2px 4px;
-                    }}
-                    h1 {{
-                        font-family: {h1_style['family']};
-                        font-size: {h1_style['size']}pt;
-                        font-weight: {h1_style['weight']};
-                        border-bottom: 2px solid #eaecef;
-                        padding-bottom: 0.3em;
-                        margin-top: 1.5em;
-                        margin-bottom: 1em;
-                        color: #24292e;
-                    }}
-                    h2 {{
-                        font-family: {h2_style['family']};
-                        font-size: {h2_style['size']}pt;
-                        font-weight: {h2_style['weight']};
-                        border-bottom: 1px solid #eaecef;
-                        padding-bottom: 0.3em;
-                        margin-top: 1.5em;
-                        margin-bottom: 1em;
-                        color: #24292e;
-                    }}
-                    h3 {{
-                        font-family: {h2_style['family']};
-                        font-size: {int(h2_style['size'] * 0.8)}pt;
-                        font-weight: {h2_style['weight']};
-                        margin-top: 1.2em;
-                        margin-bottom: 0.8em;
-                        color: #24292e;
-                    }}
-                    h4 {{
-                        font-family: {h2_style['family']};
-                        font-size: {int(h2_style['size'] * 0.7)}pt;
-                        font-weight: {h2_style['weight']};
-                        margin-top: 1.2em;
-                        margin-bottom: 0.8em;
-                        color: #24292e;
-                    }}
-                    blockquote {{
-                        font-family: {preview_style['family']};
-                        font-size: {preview_style['size']}pt;
-                        font-style: italic;
-                        padding: 0 1em;
-                        border-left: 0.25em solid #dfe2e5;
-                        margin: 1em 0;
-                        color: #6a737d;
-                    }}
-                    table {{
-                        border-collapse: collapse;
-                        width: 100%;
-                        margin: 1em 0;
-                    }}
-                    th, td {{
-                        border: 1px solid #dfe2e5;
-                        padding: 6px 13px;
-                    }}
-                    th {{
-                        background-color: #f6f8fa;
-                        font-weight: 600;
-                    }}
-                    tr:nth-child(even) {{
-                        background-color: #f6f8fa;
-                    }}
-                    ul, ol {{
-                        padding-left: 2em;
-                        margin: 1em 0;
-                    }}
-                    li {{
-                        margin: 0.5em 0;
-                    }}
-                    hr {{
-                        height: 2px;
-                        background-color: #e1e4e8;
-                        border: none;
-                        margin: 2em 0;
-                    }}
-                    a {{
-                        color: #0366d6;
-                        text-decoration: none;
-                    }}
-                    a:hover {{
-                        text-decoration: underline;
-                    }}
-                    img {{
-                        max-width: 100%;
-                        height: auto;
-                    }}
-                    .language-diff {{
-                        color: #24292e;
-                    }}
-                    .language-diff .deletion {{
-                        background-color: #ffeef0;
-                        color: #b31d28;
-                    }}
-                    .language-diff .addition {{
-                        background-color: #e6ffed;
-                        color: #22863a;
-                    }}
-                </style>
-            </head>
-            <body>
-                {html_content}
-            </body>
-            </html>
-            """
-            self.preview_area.setHtml(full_html)
+            if self.current_tab.diff_base is not None:
+                self.show_changes(markdown_text)
+                return
+            if is_prompt_file(self.current_file):
+                template = self.prompt_templates.get(markdown_text, os.path.dirname(os.path.abspath(self.current_file)))
+                self.update_prompt_panel(template)
+                markdown_text = template.render(self.current_tab.prompt_values)
+            html_content = None
+            # A document matching its file on disk may have been rendered in an earlier session
+            cacheable = self.current_file is not None and not self.input_text.document().isModified()
+            if cacheable:
+                html_content = self.render_cache.get(markdown_text)
+            if html_content is None and self.stale_preview is not None:
+                # Show the last session's preview now and render the changed file right after
+                full_html = build_html_document(self.stale_preview)
+                self.stale_preview = None
+                self.current_tab.rendered_html = full_html
+                self.show_preview_html(full_html)
+                self.preview_refresh_pending = True
+                QTimer.singleShot(200, self.update_preview)
+                return
+            self.stale_preview = None
+            self.preview_refresh_pending = False
+            if html_content is None:
+                missing = self.block_renderer.missing_blocks(markdown_text)
+                if missing:
+                    # Convert off the GUI thread; the preview updates when the blocks arrive
+                    self.render_worker.render(self.block_renderer, missing)
+                    return
+                self.block_renderer.render_parts(markdown_text, self.current_tab.indexer.anchors())
+                if cacheable and RENDER_TIMEOUT_CLASS not in self.block_renderer.rendered_body:
+                    self.render_cache.put(markdown_text, self.block_renderer.rendered_body)
+            else:
+                self.block_renderer.set_source(markdown_text, html_content)
+            parts = self.block_renderer.rendered_parts
+            if parts is not None and self.patch_preview(parts):
+                return
+            full_html = build_html_document(self.block_renderer.rendered_body)
+            self.current_tab.rendered_html = full_html
+            self.show_preview_html(full_html, parts)
             
         except Exception as e:
             error_html = f"""
@@ -1057,9 +5740,267 @@ class MarkdownEditor(QMainWindow):
             </body>
             </html>
             """
+            self.preview_parts = None
             self.preview_area.setHtml(error_html)
             print(f"Preview error: {str(e)}")
 
+    def toggle_changes_view(self) -> None:
+        """Switch the preview between the rendered document and its changes since it was saved"""
+        tab = self.current_tab
+        if tab.diff_base is not None:
+            tab.diff_base = None
+            self.show_status_message('Showing preview')
+        elif not self.current_file or not os.path.exists(self.current_file):
+            self.show_status_message('No saved version to compare with')
+            return
+        else:
+            tab.diff_base = DiffBase('the saved file', self.current_file, None, '', [])
+            self.show_status_message(f'Showing changes ({KeyBindings.SHOW_CHANGES.value} to return to the preview)')
+        self.update_preview()
+
+    def show_changes(self, markdown_text: str) -> None:
+        tab = self.current_tab
+        base = tab.diff_base
+        if base.file_path is not None:
+            # Saving or an outside change moves the saved version on
+            stat = FileChangeMonitor.stat(self.current_file) if self.current_file else None
+            if base.file_path != self.current_file or stat != base.stat:
+                try:
+                    text = read_text_file(self.current_file)
+                except Exception as e:
+                    tab.diff_base = None
+                    self.show_status_message(f'Could not read the saved version: {str(e)}', 5000)
+                    self.update_preview()
+                    return
+                base = tab.diff_base = DiffBase(base.label, self.current_file, stat, text, split_markdown_blocks(text))
+        missing = block_diff_missing(tab.renderer, base, markdown_text)
+        if missing:
+            # Converted by the render worker like any preview; the changes show when the blocks arrive
+            self.render_worker.render(tab.renderer, missing)
+            return
+        body, _ = render_block_diff(tab.renderer, base, markdown_text)
+        full_html = build_html_document(body)
+        # Switching back to this tab rebuilds the changes from the current text
+        tab.rendered_html = ''
+        self.show_preview_html(full_html)
+
+    def show_history(self) -> None:
+        """Browse the saved versions of the current file, previewing the changes since each, and restore one"""
+        tab = self.current_tab
+        versions = self.history.versions(self.current_file) if self.current_file else []
+        if not versions:
+            self.show_status_message('No saved versions of this file yet')
+            return
+        versions.reverse()
+        previous_base = tab.diff_base
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f'History of {tab.title}')
+        dialog.resize(420, 500)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f'{len(versions)} saved versions. Select one to preview the changes since.'))
+        tree = QTreeWidget()
+        tree.setHeaderLabels(['Saved', 'Characters'])
+        tree.setRootIsDecorated(False)
+        for index, version in enumerate(versions):
+            item = QTreeWidgetItem([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(version.time)), f'{version.size:,}'])
+            item.setData(0, Qt.UserRole, index)
+            tree.addTopLevelItem(item)
+        tree.resizeColumnToContents(0)
+        layout.addWidget(tree)
+        buttons = QHBoxLayout()
+        restore_btn = QPushButton('Restore')
+        restore_btn.setEnabled(False)
+        close_btn = QPushButton('Close')
+        buttons.addStretch(1)
+        buttons.addWidget(restore_btn)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        def preview_version(item: Optional[QTreeWidgetItem], previous: Optional[QTreeWidgetItem]) -> None:
+            if item is None:
+                return
+            try:
+                text = self.history.read_version(versions[item.data(0, Qt.UserRole)])
+            except (OSError, ValueError, zlib.error) as e:
+                restore_btn.setEnabled(False)
+                self.show_status_message(f'Could not read this version: {str(e)}', 5000)
+                return
+            tab.diff_base = DiffBase(f'the version saved {item.text(0)}', None, None, text, split_markdown_blocks(text))
+            restore_btn.setEnabled(True)
+            self.update_preview()
+
+        def restore_version() -> None:
+            label = tab.diff_base.label
+            # One edit block, so the restore is a single undo step
+            apply_text_diff(tab.document, tab.diff_base.text)
+            dialog.accept()
+            self.show_status_message(f'Restored {label} ({KeyBindings.UNDO.value} to undo)', 5000)
+
+        def close_history() -> None:
+            tab.diff_base = previous_base if dialog.result() != QDialog.Accepted else None
+            if tab is self.current_tab:
+                self.update_preview()
+
+        tree.currentItemChanged.connect(preview_version)
+        restore_btn.clicked.connect(restore_version)
+        close_btn.clicked.connect(dialog.reject)
+        dialog.finished.connect(close_history)
+        dialog.open()
+
+    def schedule_preview(self) -> None:
+        """Let the editor repaint before the preview catches up; long documents wait for a pause in typing"""
+        lines = self.input_text.document().blockCount()
+        self.preview_timer.start(min(PREVIEW_DELAY_LIMIT_MS, lines // PREVIEW_DELAY_LINES_PER_MS))
+
+    def patch_preview(self, parts: List[str]) -> bool:
+        """Replace only the changed blocks of the loaded preview; False when it has to be loaded whole"""
+        if not self.web_preview or self.preview_tab is not self.current_tab or \
+                self.preview_parts is None or self.preview_loading:
+            return False
+        old_parts = self.preview_parts
+        start, old_end, new_end = changed_blocks(old_parts, parts)
+        # Blocks after the change that only moved keep their HTML but need new numbers
+        moved = new_end < len(parts) and parts[new_end] != old_parts[old_end]
+        lines = [
+            f'{block.first_line + 1}-{block.last_line + 1}' for block in self.block_renderer.blocks[start:]
+        ] if moved else []
+        if start < max(old_end, new_end) or lines:
+            changed_html = '\n'.join(parts[start:new_end])
+            self.preview_area.page().runJavaScript(
+                f'mdPatch({start}, {old_end - start}, {json.dumps(changed_html)}, {json.dumps(lines)});',
+                lambda result: self.previewUpdated.emit()
+            )
+        else:
+            self.previewUpdated.emit()
+        self.preview_parts = parts
+        # The page is rebuilt from the blocks if the tab is left and shown again
+        self.current_tab.rendered_html = ''
+        self.record_preview_update()
+        return True
+
+    def record_preview_update(self) -> None:
+        if self.memory_diagnostics.interval > 0:
+            render_pid = self.preview_area.page().renderProcessPid() if self.web_preview else 0
+            self.memory_diagnostics.record_render(self, render_pid)
+
+    def on_blocks_rendered(self, renderer: BlockRenderer) -> None:
+        if self.current_tab is not None and renderer is self.current_tab.renderer:
+            self.update_preview()
+
+    def on_render_timeout(self, block_text: str) -> None:
+        """Keep the last good preview up and say why it may be behind"""
+        first_line = block_text.strip().split('\n', 1)[0][:60]
+        self.show_status_message(f'Rendering was stopped after a block took too long: {first_line}', 8000)
+        if not self.web_preview:
+            # The block itself says so in the native preview
+            return
+        warning = html.escape('A block took too long to render and is shown as plain text.')
+        self.preview_area.page().runJavaScript(
+            "if (!document.getElementById('md-render-warning')) {"
+            "var warning = document.createElement('div'); warning.id = 'md-render-warning';"
+            f"warning.textContent = '{warning}'; document.body.insertBefore(warning, document.body.firstChild); }}"
+        )
+
+    def ask_export_format(self) -> Optional[ExportFormat]:
+        names = [export_format.name for export_format in ExportFormat]
+        name, ok = QInputDialog.getItem(self, 'Export', 'Export format:', names, 0, False)
+        return ExportFormat[name] if ok and name else None
+
+    def export_current_file(self, export_format: ExportFormat) -> None:
+        """Export the current buffer, including unsaved changes"""
+        source_path = self.current_file or os.path.join(os.getcwd(), 'Untitled.md')
+        default_path = os.path.splitext(source_path)[0] + export_format.value
+        dest_path, _ = QFileDialog.getSaveFileName(
+            self,
+            f"Export as {export_format.name}",
+            default_path,
+            f"{export_format.name} Files (*{export_format.value})"
+        )
+        if dest_path:
+            self.run_export([(source_path, dest_path, self.input_text.toPlainText())], export_format)
+
+    def export_folder(self) -> None:
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Export")
+        if folder:
+            self.export_tree(folder)
+
+    def export_project(self) -> None:
+        projects = self.project_store.projects()
+        if not projects:
+            QMessageBox.warning(self, "Warning", "No projects configured")
+            return
+        names = [project["name"] for project in projects]
+        name, ok = QInputDialog.getItem(self, 'Export Project', 'Project:', names, 0, False)
+        if ok and name:
+            project = next(p for p in projects if p["name"] == name)
+            self.export_tree(self.project_model.normalize_path(project["path"]))
+
+    def export_tree(self, root: str) -> None:
+        export_format = self.ask_export_format()
+        if export_format is None:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Select Output Folder")
+        if not output_dir:
+            return
+        jobs = build_export_jobs(root, output_dir, export_format)
+        if not jobs:
+            self.show_status_message('No markdown files to export')
+            return
+        self.run_export(jobs, export_format)
+
+    def run_export(self, jobs: List[Tuple[str, str, Optional[str]]], export_format: ExportFormat) -> None:
+        progress_dialog = QProgressDialog('Exporting...', 'Cancel', 0, len(jobs), self)
+        progress_dialog.setWindowTitle(f'Export to {export_format.name}')
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        exporter = BatchExporter(export_format, parent=self)
+        self.exporter = exporter
+
+        def on_progress(done: int, total: int, source_path: str) -> None:
+            progress_dialog.setValue(done)
+            progress_dialog.setLabelText(f'Exported {done} of {total}: {os.path.basename(source_path)}')
+
+        def on_finished(exported: int, errors: List[str]) -> None:
+            progress_dialog.close()
+            exporter.deleteLater()
+            if self.exporter is exporter:
+                self.exporter = None
+            self.show_status_message(f'Exported {exported} file(s) to {export_format.name}', 5000)
+            if errors:
+                details = '\n'.join(errors[:20])
+                if len(errors) > 20:
+                    details += f'\n... and {len(errors) - 20} more'
+                QMessageBox.warning(self, "Export Errors", f"{len(errors)} file(s) failed:\n{details}")
+
+        exporter.progress.connect(on_progress)
+        exporter.finished.connect(on_finished)
+        progress_dialog.canceled.connect(exporter.cancel)
+        exporter.start(jobs)
+
+    def show_preview_html(self, full_html: str, parts: Optional[List[str]] = None) -> None:
+        """Show rendered HTML with relative references resolved against the current file.
+
+        parts are the wrapped blocks making up the page, which later renders patch in place.
+        """
+        self.preview_tab = self.current_tab
+        self.preview_parts = parts
+        self.preview_loading = True
+        self.record_preview_update()
+        directory = os.path.dirname(os.path.abspath(self.current_file)) if self.current_file else os.getcwd()
+        if not self.web_preview:
+            # Shown synchronously, with images read straight from disk
+            self.preview_area.show_page(full_html, directory)
+            self.on_preview_loaded(True)
+            return
+        self.asset_handler.set_target_width(int(self.preview_area.width() * self.devicePixelRatioF()))
+        data = full_html.encode('utf-8')
+        if len(data) > SET_HTML_SIZE_LIMIT:
+            self.asset_handler.preview_page = data
+            self.preview_area.load(asset_url(os.path.join(directory, PREVIEW_PAGE_NAME)))
+        else:
+            self.preview_area.setHtml(full_html, asset_base_url(self.current_file))
+
     def open_folder(self):
         """Open a folder dialog to select and set the root directory"""
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
@@ -1068,6 +6009,35 @@ class MarkdownEditor(QMainWindow):
             self.address_bar.setText(folder)
             self.show_status_message(f'Opened folder: {folder}')
 
+    def connect_browser_selection(self) -> None:
+        """Prefetch the item under the keyboard cursor; the selection model changes with the model"""
+        self.file_browser.selectionModel().currentChanged.connect(
+            lambda current, previous: self.prefetcher.prefetch(self.current_model.filePath(current))
+        )
+
+    def on_browser_item_hovered(self, index: QModelIndex) -> None:
+        self.hover_prefetch_path = self.current_model.filePath(index)
+        self.hover_prefetch_timer.start(100)
+
+    def prefetch_siblings(self, file_path: str, count: int = 3) -> None:
+        """Prefetch the files next to the opened one, the likeliest to be opened next"""
+        directory = os.path.dirname(file_path)
+        try:
+            siblings = sorted(
+                name for name in os.listdir(directory)
+                if name.lower().endswith(MARKDOWN_EXTENSIONS)
+            )
+        except OSError:
+            return
+        name = os.path.basename(file_path)
+        if name not in siblings:
+            return
+        position = siblings.index(name)
+        for offset in range(1, count + 1):
+            for neighbour in (position + offset, position - offset):
+                if 0 <= neighbour < len(siblings):
+                    self.prefetcher.prefetch(os.path.join(directory, siblings[neighbour]))
+
     def file_selected(self, index: QModelIndex) -> None:
         """Improved file selection handling"""
         try:
@@ -1078,7 +6048,7 @@ class MarkdownEditor(QMainWindow):
                     self.open_project(file_path)
                     return
             else:
-                file_path = self.file_system_model.filePath(index)
+                file_path = self.file_system_tree.filePath(index)
 
             if not file_path:
                 return
@@ -1090,29 +6060,234 @@ class MarkdownEditor(QMainWindow):
                     self.file_browser.expand(index)
                 return
 
-            if not file_path.lower().endswith(('.md', '.markdown', '.prompt')):
+            if not file_path.lower().endswith(MARKDOWN_EXTENSIONS):
                 return
 
-            # Try to open the file with different encodings
-            for encoding in ['utf-8', 'utf-8-sig', 'latin1', 'cp1252']:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as file:
-                        content = file.read()
-                        self.input_text.setText(content)
-                        self.current_file = file_path
-                        self.setWindowTitle(f'Modern Markdown Editor - {os.path.basename(file_path)}')
-                        self.show_status_message(f'Opened file: {os.path.basename(file_path)}')
-                        break
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    raise Exception(f"Error opening file: {str(e)}")
-            else:
-                raise Exception("Could not decode file with any supported encoding")
-                
+            self.open_document(file_path)
+            self.show_status_message(f'Opened file: {os.path.basename(file_path)}')
+            self.prefetch_siblings(file_path)
+
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
+    def show_browser_menu(self, position) -> None:
+        index = self.file_browser.indexAt(position)
+        file_path = self.current_model.filePath(index) if index.isValid() else ''
+        menu = QMenu(self)
+        if file_path:
+            folder = file_path if os.path.isdir(file_path) else os.path.dirname(file_path)
+            menu.addAction('Rename...').triggered.connect(lambda: self.rename_path(file_path))
+            menu.addAction('Move...').triggered.connect(lambda: self.move_to_folder(file_path))
+        if self.last_move is not None:
+            record = self.last_move
+            menu.addAction(f'Undo Move of {os.path.basename(record.old_path)}').triggered.connect(
+                lambda: self.undo_move(record))
+        menu.addSeparator()
+        if file_path:
+            menu.addAction('Read Folder as Book').triggered.connect(lambda: self.open_book(folder))
+        markdown_only = menu.addAction('Only Folders With Markdown')
+        markdown_only.setCheckable(True)
+        markdown_only.setChecked(bool(self.settings.get('markdown_only_tree')))
+        markdown_only.toggled.connect(self.set_markdown_only_tree)
+        menu.exec_(self.file_browser.viewport().mapToGlobal(position))
+
+    def rebuild_tree_index(self, browser_root: Optional[str] = None) -> None:
+        """Index the projects and the browsed folder for the markdown-only tree"""
+        if not self.settings.get('markdown_only_tree'):
+            return
+        if browser_root is None and self.current_model is self.file_system_tree:
+            browser_root = self.file_system_model.rootPath()
+        self.tree_index.build(self.project_roots() + ([browser_root] if browser_root else []))
+
+    def apply_tree_filter(self) -> None:
+        """Hide the browser folders without markdown while the markdown-only tree is on"""
+        tree_index = self.tree_index if self.settings.get('markdown_only_tree') else None
+        self.file_system_tree.set_tree_index(tree_index)
+        # Resetting the project model collapses it, the expanded folders are expanded again
+        self.project_model.set_tree_index(tree_index)
+        self.pending_expanded_paths |= self.expanded_paths
+        self.expand_pending_paths()
+
+    def set_markdown_only_tree(self, enabled: bool) -> None:
+        self.settings.set('markdown_only_tree', enabled)
+        self.rebuild_tree_index()
+        self.apply_tree_filter()
+
+    def rename_path(self, file_path: str) -> None:
+        name, ok = QInputDialog.getText(self, 'Rename', 'New name:', text=os.path.basename(file_path))
+        if ok and name and name != os.path.basename(file_path):
+            if os.sep in name or (os.altsep and os.altsep in name):
+                QMessageBox.warning(self, "Warning", "Use Move to put it in another folder")
+                return
+            self.move_path(file_path, os.path.join(os.path.dirname(file_path), name))
+
+    def move_to_folder(self, file_path: str) -> None:
+        folder = QFileDialog.getExistingDirectory(self, "Move to Folder", os.path.dirname(file_path))
+        if folder:
+            self.move_path(file_path, os.path.join(folder, os.path.basename(file_path)))
+
+    def move_path(self, old_path: str, new_path: str) -> None:
+        """Rename or move a file or folder, pointing the links to and from what moved at its new place.
+
+        Referrers come from the link index's backlinks, so only files that
+        link to something that moved are read, and they are rewritten in
+        parallel with atomic writes.
+        """
+        old_path = os.path.normpath(os.path.abspath(old_path))
+        new_path = os.path.normpath(os.path.abspath(new_path))
+        if normalize_link_path(old_path) == normalize_link_path(new_path):
+            return
+        if os.path.exists(new_path):
+            QMessageBox.warning(self, "Warning", f"{new_path} already exists")
+            return
+        if normalize_link_path(old_path) in {normalize_link_path(root) for root in self.project_roots()}:
+            QMessageBox.warning(self, "Warning", "Project folders cannot be moved from the file browser")
+            return
+        if self.link_index.building:
+            self.show_status_message('The link index is still being built, try again in a moment', 5000)
+            return
+        root = self.link_index.root_for(old_path)
+        moved_files = self.link_index.files_under(old_path) if root else []
+        sources: Dict[str, str] = {}
+        for file_path in moved_files:
+            for link in self.link_index.backlinks(file_path):
+                sources[normalize_link_path(link.source)] = link.source
+            if self.link_index.links.get(normalize_link_path(file_path)):
+                sources[normalize_link_path(file_path)] = file_path
+        affected = set(sources) | {normalize_link_path(file_path) for file_path in moved_files}
+        affected.add(normalize_link_path(old_path))
+        for tab in self.document_tabs():
+            if tab.file_path and normalize_link_path(tab.file_path) in affected and \
+                    tab.document is not None and tab.document.isModified():
+                QMessageBox.warning(self, "Warning", f"Save or close {tab.title} first")
+                return
+        try:
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            shutil.move(old_path, new_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not move {old_path}: {str(e)}")
+            return
+
+        jobs = [(source, moved_path(source, old_path, new_path)) for source in sources.values()]
+        rewrites: List[Tuple[str, str, str]] = []
+        errors: List[str] = []
+        link_count = 0
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as executor:
+                futures = [
+                    (current, executor.submit(rewrite_moved_links, source, current, old_path, new_path, root))
+                    for source, current in jobs
+                ]
+            for current, future in futures:
+                try:
+                    current_path, before, after, count = future.result()
+                except Exception as e:
+                    errors.append(f"{current}: {str(e)}")
+                    continue
+                if count:
+                    rewrites.append((current_path, before, after))
+                    link_count += count
+        record = MoveRecord(old_path, new_path, rewrites)
+        self.last_move = record
+        self.after_move(old_path, new_path, [path for path, _, _ in rewrites])
+
+        summary = f'Moved {os.path.basename(old_path)} to {new_path}.\n'
+        if root is None:
+            summary += 'It is not in a project, so links to it were not updated.'
+        else:
+            summary += f'Updated {link_count} link(s) in {len(rewrites)} file(s).'
+        if errors:
+            summary += f'\n{len(errors)} file(s) could not be updated.'
+        box = QMessageBox(QMessageBox.Information, 'Moved', summary, QMessageBox.Ok, self)
+        box.addButton('Undo', QMessageBox.ActionRole).clicked.connect(lambda: self.undo_move(record))
+        details = [os.path.relpath(path, root) if root else path for path, _, _ in rewrites] + errors
+        if details:
+            box.setDetailedText('\n'.join(details))
+        box.open()
+
+    def undo_move(self, record: MoveRecord) -> None:
+        """Put the links back and move the file or folder back, skipping files edited since"""
+        if not os.path.exists(record.new_path) or os.path.exists(record.old_path):
+            QMessageBox.warning(self, "Warning", f"Cannot undo: {record.new_path} was moved or {record.old_path} exists")
+            return
+        open_paths = {normalize_link_path(path) for path, _, _ in record.rewrites}
+        open_paths.add(normalize_link_path(record.new_path))
+        for tab in self.document_tabs():
+            if tab.file_path and tab.document is not None and tab.document.isModified() and \
+                    (normalize_link_path(tab.file_path) in open_paths or
+                     moved_path(tab.file_path, record.new_path, record.old_path) != tab.file_path):
+                QMessageBox.warning(self, "Warning", f"Save or close {tab.title} first")
+                return
+        skipped = []
+        restored = []
+        for path, before, after in record.rewrites:
+            try:
+                if read_text_file(path) != after:
+                    skipped.append(path)
+                    continue
+                atomic_write_text(path, before)
+                restored.append(moved_path(path, record.new_path, record.old_path))
+            except Exception as e:
+                skipped.append(f"{path}: {str(e)}")
+        try:
+            shutil.move(record.new_path, record.old_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not move {record.new_path} back: {str(e)}")
+            return
+        if self.last_move is record:
+            self.last_move = None
+        self.after_move(record.new_path, record.old_path, restored)
+        self.show_status_message(f'Moved {os.path.basename(record.old_path)} back', 5000)
+        if skipped:
+            QMessageBox.warning(self, "Undo", "These files changed since the move and keep their new links:\n" +
+                                '\n'.join(skipped))
+
+    def after_move(self, old_path: str, new_path: str, rewritten: List[str]) -> None:
+        """Bring the link index, version history and open tabs up to date with a move and the files it rewrote"""
+        # Files outside the projects are not indexed; a single one still has its history moved
+        moved_files = self.link_index.files_under(old_path) or ([old_path] if os.path.isfile(new_path) else [])
+        for file_path in moved_files:
+            if file_path.lower().endswith(MARKDOWN_EXTENSIONS):
+                self.history.move(file_path, moved_path(file_path, old_path, new_path))
+        self.link_index.move_path(old_path, new_path)
+        self.rebuild_tree_index()
+        rewritten_keys = {normalize_link_path(path) for path in rewritten}
+        for path in rewritten:
+            self.link_index.update_file(path)
+        for tab in self.document_tabs():
+            if not tab.file_path:
+                continue
+            new_file_path = moved_path(tab.file_path, old_path, new_path)
+            if new_file_path != tab.file_path:
+                self.file_monitor.unwatch(tab.file_path)
+                tab.file_path = new_file_path
+                self.file_monitor.mark_current(new_file_path)
+                self.update_tab_title(tab)
+            if normalize_link_path(tab.file_path) in rewritten_keys:
+                if tab.document is not None:
+                    apply_text_diff(tab.document, read_text_file(tab.file_path))
+                    tab.document.setModified(False)
+                self.file_monitor.mark_current(tab.file_path)
+
+    def open_book(self, folder: str) -> None:
+        """Show every markdown file of folder in one page, replacing the book open before"""
+        if not self.web_preview:
+            self.show_status_message('Book mode needs the web preview backend', 5000)
+            return
+        files = collect_book_files(folder)
+        if not files:
+            self.show_status_message(f'No markdown files in {folder}')
+            return
+        self.close_book()
+        self.book_view = BookView(folder, files, self.render_cache, self)
+        self.book_view.fileOpenRequested.connect(self.open_linked_file)
+        self.book_view.show()
+
+    def close_book(self) -> None:
+        if self.book_view is not None and not sip.isdeleted(self.book_view):
+            self.book_view.close()
+        self.book_view = None
+
     def toggle_file_browser(self):
         self.is_file_browser_visible = not self.is_file_browser_visible
         width = 300 if self.is_file_browser_visible else 0
@@ -1120,8 +6295,11 @@ class MarkdownEditor(QMainWindow):
         self.browser_container.setVisible(self.is_file_browser_visible)
 
     def update_projects_list(self):
+        self.update_project_menu(self.project_btn.menu())
+        if not hasattr(self, 'projects_list'):
+            return
         self.projects_list.clear()
-        for project in self.projects["projects"]:
+        for project in self.project_store.projects():
             item = QListWidgetItem(f"📁 {project['name']}")
             item.setData(Qt.UserRole, project["path"])
             self.projects_list.addItem(item)
@@ -1152,13 +6330,95 @@ class MarkdownEditor(QMainWindow):
     def save_file(self):
         if self.current_file and os.path.exists(self.current_file):
             try:
+                text = self.input_text.toPlainText()
+                self.history.snapshot_original(self.current_file)
                 with open(self.current_file, 'w', encoding='utf-8') as file:
-                    file.write(self.input_text.toPlainText())
+                    file.write(text)
+                self.file_monitor.mark_current(self.current_file)
+                self.input_text.document().setModified(False)
+                self.history.snapshot(self.current_file, text)
+                self.cache_saved_render()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
         else:
             self.save_file_as()
 
+    def update_prompt_panel(self, template: Optional[PromptTemplate]) -> None:
+        """Show one field per template variable, rebuilding only when the set of variables changes"""
+        variables = template.variables if template is not None else []
+        if variables == self.prompt_variables:
+            return
+        self.prompt_variables = list(variables)
+        while self.prompt_form.rowCount():
+            self.prompt_form.removeRow(0)
+        values = self.current_tab.prompt_values
+        for name in variables:
+            field = QLineEdit(values.get(name, ''))
+            field.setPlaceholderText(template.defaults.get(name) or name)
+            field.textChanged.connect(lambda text, n=name: self.set_prompt_value(n, text))
+            self.prompt_form.addRow(name, field)
+        if template is not None and not variables:
+            self.prompt_form.addRow(QLabel('No {{variables}} in this prompt'))
+
+    def refresh_prompt_panel(self) -> None:
+        """Show the variables panel for prompt files, with the values of the current tab"""
+        self.prompt_variables = None
+        if is_prompt_file(self.current_file) and self.current_tab.document is not None:
+            self.update_prompt_panel(self.prompt_templates.get(
+                self.input_text.toPlainText(), os.path.dirname(os.path.abspath(self.current_file))))
+            self.prompt_dock.show()
+            self.prompt_dock.raise_()
+        else:
+            self.update_prompt_panel(None)
+            self.prompt_dock.hide()
+
+    def set_prompt_value(self, name: str, value: str) -> None:
+        self.current_tab.prompt_values[name] = value
+        self.prompt_timer.start(30)
+
+    def on_file_changed_on_disk(self, file_path: str) -> None:
+        """Reload a file changed by another program, asking first if it has unsaved edits"""
+        index = self.find_tab(file_path)
+        if index < 0:
+            return
+        tab = self.tab_bar.tabData(index)
+        if tab.document is None:
+            # Read fresh from disk when the tab is activated
+            tab.rendered_html = ''
+            return
+        if not os.path.exists(file_path):
+            self.show_status_message(f'{tab.title} was deleted or moved on disk', 5000)
+            return
+        if tab.document.isModified():
+            reply = QMessageBox.question(self, 'File Changed',
+                f'{tab.title} was changed by another program.\n'
+                'Reload it and lose your unsaved changes? Reloading can be undone.',
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                # Keep the buffer; the next save overwrites the file deliberately
+                self.file_monitor.mark_current(file_path)
+                return
+        try:
+            text = read_text_file(file_path)
+        except Exception as e:
+            self.show_status_message(f'Could not reload {tab.title}: {str(e)}', 5000)
+            return
+        self.file_monitor.mark_current(file_path)
+        changes = apply_text_diff(tab.document, text)
+        tab.document.setModified(False)
+        if tab is not self.current_tab:
+            tab.rendered_html = ''
+        self.link_index.update_file(file_path, text)
+        self.show_status_message(f'Reloaded {tab.title} from disk ({changes} change(s))', 3000)
+
+    def cache_saved_render(self) -> None:
+        """Store the render of the text just saved so reopening the file skips conversion"""
+        markdown_text = self.input_text.toPlainText()
+        self.link_index.update_file(self.current_file, markdown_text)
+        if self.block_renderer.source_text == markdown_text and \
+                RENDER_TIMEOUT_CLASS not in self.block_renderer.rendered_body:
+            self.render_cache.put(markdown_text, self.block_renderer.rendered_body)
+
     def save_file_as(self):
         try:
             # Get current project directory from file browser
@@ -1200,10 +6460,20 @@ class MarkdownEditor(QMainWindow):
                     raise PermissionError(f"No write permission for directory: {directory}")
             
             # Save the file
+            text = self.input_text.toPlainText()
+            self.history.snapshot_original(file_path)
             with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(self.input_text.toPlainText())
+                file.write(text)
+            self.input_text.document().setModified(False)
+            self.history.snapshot(file_path, text)
             
+            if self.current_file and os.path.normcase(os.path.abspath(self.current_file)) != \
+                    os.path.normcase(os.path.abspath(file_path)):
+                self.file_monitor.unwatch(self.current_file)
             self.current_file = file_path
+            self.file_monitor.mark_current(file_path)
+            self.tree_index.add_file(file_path)
+            self.cache_saved_render()
             self.setWindowTitle(f'Modern Markdown Editor - {os.path.basename(file_path)}')
             self.show_status_message(f'File saved successfully: {os.path.basename(file_path)}')
             
@@ -1222,19 +6492,8 @@ class MarkdownEditor(QMainWindow):
             self.show_status_message('Returned to Preview Mode (ESC)')
 
     def new_file(self):
-        """Create a new file"""
-        if self.current_file and self.input_text.document().isModified():
-            reply = QMessageBox.question(self, 'Save Changes?',
-                'Do you want to save changes to the current file?',
-                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
-            
-            if reply == QMessageBox.Save:
-                self.save_file()
-            elif reply == QMessageBox.Cancel:
-                return
-        
-        self.current_file = None
-        self.input_text.clear()
+        """Create a new file in its own tab"""
+        self.open_document(None, '')
         self.setWindowTitle('Modern Markdown Editor - New File')
         
         # Force switch to split view
@@ -1264,10 +6523,9 @@ class MarkdownEditor(QMainWindow):
         if ok and find_text:
             replace_text, ok = QInputDialog.getText(self, 'Replace', 'Replace with:')
             if ok:
-                cursor = self.input_text.textCursor()
                 text = self.input_text.toPlainText()
                 new_text = text.replace(find_text, replace_text)
-                self.input_text.setPlainText(new_text)
+                apply_text_diff(self.input_text.document(), new_text)
                 self.show_status_message(f'Replaced {find_text} with {replace_text}')
 
     def toggle_view(self):
@@ -1301,25 +6559,183 @@ class MarkdownEditor(QMainWindow):
         )
         if file_path:
             try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                self.input_text.setText(content)
-                self.current_file = file_path
-                self.setWindowTitle(f'Modern Markdown Editor - {os.path.basename(file_path)}')
+                self.open_document(file_path)
                 self.show_status_message(f'Opened {os.path.basename(file_path)}')
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
 
     def on_tree_expanded(self, index):
         """Handle tree expansion"""
-        path = self.file_model.filePath(index)
+        path = self.current_model.filePath(index)
         if path and os.path.isdir(path):
+            self.expanded_paths.add(os.path.normpath(path))
             self.file_browser.resizeColumnToContents(0)
 
     def on_tree_collapsed(self, index):
         """Handle tree collapse"""
+        self.expanded_paths.discard(os.path.normpath(self.current_model.filePath(index)))
         self.file_browser.resizeColumnToContents(0)
 
+    def expand_pending_paths(self, *args) -> None:
+        """Expand restored tree nodes whose parents have been listed"""
+        for path in sorted(self.pending_expanded_paths, key=len):
+            if self.current_model is self.file_system_tree:
+                index = self.file_system_tree.index_for_path(path)
+            else:
+                index = self.project_model.index_for_path(path)
+            if index.isValid():
+                self.pending_expanded_paths.discard(path)
+                self.file_browser.expand(index)
+
+    def update_recent_menu(self, menu: QMenu) -> None:
+        menu.clear()
+        recent_files = [path for path in self.session.recent_files if os.path.isfile(path)]
+        if not recent_files:
+            menu.addAction('No recent files').setEnabled(False)
+        for file_path in recent_files:
+            action = menu.addAction(os.path.basename(file_path))
+            action.setToolTip(file_path)
+            action.triggered.connect(lambda checked, path=file_path: self.open_recent_file(path))
+
+    def session_state(self) -> Dict[str, Any]:
+        """Describe open tabs and view state for the next launch"""
+        tabs = []
+        current = 0
+        if self.current_tab is not None:
+            self.current_tab.cursor_position = self.input_text.textCursor().position()
+            self.current_tab.scroll_position = self.input_text.verticalScrollBar().value()
+        for tab in self.document_tabs():
+            if not tab.file_path:
+                continue
+            if tab is self.current_tab:
+                current = len(tabs)
+            tabs.append({
+                'file_path': tab.file_path,
+                'cursor': tab.cursor_position,
+                'scroll': tab.scroll_position,
+            })
+        state: Dict[str, Any] = {
+            'version': 1,
+            'tabs': tabs,
+            'current': current,
+            'split_view': self.is_split_view,
+            'browser_root': self.address_bar.text() if self.current_model is self.file_system_tree else None,
+            'expanded': sorted(self.expanded_paths),
+        }
+        renderer = self.block_renderer
+        if self.current_file and renderer is not None and renderer.rendered_body and \
+                RENDER_TIMEOUT_CLASS not in renderer.rendered_body:
+            # Keep the last preview in the render cache so the next launch can show it at once
+            key = self.render_cache.key(renderer.source_text)
+            if not self.render_cache.contains_key(key):
+                self.render_cache.put(renderer.source_text, renderer.rendered_body)
+            state['render_key'] = key
+            state['preview_scroll'] = self.preview_scroll_position()
+        return state
+
+    def save_session(self) -> None:
+        try:
+            self.session.save(self.session_state())
+        except Exception as e:
+            print(f"Could not save session: {str(e)}")
+
+    def restore_session(self) -> None:
+        """Reopen the last session's tabs; only the current one is read from disk now"""
+        state = self.session.state
+        if state.get('split_view') and not self.is_split_view:
+            self.toggle_view()
+        browser_root = state.get('browser_root')
+        if browser_root and os.path.isdir(browser_root):
+            self.open_project(browser_root)
+        self.pending_expanded_paths = {path for path in state.get('expanded') or [] if os.path.isdir(path)}
+        self.expand_pending_paths()
+
+        tabs = [tab for tab in state.get('tabs') or [] if os.path.isfile(tab.get('file_path') or '')]
+        current = state.get('current', 0) if tabs else -1
+        for i, tab_state in enumerate(tabs):
+            if i != current:
+                tab = DocumentTab(tab_state['file_path'], None)
+                self.file_monitor.watch(tab.file_path)
+                tab.cursor_position = tab_state.get('cursor', 0)
+                tab.scroll_position = tab_state.get('scroll', 0)
+                index = self.tab_bar.addTab(tab.title)
+                self.tab_bar.setTabData(index, tab)
+                self.tab_bar.setTabToolTip(index, tab.file_path)
+                continue
+            # Restored in place so tab order is kept; the placeholder tab is replaced
+            render_key = state.get('render_key')
+            if render_key:
+                self.stale_preview = self.render_cache.get_by_key(render_key)
+            self.pending_preview_scroll = state.get('preview_scroll')
+            try:
+                tab = self.open_document(tab_state['file_path'])
+            except Exception as e:
+                self.stale_preview = None
+                self.pending_preview_scroll = None
+                print(f"Could not restore {tab_state['file_path']}: {str(e)}")
+                continue
+            tab.cursor_position = tab_state.get('cursor', 0)
+            tab.scroll_position = tab_state.get('scroll', 0)
+            cursor = self.input_text.textCursor()
+            cursor.setPosition(min(tab.cursor_position, tab.document.characterCount() - 1))
+            self.input_text.setTextCursor(cursor)
+            QTimer.singleShot(0, lambda t=tab: self.input_text.verticalScrollBar().setValue(t.scroll_position)
+                              if t is self.current_tab else None)
+        if tabs:
+            self.show_status_message(f'Restored {len(tabs)} file(s) from the last session')
+
+    def toggle_profiler(self) -> None:
+        if self.profiler.is_running():
+            self.profiler.stop()
+            return
+        seconds = float(self.settings.get('profile_seconds'))
+        self.profiler.start(seconds)
+        self.show_status_message(
+            f'Recording a {seconds:g} s profile, press {KeyBindings.RECORD_PROFILE.value} to stop early',
+            int(seconds * 1000))
+
+    def on_profile_saved(self, path: str) -> None:
+        if path:
+            self.show_status_message(f'Profile saved to {path}', 10000)
+        else:
+            self.show_status_message('Could not save the profile', 5000)
+
+    def preview_scroll_position(self) -> float:
+        if not self.web_preview:
+            return float(self.preview_area.verticalScrollBar().value())
+        return self.preview_area.page().scrollPosition().y()
+
+    def scroll_preview_to(self, y: float) -> None:
+        if not self.web_preview:
+            self.preview_area.verticalScrollBar().setValue(int(y))
+            return
+        self.preview_area.page().runJavaScript(f'window.scrollTo(0, {float(y)});')
+
+    def open_linked_file(self, file_path: str) -> None:
+        """Open a local file linked from the native preview, markdown in the editor and the rest externally"""
+        if not os.path.isfile(file_path):
+            self.show_status_message(f'Linked file not found: {file_path}', 5000)
+        elif file_path.lower().endswith(MARKDOWN_EXTENSIONS):
+            self.open_document(file_path)
+        else:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(file_path))
+
+    def on_preview_load_started(self) -> None:
+        if not self.preview_loading:
+            # A link was followed; the page no longer holds the rendered blocks
+            self.preview_parts = None
+
+    def on_preview_loaded(self, ok: bool) -> None:
+        self.preview_loading = False
+        if not ok:
+            self.preview_parts = None
+        self.previewUpdated.emit()
+        if ok and self.pending_preview_scroll:
+            self.scroll_preview_to(self.pending_preview_scroll)
+        # A stale preview is replaced by a fresh render, which needs the same scroll position
+        if not self.preview_refresh_pending:
+            self.pending_preview_scroll = None
+
 def main():
     # Enable High DPI display
     if hasattr(Qt, 'AA_EnableHighDpiScaling'):
@@ -1328,9 +6744,9 @@ def main():
         QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
     
     # Set cache directory to a user-writable location
-    cache_dir = os.path.join(os.path.expanduser('~'), '.markdown_editor_cache')
-    os.makedirs(cache_dir, exist_ok=True)
-    os.environ['QTWEBENGINE_DISK_CACHE_DIR'] = cache_dir
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    os.environ['QTWEBENGINE_DISK_CACHE_DIR'] = CACHE_DIR
+    register_asset_scheme()
         
     app = QApplication(sys.argv)
     editor = MarkdownEditor()
@@ -1338,4 +6754,5 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,63 @@
+"""Block diffing behind the changes view"""
+from markdown_editor import BlockRenderer, DiffBase, block_diff_missing, diff_block_lists, \
+    render_block_diff, split_markdown_blocks
+
+def diff(old_text, new_text):
+    return diff_block_lists(split_markdown_blocks(old_text), split_markdown_blocks(new_text))
+
+def base(text):
+    return DiffBase('saved version', None, None, text, split_markdown_blocks(text))
+
+def test_identical_texts_are_one_equal_run():
+    text = '# Title\n\nOne\n\nTwo\n'
+    assert diff(text, text) == [('equal', 0, 3, 0, 3)]
+
+def test_inserted_block():
+    assert diff('One\n\nThree\n', 'One\n\nTwo\n\nThree\n') == [
+        ('equal', 0, 1, 0, 1), ('insert', 1, 1, 1, 2), ('equal', 1, 2, 2, 3)]
+
+def test_removed_block():
+    assert diff('One\n\nTwo\n\nThree\n', 'One\n\nThree\n') == [
+        ('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 3, 1, 2)]
+
+def test_modified_block():
+    assert diff('One\n\nTwo\n\nThree\n', 'One\n\nTwo!\n\nThree\n') == [
+        ('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2), ('equal', 2, 3, 2, 3)]
+
+def test_repeated_blocks_are_matched_in_order():
+    old_text = 'Same\n\nA\n\nSame\n\nB\n\nSame\n'
+    new_text = 'Same\n\nA\n\nSame\n\nC\n\nSame\n'
+    assert diff(old_text, new_text) == [
+        ('equal', 0, 3, 0, 3), ('replace', 3, 4, 3, 4), ('equal', 4, 5, 4, 5)]
+
+def test_opcodes_cover_both_lists():
+    old_text = ''.join(f'Paragraph {i}\n\n' for i in range(50))
+    new_text = old_text.replace('Paragraph 10\n', 'Changed\n').replace('Paragraph 30\n\n', '') + 'End\n'
+    opcodes = diff(old_text, new_text)
+    assert opcodes[0][1] == opcodes[0][3] == 0
+    assert (opcodes[-1][2], opcodes[-1][4]) == (50, 50)
+    for previous, following in zip(opcodes, opcodes[1:]):
+        assert (previous[2], previous[4]) == (following[1], following[3])
+
+def test_render_block_diff_counts_and_collapses_unchanged_blocks():
+    old_text = ''.join(f'Paragraph {i}\n\n' for i in range(20))
+    new_text = old_text.replace('Paragraph 5\n', 'Changed\n') + 'New\n'
+    body, counts = render_block_diff(BlockRenderer(), base(old_text), new_text, context=1)
+    assert counts == {'inserted': 1, 'removed': 0, 'modified': 1}
+    assert 'Changes against saved version: 1 inserted, 1 modified' in body
+    assert '4 unchanged blocks' in body and '12 unchanged blocks' in body
+
+def test_render_block_diff_without_changes():
+    text = 'One\n\nTwo\n'
+    body, counts = render_block_diff(BlockRenderer(), base(text), text)
+    assert counts == {'inserted': 0, 'removed': 0, 'modified': 0}
+    assert 'no changes' in body
+
+def test_block_diff_missing_lists_only_uncached_blocks():
+    old_text = 'One\n\nTwo\n\nThree\n'
+    new_text = 'One\n\nTwo!\n\nThree\n'
+    renderer = BlockRenderer()
+    missing = block_diff_missing(renderer, base(old_text), new_text)
+    assert sorted(text for _, text in missing) == ['One', 'Three', 'Two', 'Two!']
+    render_block_diff(renderer, base(old_text), new_text)
+    assert block_diff_missing(renderer, base(old_text), new_text) == []
@@ -0,0 +1,69 @@
+"""Link rewriting when files and folders are renamed or moved"""
+import os
+
+from markdown_editor import moved_path, relink, rewrite_link_targets, rewrite_moved_links
+
+def test_moved_path_of_the_moved_file(tmp_path):
+    old_path, new_path = str(tmp_path / 'a.md'), str(tmp_path / 'sub' / 'a.md')
+    assert moved_path(old_path, old_path, new_path) == new_path
+
+def test_moved_path_below_a_moved_folder(tmp_path):
+    old_path, new_path = str(tmp_path / 'docs'), str(tmp_path / 'guide')
+    path = str(tmp_path / 'docs' / 'img' / 'x.png')
+    assert moved_path(path, old_path, new_path) == os.path.join(new_path, 'img', 'x.png')
+
+def test_moved_path_leaves_folders_sharing_a_prefix_alone(tmp_path):
+    path = str(tmp_path / 'docs2' / 'a.md')
+    assert moved_path(path, str(tmp_path / 'docs'), str(tmp_path / 'guide')) == path
+
+def test_relink_keeps_anchor_and_query(tmp_path):
+    source = str(tmp_path / 'index.md')
+    target = str(tmp_path / 'guide' / 'page.md')
+    assert relink('page.md#setup', source, target) == 'guide/page.md#setup'
+    assert relink('page.md?raw=1', source, target) == 'guide/page.md?raw=1'
+
+def test_relink_keeps_dot_slash_and_root_relative_style(tmp_path):
+    source = str(tmp_path / 'docs' / 'index.md')
+    target = str(tmp_path / 'docs' / 'guide' / 'page.md')
+    assert relink('./page.md', source, target) == './guide/page.md'
+    assert relink('/docs/page.md', source, target, str(tmp_path)) == '/docs/guide/page.md'
+
+def test_relink_escapes_like_the_original(tmp_path):
+    source = str(tmp_path / 'index.md')
+    target = str(tmp_path / 'my notes' / 'page.md')
+    assert relink('page.md', source, target) == 'my%20notes/page.md'
+
+def test_rewrite_link_targets_changes_only_destinations():
+    text = 'See [a.md](a.md) and ![a.md](a.md)\n[a.md]: a.md\nplain a.md'
+    new_text, count = rewrite_link_targets(text, {0: {'a.md': 'b/a.md'}, 1: {'a.md': 'b/a.md'}})
+    assert new_text == 'See [a.md](b/a.md) and ![a.md](b/a.md)\n[a.md]: b/a.md\nplain a.md'
+    assert count == 3
+
+def test_rewrite_moved_links_points_at_the_moved_target(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    index = tmp_path / 'index.md'
+    index.write_text('[page](page.md#top) [other](other.md)\n```\n[code](page.md)\n```\n', encoding='utf-8')
+    old_path, new_path = str(tmp_path / 'page.md'), str(tmp_path / 'sub' / 'page.md')
+    current_path, before, after, count = rewrite_moved_links(
+        str(index), str(index), old_path, new_path, str(tmp_path))
+    assert (current_path, count) == (str(index), 1)
+    assert after == '[page](sub/page.md#top) [other](other.md)\n```\n[code](page.md)\n```\n'
+    assert index.read_text(encoding='utf-8') == after
+
+def test_rewrite_moved_links_of_the_moved_file_itself(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    moved = tmp_path / 'sub' / 'page.md'
+    moved.write_text('![x](img/x.png) [self](#top)', encoding='utf-8')
+    old_path = str(tmp_path / 'page.md')
+    _, _, after, count = rewrite_moved_links(old_path, str(moved), old_path, str(moved), str(tmp_path))
+    assert after == '![x](../img/x.png) [self](#top)'
+    assert count == 1
+
+def test_rewrite_moved_links_leaves_unaffected_files_unwritten(tmp_path):
+    index = tmp_path / 'index.md'
+    index.write_text('[other](other.md)', encoding='utf-8')
+    mtime = os.path.getmtime(index)
+    _, before, after, count = rewrite_moved_links(
+        str(index), str(index), str(tmp_path / 'page.md'), str(tmp_path / 'sub' / 'page.md'), str(tmp_path))
+    assert count == 0 and before == after
+    assert os.path.getmtime(index) == mtime
@@ -0,0 +1,28 @@
+"""Splitting markdown into independently rendered blocks"""
+from markdown_editor import split_markdown_blocks
+
+def texts(markdown_text):
+    return [block.text for block in split_markdown_blocks(markdown_text)]
+
+def test_paragraphs_and_headings_are_separate_blocks():
+    assert texts('# Title\nIntro\n\nSecond paragraph\nstill second\n') == [
+        '# Title', 'Intro', 'Second paragraph\nstill second']
+
+def test_fenced_code_stays_whole_across_blank_lines():
+    text = 'Before\n\n```python\nx = 1\n\n# not a heading\n```\n\nAfter'
+    assert texts(text) == ['Before', '```python\nx = 1\n\n# not a heading\n```', 'After']
+
+def test_lists_stay_together_across_blank_lines():
+    text = '1. One\n\n2. Two\n   continued\n\n3. Three\n\nAfter'
+    assert texts(text) == ['1. One\n\n2. Two\n   continued\n\n3. Three', 'After']
+
+def test_block_ranges_point_back_into_the_source():
+    text = 'First\n\n## Heading\n\nLast line\n'
+    for block in split_markdown_blocks(text):
+        assert text[block.start:block.end] == block.text
+        lines = text.split('\n')[block.first_line:block.last_line + 1]
+        assert '\n'.join(lines) == block.text
+
+def test_empty_text_has_no_blocks():
+    assert split_markdown_blocks('') == []
+    assert split_markdown_blocks('\n\n  \n') == []
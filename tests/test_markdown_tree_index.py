@@ -0,0 +1,58 @@
+"""Which folders the markdown-only file browser lists"""
+import os
+
+import pytest
+
+from markdown_editor import MarkdownTreeIndex, normalize_link_path
+
+def build(root, ignore_globs=('node_modules', '.git')):
+    index = MarkdownTreeIndex(list(ignore_globs))
+    index.roots = [normalize_link_path(str(root))]
+    # The worker reports back through a direct connection when run on this thread
+    index._build_worker(list(index.roots), index.ignore_globs, index.generation)
+    return index
+
+def make_tree(root):
+    for folder in ('docs/guide', 'docs/img', 'src', 'node_modules/pkg', 'empty'):
+        (root / folder).mkdir(parents=True)
+    (root / 'docs' / 'guide' / 'intro.md').write_text('# Intro', encoding='utf-8')
+    (root / 'docs' / 'img' / 'x.png').write_bytes(b'')
+    (root / 'src' / 'main.py').write_text('', encoding='utf-8')
+    (root / 'node_modules' / 'pkg' / 'README.md').write_text('', encoding='utf-8')
+
+def test_lists_only_folders_with_markdown_below_them(tmp_path):
+    make_tree(tmp_path)
+    index = build(tmp_path)
+    listed = {name for name in ('docs', 'docs/guide', 'docs/img', 'src', 'node_modules', 'empty')
+              if index.accepts(str(tmp_path / name), True)}
+    assert listed == {'docs', 'docs/guide'}
+    assert index.accepts(str(tmp_path), True)
+
+def test_files_are_always_listed(tmp_path):
+    make_tree(tmp_path)
+    index = build(tmp_path)
+    assert index.accepts(str(tmp_path / 'src' / 'main.py'), False)
+
+def test_folders_outside_the_roots_are_listed(tmp_path):
+    (tmp_path / 'project').mkdir()
+    (tmp_path / 'other').mkdir()
+    index = build(tmp_path / 'project')
+    assert index.accepts(str(tmp_path / 'other'), True)
+
+def test_new_markdown_file_shows_its_folders(tmp_path):
+    make_tree(tmp_path)
+    index = build(tmp_path)
+    (tmp_path / 'src' / 'deep').mkdir()
+    index.add_file(str(tmp_path / 'src' / 'deep' / 'notes.md'))
+    assert index.accepts(str(tmp_path / 'src'), True)
+    assert index.accepts(str(tmp_path / 'src' / 'deep'), True)
+
+def test_symlink_loops_end_the_walk(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    (tmp_path / 'docs' / 'a.md').write_text('', encoding='utf-8')
+    try:
+        os.symlink(str(tmp_path), str(tmp_path / 'docs' / 'loop'), target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not available')
+    index = build(tmp_path)
+    assert index.accepts(str(tmp_path / 'docs'), True)
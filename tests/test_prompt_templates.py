@@ -0,0 +1,40 @@
+"""Compiling and filling in .prompt templates"""
+import os
+
+from markdown_editor import PromptTemplateCache
+
+def test_variables_defaults_and_unset_values(tmp_path):
+    template = PromptTemplateCache().get('Hi {{name}}, {{ tone | friendly }} {{name|there}}', str(tmp_path))
+    assert template.variables == ['name', 'tone']
+    assert template.defaults == {'name': 'there', 'tone': 'friendly'}
+    assert template.render({}) == 'Hi there, friendly there'
+    assert template.render({'name': 'Ada', 'tone': 'formal'}) == 'Hi Ada, formal Ada'
+
+def test_variable_without_default_stays_visible(tmp_path):
+    template = PromptTemplateCache().get('Dear {{name}}', str(tmp_path))
+    assert template.render({}) == 'Dear {{name}}'
+
+def test_includes_are_inlined_with_their_variables(tmp_path):
+    (tmp_path / 'parts').mkdir()
+    (tmp_path / 'parts' / 'signature.prompt').write_text('Regards, {{sender|me}}', encoding='utf-8')
+    template = PromptTemplateCache().get('Body\n{{> parts/signature}}', str(tmp_path))
+    assert template.variables == ['sender']
+    assert template.render({}) == 'Body\nRegards, me'
+
+def test_missing_and_cyclic_includes_are_marked(tmp_path):
+    (tmp_path / 'a.prompt').write_text('A {{> b}}', encoding='utf-8')
+    (tmp_path / 'b.prompt').write_text('B {{> a}}', encoding='utf-8')
+    cache = PromptTemplateCache()
+    assert cache.get('{{> nowhere}}', str(tmp_path)).render({}) == '**[missing include: nowhere]**'
+    assert cache.get('{{> a}}', str(tmp_path)).render({}) == 'A B **[include cycle: a]**'
+
+def test_changed_include_is_compiled_again(tmp_path):
+    include = tmp_path / 'part.prompt'
+    include.write_text('old', encoding='utf-8')
+    cache = PromptTemplateCache()
+    template = cache.get('{{> part}}', str(tmp_path))
+    assert cache.get('{{> part}}', str(tmp_path)) is template
+    include.write_text('new', encoding='utf-8')
+    mtime = os.stat(include).st_mtime_ns + 1_000_000_000
+    os.utime(include, ns=(mtime, mtime))
+    assert cache.get('{{> part}}', str(tmp_path)).render({}) == 'new'
@@ -0,0 +1,65 @@
+"""The on-disk caches of rendered documents and thumbnails"""
+import os
+
+from markdown_editor import RenderDiskCache, ThumbnailDiskCache
+
+def entry_path(cache, markdown_text):
+    return cache._path(cache.key(markdown_text))
+
+def test_round_trip(tmp_path):
+    cache = RenderDiskCache(str(tmp_path))
+    assert cache.get('# Title') is None
+    cache.put('# Title', '<h1>Title</h1>')
+    assert cache.contains('# Title')
+    assert cache.get('# Title') == '<h1>Title</h1>'
+    assert RenderDiskCache(str(tmp_path)).get('# Title') == '<h1>Title</h1>'
+
+def test_corrupted_entry_is_dropped(tmp_path):
+    cache = RenderDiskCache(str(tmp_path))
+    cache.put('text', '<p>text</p>')
+    path = entry_path(cache, 'text')
+    with open(path, 'r+', encoding='utf-8') as f:
+        content = f.read()
+        f.seek(0)
+        f.write(content.replace('text</p>', 'tExt</p>'))
+    assert cache.get('text') is None
+    assert not os.path.exists(path)
+
+def test_truncated_entry_is_dropped(tmp_path):
+    cache = RenderDiskCache(str(tmp_path))
+    cache.put('text', '<p>' + 'x' * 1000 + '</p>')
+    path = entry_path(cache, 'text')
+    with open(path, 'r+', encoding='utf-8') as f:
+        f.truncate(200)
+    assert cache.get('text') is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    body = 'x' * 1000
+    cache = RenderDiskCache(str(tmp_path), max_bytes=3500)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, body)
+    assert cache.get('a') == body
+    cache.put('d', body)
+    assert [cache.contains(name) for name in ('a', 'b', 'c', 'd')] == [True, False, True, True]
+    assert cache.total_size <= 3500
+
+def test_existing_entries_count_towards_the_limit(tmp_path):
+    body = 'x' * 1000
+    cache = RenderDiskCache(str(tmp_path))
+    for name in ('a', 'b', 'c'):
+        cache.put(name, body)
+    cache = RenderDiskCache(str(tmp_path), max_bytes=2500)
+    cache.put('d', body)
+    assert sum(cache.contains(name) for name in ('a', 'b', 'c', 'd')) == 2
+    assert cache.contains('d')
+
+def test_thumbnail_cache_round_trip_and_eviction(tmp_path):
+    cache = ThumbnailDiskCache(str(tmp_path), max_bytes=2500)
+    digests = [f'{i:040x}' for i in range(3)]
+    cache.put_thumbnail(digests[0], b'p' * 1000, 'image/png')
+    cache.put_thumbnail(digests[1], b'j' * 1000, 'image/jpeg')
+    assert cache.get_thumbnail(digests[0]) == (b'p' * 1000, 'image/png')
+    cache.put_thumbnail(digests[2], b'j' * 1000, 'image/jpeg')
+    assert cache.get_thumbnail(digests[1]) is None
+    assert cache.get_thumbnail(digests[2]) == (b'j' * 1000, 'image/jpeg')
+    assert cache.total_size == 2000
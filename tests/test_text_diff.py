@@ -0,0 +1,64 @@
+"""Line diffs and applying them to a document as minimal edits"""
+import difflib
+
+import pytest
+from PyQt5.QtGui import QTextDocument
+
+from markdown_editor import apply_text_diff, line_opcodes
+
+def apply_opcodes(old_lines, new_lines, opcodes):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        result += old_lines[i1:i2] if tag == 'equal' else new_lines[j1:j2]
+    return result
+
+@pytest.mark.parametrize('old_lines, new_lines', [
+    ([], ['a']),
+    (['a'], []),
+    (['a', 'b', 'c'], ['a', 'x', 'c']),
+    (['a', '', 'b', '', 'c', ''], ['', 'a', '', 'c', '', 'b', '']),
+    (['x'] * 50 + ['unique'] + ['x'] * 50, ['x'] * 49 + ['unique', 'new'] + ['x'] * 51),
+])
+def test_line_opcodes_rebuild_the_new_lines(old_lines, new_lines):
+    opcodes = line_opcodes(old_lines, new_lines)
+    assert apply_opcodes(old_lines, new_lines, opcodes) == new_lines
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert old_lines[i1:i2] == new_lines[j1:j2]
+
+def test_line_opcodes_pair_lines_edited_in_place():
+    old_lines = ['one foo', 'two', 'three foo']
+    new_lines = ['one bar', 'two', 'three bar']
+    assert line_opcodes(old_lines, new_lines) == [
+        ('replace', 0, 1, 0, 1), ('equal', 1, 2, 1, 2), ('replace', 2, 3, 2, 3)]
+
+def test_line_opcodes_match_difflib_on_unique_lines():
+    old_lines = [f'line {i}' for i in range(30)]
+    new_lines = old_lines[:10] + ['inserted'] + old_lines[12:]
+    changed = [op for op in line_opcodes(old_lines, new_lines) if op[0] != 'equal']
+    expected = [op for op in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes() if op[0] != 'equal']
+    assert changed == expected
+
+@pytest.mark.parametrize('old_text, new_text', [
+    ('same\n', 'same\n'),
+    ('one\ntwo\nthree\n', 'one\n2\nthree\n'),
+    ('a\n\nb\n\nc', 'c\n\nb\n\na'),
+    ('emoji 😀 here\nnext', 'emoji 😀 there\nnext line'),
+    ('', 'new text\n'),
+    ('old text\n', ''),
+])
+def test_apply_text_diff_produces_the_new_text(old_text, new_text):
+    document = QTextDocument()
+    document.setPlainText(old_text)
+    edits = apply_text_diff(document, new_text)
+    assert document.toPlainText() == new_text
+    assert (edits == 0) == (old_text == new_text)
+
+def test_apply_text_diff_is_one_undo_step():
+    document = QTextDocument()
+    document.setPlainText('one\ntwo\nthree\nfour\n')
+    document.clearUndoRedoStacks()
+    assert apply_text_diff(document, 'ONE\ntwo\nthree\nFOUR\n') > 1
+    document.undo()
+    assert document.toPlainText() == 'one\ntwo\nthree\nfour\n'
+    assert not document.isUndoAvailable()